@@ -0,0 +1,78 @@
+class AdaptiveSampler:
+    def __init__(self, safe_distance, base_interval=3, min_interval=1, max_interval=None,
+                 near_margin=10, fast_change=5, backoff=2):
+        """
+        Chọn khoảng nghỉ giữa các lần đo dựa trên khoảng cách gần nhất
+
+        Đo dày khi người dùng ở gần ngưỡng an toàn hoặc đang di chuyển nhanh,
+        giãn dần (nhân backoff mỗi lần) tới max_interval khi ổn định và an toàn.
+
+        Người dùng nhích lại gần ngay sau một lần đo chỉ được phát hiện ở lần
+        đo kế tiếp, nên cảnh báo nghỉ đến muộn hơn lịch cố định tối đa
+        max_interval - base_interval giây. Mặc định max_interval = 2 *
+        base_interval: trễ thêm không quá một base_interval, đổi lại số lần
+        chạy face mesh khi ngồi ổn định giảm một nửa.
+
+        Args:
+            safe_distance: Khoảng cách an toàn tối thiểu (cm)
+            base_interval: Khoảng nghỉ chuẩn (giây), dùng khi không thấy mặt
+            min_interval: Khoảng nghỉ ngắn nhất (giây)
+            max_interval: Khoảng nghỉ dài nhất (giây); None = 2 * base_interval
+            near_margin: Vùng sát ngưỡng (cm) cần đo dày
+            fast_change: Mức thay đổi (cm trong một base_interval) coi là nhanh
+            backoff: Hệ số giãn khoảng nghỉ khi ổn định
+        """
+        self.safe_distance = safe_distance
+        self.base_interval = base_interval
+        self.min_interval = min(min_interval, base_interval)
+        if max_interval is None:
+            max_interval = 2 * base_interval
+        self.max_interval = max(max_interval, base_interval)
+        self.near_margin = near_margin
+        self.fast_change = fast_change
+        self.backoff = backoff
+
+        self.interval = base_interval
+        self.last_distance = None
+        self.last_time = None
+        self.samples = 0
+
+    def next_interval(self, distance, now):
+        """
+        Cập nhật theo lần đo mới và trả về số giây chờ tới lần đo kế tiếp
+
+        Args:
+            distance: khoảng cách vừa đo (cm), 0 nếu không thấy mặt
+            now: thời điểm đo (time.time())
+        """
+        self.samples += 1
+
+        if distance <= 0:
+            self.last_distance = None
+            self.last_time = None
+            self.interval = self.base_interval
+            return self.interval
+
+        changing_fast = False
+        if self.last_distance is not None and now > self.last_time:
+            rate = abs(distance - self.last_distance) / (now - self.last_time)
+            changing_fast = rate * self.base_interval >= self.fast_change
+        self.last_distance = distance
+        self.last_time = now
+
+        if distance < self.safe_distance + self.near_margin or changing_fast:
+            self.interval = self.min_interval
+        elif self.interval < self.base_interval:
+            self.interval = self.base_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+        return self.interval
+
+    def get_stats(self):
+        """Thống kê bộ lập lịch"""
+        return {
+            'interval': self.interval,
+            'samples': self.samples,
+            'min_interval': self.min_interval,
+            'max_interval': self.max_interval
+        }
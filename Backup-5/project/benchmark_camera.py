@@ -0,0 +1,310 @@
+"""
+Benchmark cho đường xử lý camera, chạy trên video đã ghi sẵn
+
+Ví dụ:
+    python benchmark_camera.py capture clip.mp4 --samples 20 --interval 1
+    python benchmark_camera.py resolution clip.mp4 --widths 320 480 640
+    python benchmark_camera.py flow clip.mp4 --mesh-every 5
+    python benchmark_camera.py pipeline clip.mp4 --seconds 10 --publish-ms 20
+    python benchmark_camera.py preview clip.mp4 --seconds 5
+"""
+import argparse
+import collections
+import statistics
+import threading
+import time
+
+from distance_utils import DistanceCamera
+from frame_grabber import FrameGrabber
+from frame_sources import open_source
+from pipeline import DistancePipeline
+
+
+class RecordedCamera:
+    def __init__(self, path, buffer_size=4):
+        """
+        Giả lập webcam từ nguồn ghi sẵn: frame được "chụp" theo đúng fps của
+        nguồn và xếp vào buffer giống buffer của driver V4L2
+
+        Args:
+            path: nguồn frame (file video, thư mục ảnh, synthetic)
+            buffer_size: số frame driver giữ lại trước khi bỏ frame mới
+        """
+        self.cap = open_source(path, speed=0, loop=True)
+        self.fps = getattr(self.cap, 'fps', None) or 30
+        self.buffer = collections.deque()
+        self.buffer_size = buffer_size
+        self.cond = threading.Condition()
+        self.running = True
+        self.last_capture_time = 0
+        self.thread = threading.Thread(target=self._feed)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _feed(self):
+        period = 1.0 / self.fps
+        next_time = time.time()
+        while self.running:
+            ret, frame = self.cap.read()
+            if not ret:
+                continue
+            next_time += period
+            delay = next_time - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            with self.cond:
+                if len(self.buffer) < self.buffer_size:
+                    self.buffer.append((time.time(), frame))
+                self.cond.notify_all()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self):
+        with self.cond:
+            self.cond.wait_for(lambda: self.buffer or not self.running, 2)
+            if not self.buffer:
+                return False, None
+            self.last_capture_time, frame = self.buffer.popleft()
+            return True, frame
+
+    def release(self):
+        self.running = False
+        self.thread.join(timeout=2)
+        self.cap.release()
+
+
+def summarize(name, values):
+    values = sorted(values)
+    p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+    print(f"  {name:<18} mean={statistics.mean(values):8.2f}  "
+          f"p50={statistics.median(values):8.2f}  p95={p95:8.2f}")
+
+
+def bench_capture(args):
+    """So sánh đọc frame trực tiếp với FrameGrabber"""
+    for mode in ('inline', 'threaded'):
+        cam = RecordedCamera(args.source)
+        grabber = FrameGrabber(cam) if mode == 'threaded' else None
+        if grabber:
+            grabber.start()
+        latencies, ages = [], []
+        time.sleep(args.interval)
+
+        for _ in range(args.samples):
+            t0 = time.time()
+            if grabber:
+                ret, frame, seq, captured = grabber.read_latest()
+            else:
+                ret, frame = cam.read()
+                captured = cam.last_capture_time
+            t1 = time.time()
+            if ret:
+                latencies.append((t1 - t0) * 1000)
+                ages.append((t1 - captured) * 1000)
+            time.sleep(args.interval)
+
+        print(f"[{mode}] {len(latencies)} mẫu, interval={args.interval}s")
+        summarize('read latency (ms)', latencies)
+        summarize('frame age (ms)', ages)
+        if grabber:
+            stats = grabber.get_stats()
+            print(f"  frames_read={stats['frames_read']} frames_dropped={stats['frames_dropped']}")
+            grabber.stop()
+        cam.release()
+
+
+def load_clip(path, limit):
+    """Đọc trước các frame của video để không tính thời gian giải mã"""
+    cap = open_source(path, speed=0)
+    frames = []
+    while len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def run_camera_on_frames(camera, frames):
+    """Chạy process_frame trên từng frame, trả về (ms mỗi frame, khoảng cách, số frame thấy mặt)"""
+    times, distances, found = [], [], 0
+    for frame in frames:
+        t0 = time.perf_counter()
+        distance, success = camera.process_frame(frame)
+        times.append((time.perf_counter() - t0) * 1000)
+        distances.append(distance if success else None)
+        found += 1 if success else 0
+    return times, distances, found
+
+
+def bench_resolution(args):
+    """Sai số khoảng cách và thời gian CPU theo inference_width"""
+    frames = load_clip(args.source, args.frames)
+    reference = DistanceCamera()
+    _, ref_distances, _ = run_camera_on_frames(reference, frames)
+    native_width = frames[0].shape[1]
+
+    print(f"Tham chiếu: độ phân giải gốc {native_width}px, {len(frames)} frame")
+    print(f"{'width':>6} {'CPU ms/frame':>13} {'fps':>7} {'found':>7} "
+          f"{'MAE cm':>8} {'max cm':>8} {'MAPE %':>7}")
+    for width in args.widths:
+        camera = DistanceCamera(inference_width=width)
+        cpu0 = time.process_time()
+        times, distances, found = run_camera_on_frames(camera, frames)
+        cpu_ms = (time.process_time() - cpu0) * 1000 / len(frames)
+        errors = [abs(d - r) for d, r in zip(distances, ref_distances)
+                  if d is not None and r is not None]
+        relative = [abs(d - r) / r * 100 for d, r in zip(distances, ref_distances)
+                    if d is not None and r is not None]
+        mae = statistics.mean(errors) if errors else float('nan')
+        worst = max(errors) if errors else float('nan')
+        mape = statistics.mean(relative) if relative else float('nan')
+        print(f"{width:>6} {cpu_ms:>13.2f} {1000 / statistics.mean(times):>7.1f} "
+              f"{found:>7} {mae:>8.2f} {worst:>8.2f} {mape:>7.2f}")
+
+
+def bench_flow(args):
+    """Face mesh mọi frame vs optical flow giữa các lần chạy face mesh"""
+    frames = load_clip(args.source, args.frames)
+    reference = DistanceCamera()
+    ref_times, ref_distances, _ = run_camera_on_frames(reference, frames)
+    print(f"[mesh] {len(frames)} frame")
+    summarize('ms/frame', ref_times[1:])
+
+    camera = DistanceCamera(flow_tracking=True, mesh_every=args.mesh_every)
+    times, distances, found = run_camera_on_frames(camera, frames)
+    errors = [abs(d - r) for d, r in zip(distances, ref_distances)
+              if d is not None and r is not None]
+    flow = camera.get_stats()['flow']
+    print(f"[flow] mesh_every={args.mesh_every}, thấy mặt {found}/{len(frames)}, "
+          f"tracked={flow['tracked']} mesh_runs={flow['mesh_runs']} failures={flow['failures']}")
+    summarize('ms/frame', times[1:])
+    if errors:
+        print(f"  sai số so với mesh: MAE={statistics.mean(errors):.2f}cm max={max(errors):.2f}cm")
+
+
+def bench_pipeline(args):
+    """fps duy trì: xử lý tuần tự trong một thread vs pipeline nhiều stage"""
+    publish_delay = args.publish_ms / 1000
+
+    def publish(result):
+        # Giả lập chi phí gửi kết quả (HTTP post...)
+        time.sleep(publish_delay)
+
+    camera = DistanceCamera(source=open_source(args.source, speed=0, loop=True),
+                            motion_gate=args.motion_gate)
+    camera.start_camera()
+    done = 0
+    start = time.time()
+    while time.time() - start < args.seconds:
+        ret, frame, seq, timestamp = camera.read_next_frame()
+        if not ret:
+            continue
+        gate = camera.check_motion(frame)
+        rgb = camera.prepare_frame(frame) if gate is None or gate[0] else None
+        camera.process_frame(frame, rgb=rgb, gate=gate)
+        publish(None)
+        done += 1
+    print(f"[sequential] {done / (time.time() - start):.1f} fps")
+    camera.stop_camera()
+
+    camera = DistanceCamera(source=open_source(args.source, speed=0, loop=True),
+                            motion_gate=args.motion_gate)
+    pipe = DistancePipeline(camera, on_result=publish, queue_size=args.queue_size)
+    camera.is_monitoring = True
+    if pipe.start():
+        raise SystemExit("❌ Pipeline chạy khi camera đang giám sát")
+    camera.is_monitoring = False
+    pipe.start()
+    time.sleep(args.seconds)
+    pipe.stop()
+    stats = pipe.get_stats()
+    print(f"[pipeline] {stats['publish']['fps']:.1f} fps (publish)")
+    for name in ('capture', 'preprocess', 'inference', 'publish'):
+        st = stats[name]
+        print(f"  {name:<11} processed={st['processed']:>5} dropped={st['dropped']:>5} "
+              f"fps={st['fps']:6.1f} busy={st['busy_ms']:6.2f} ms/frame")
+    if args.motion_gate:
+        print(f"  motion gate: phân tích {camera.frames_processed}, dùng lại {camera.frames_skipped}")
+    camera.stop_camera()
+
+
+def bench_preview(args):
+    """
+    Preview của ProcessCamera qua ring buffer shared memory
+
+    Đo số ảnh preview / giây và tỉ lệ ảnh có vị trí mắt, trước và sau khi
+    camera khởi động lại (ring buffer mới, seq của ring bắt đầu lại từ 1).
+    Preview phải tiếp tục ngay sau khi khởi động lại.
+    """
+    from camera_worker import ProcessCamera
+
+    camera = ProcessCamera(source=args.source, threaded_capture=True, shared_frames=8)
+    after_seq = 0
+    failed = False
+    for phase in ('lần đầu', 'sau khi khởi động lại'):
+        camera.start_monitoring(interval=args.interval)
+        images = with_eyes = 0
+        start = time.time()
+        while time.time() - start < args.seconds:
+            seq, jpeg = camera.get_preview_jpeg(after_seq)
+            if jpeg is not None:
+                after_seq = seq
+                images += 1
+                with_eyes += camera.last_analyzed[3] is not None
+            time.sleep(1 / args.fps)
+        camera.stop_monitoring()
+        print(f"[{phase}] {images / args.seconds:.1f} ảnh/s, có vị trí mắt {with_eyes}/{images}, "
+              f"seq preview={after_seq}")
+        failed = failed or images == 0
+    camera.shutdown()
+    if failed:
+        raise SystemExit("❌ Preview không có ảnh mới")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark camera pipeline")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('capture', help="Độ trễ đọc frame: inline vs thread riêng")
+    p.add_argument('source', help="File video, thư mục ảnh hoặc synthetic")
+    p.add_argument('--samples', type=int, default=20)
+    p.add_argument('--interval', type=float, default=1.0)
+    p.set_defaults(func=bench_capture)
+
+    p = sub.add_parser('resolution', help="Sai số và CPU theo độ phân giải suy luận")
+    p.add_argument('source', help="File video, thư mục ảnh hoặc synthetic")
+    p.add_argument('--frames', type=int, default=200)
+    p.add_argument('--widths', type=int, nargs='+', default=[320, 480, 640])
+    p.set_defaults(func=bench_resolution)
+
+    p = sub.add_parser('flow', help="Face mesh mọi frame vs optical flow")
+    p.add_argument('source', help="File video, thư mục ảnh hoặc synthetic")
+    p.add_argument('--frames', type=int, default=200)
+    p.add_argument('--mesh-every', type=int, default=5)
+    p.set_defaults(func=bench_flow)
+
+    p = sub.add_parser('pipeline', help="fps tuần tự vs pipeline nhiều stage")
+    p.add_argument('source', help="File video, thư mục ảnh hoặc synthetic")
+    p.add_argument('--seconds', type=float, default=10)
+    p.add_argument('--publish-ms', type=float, default=20,
+                   help="Chi phí giả lập của stage publish (ms)")
+    p.add_argument('--queue-size', type=int, default=2)
+    p.add_argument('--motion-gate', action='store_true', help="Bật motion gate")
+    p.set_defaults(func=bench_pipeline)
+
+    p = sub.add_parser('preview', help="Preview ProcessCamera qua ring buffer (cả khi camera khởi động lại)")
+    p.add_argument('source', help="File video, thư mục ảnh hoặc synthetic")
+    p.add_argument('--seconds', type=float, default=5)
+    p.add_argument('--interval', type=float, default=0.2, help="Khoảng nghỉ giữa các lần đo")
+    p.add_argument('--fps', type=float, default=10, help="Số lần lấy preview mỗi giây")
+    p.set_defaults(func=bench_preview)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,732 @@
+"""
+Benchmark cho web server
+
+Ví dụ (server đang chạy ở localhost:5000):
+    CAMERA_SOURCE=clip.mp4 CAMERA_MODE=thread python webserver.py   # hoặc CAMERA_MODE=process
+    python benchmark_server.py latency --requests 500 --concurrency 8 --inference-load 2
+
+Không cần server chạy sẵn:
+    python benchmark_server.py transport --samples 2000
+    python benchmark_server.py fanout --viewers 1 10 50 100
+    python benchmark_server.py sessions --devices 300 --samples 20
+    python benchmark_server.py chart --years 5 --per-day 10
+    python benchmark_server.py history --years 5 --per-day 10
+    python benchmark_server.py cache --refreshes 300 --write-every 50
+    python benchmark_server.py servers --requests 3000 --concurrency 16
+    python benchmark_server.py workers --workers 4 --stores memory sqlite manager
+    python benchmark_server.py checkpoint --sessions 10 100 1000
+"""
+import argparse
+import contextlib
+import io
+import logging
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return float('nan')
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def print_latency(name, values, elapsed=None):
+    if not values:
+        # Vd. bench_sessions với --samples < 10 không gửi add_break_warning nào
+        print(f"  {name:<24} n=    0 (không có request)")
+        return
+    line = (f"  {name:<24} n={len(values):>5} p50={percentile(values, 50):8.2f}ms "
+            f"p95={percentile(values, 95):8.2f}ms p99={percentile(values, 99):8.2f}ms "
+            f"max={max(values):8.2f}ms")
+    if elapsed:
+        line += f" {len(values) / elapsed:8.1f} req/s"
+    print(line)
+
+
+def timed_get(session, url):
+    t0 = time.perf_counter()
+    session.get(url, timeout=30)
+    return (time.perf_counter() - t0) * 1000
+
+
+def bench_latency(args):
+    """Độ trễ /api/history và /api/chart_data khi có tải suy luận song song"""
+    stop = threading.Event()
+    inference_count = [0]
+
+    def inference_load():
+        # Mỗi lần gọi /check_distance là một lần đo (chụp + face mesh) trên server
+        session = requests.Session()
+        while not stop.is_set():
+            try:
+                session.get(f"{args.url}/check_distance", timeout=30)
+                inference_count[0] += 1
+            except requests.exceptions.RequestException:
+                time.sleep(0.1)
+
+    # Lần đo đầu tiên mở camera / khởi động process worker, không tính vào kết quả
+    requests.get(f"{args.url}/check_distance", timeout=60)
+
+    loaders = [threading.Thread(target=inference_load, daemon=True)
+               for _ in range(args.inference_load)]
+    for t in loaders:
+        t.start()
+    time.sleep(1)
+
+    local = threading.local()
+
+    def worker(path):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        return path, timed_get(local.session, f"{args.url}{path}")
+
+    paths = ['/api/history', '/api/chart_data'] * (args.requests // 2)
+    results = {'/api/history': [], '/api/chart_data': []}
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for path, ms in pool.map(worker, paths):
+            results[path].append(ms)
+    elapsed = time.time() - start
+    stop.set()
+
+    print(f"{args.url}: {len(paths)} request, concurrency={args.concurrency}, "
+          f"{args.inference_load} luồng /check_distance ({inference_count[0]} lần đo)")
+    for path, values in results.items():
+        print_latency(path, values, elapsed)
+
+
+def bench_transport(args):
+    """Chi phí mỗi mẫu đo: EventBus trong process so với HTTP loopback"""
+    from werkzeug.serving import make_server
+
+    import webserver
+    from event_bus import HttpTransport, TOPIC_DISTANCE
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, webserver.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+    transports = [('event_bus', webserver.event_bus), ('http', HttpTransport(url))]
+    print(f"{args.samples} mẫu mỗi cách gửi (server Flask tại {url})")
+    for name, transport in transports:
+        session = webserver.sessions.start(webserver.LOCAL_DEVICE)
+        timings = []
+        # Bỏ print của handler để chỉ đo chi phí vận chuyển
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(args.samples):
+                t0 = time.perf_counter()
+                transport.publish(TOPIC_DISTANCE, {'distance': 45.0 + i % 10})
+                timings.append((time.perf_counter() - t0) * 1000)
+        received = webserver.sessions.stop(webserver.LOCAL_DEVICE).stats.count
+        print(f"  {name:<10} mean={statistics.mean(timings) * 1000:9.1f}us "
+              f"p50={percentile(timings, 50) * 1000:9.1f}us "
+              f"p99={percentile(timings, 99) * 1000:9.1f}us nhận={received}")
+    server.shutdown()
+
+
+def bench_fanout(args):
+    """Chi phí publish SSE và độ trễ tới người xem khi tăng số dashboard"""
+    from broadcaster import Broadcaster
+
+    print(f"{args.events} sự kiện, nhịp {args.rate}/s")
+    for viewers in args.viewers:
+        broadcaster = Broadcaster(heartbeat=1)
+        delays = []
+        delays_lock = threading.Lock()
+        ready = threading.Barrier(viewers + 1)
+
+        def viewer():
+            stream = broadcaster.stream()
+            next(stream)  # dòng retry, đăng ký xong
+            ready.wait()
+            received = 0
+            for chunk in stream:
+                now = time.perf_counter()
+                for line in chunk.split(b'\n'):
+                    if line.startswith(b'data: '):
+                        sent_at = float(line[6:].split(b'"t": ')[1].rstrip(b'}'))
+                        with delays_lock:
+                            delays.append((now - sent_at) * 1000)
+                        received += 1
+                if received >= args.events:
+                    break
+
+        threads = [threading.Thread(target=viewer, daemon=True) for _ in range(viewers)]
+        for t in threads:
+            t.start()
+        ready.wait()
+
+        publish_ms = []
+        for i in range(args.events):
+            t0 = time.perf_counter()
+            broadcaster.publish('distance', {'distance': 50.0, 't': t0})
+            publish_ms.append((time.perf_counter() - t0) * 1000)
+            time.sleep(1 / args.rate)
+        for t in threads:
+            t.join(timeout=5)
+        broadcaster.close()
+
+        print(f"  {viewers:>4} người xem: publish p50={percentile(publish_ms, 50) * 1000:7.1f}us "
+              f"p99={percentile(publish_ms, 99) * 1000:7.1f}us | "
+              f"tới người xem p50={percentile(delays, 50):6.2f}ms "
+              f"p99={percentile(delays, 99):6.2f}ms ({len(delays)}/{viewers * args.events})")
+
+
+def start_local_server():
+    """Chạy app của webserver.py trong process này với database tạm"""
+    import tempfile
+    from werkzeug.serving import make_server
+
+    import webserver
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    from session_db import SessionDB
+
+    webserver.session_db = SessionDB(os.path.join(tempfile.mkdtemp(), 'bench_sessions.db'))
+    webserver.init_db()
+    server = make_server('127.0.0.1', 0, webserver.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return webserver, server, f"http://127.0.0.1:{server.server_port}"
+
+
+def bench_sessions(args):
+    """Nhiều bàn cùng lúc: mỗi bàn một phiên, gửi mẫu song song, có một bàn gửi liên tục"""
+    webserver, server, url = start_local_server()
+    timings = {'start_work': [], 'add_distance': [], 'add_break_warning': [],
+               'current_session': [], 'stop_work': []}
+    lock = threading.Lock()
+    errors = []
+
+    def timed(name, method, path, **kwargs):
+        t0 = time.perf_counter()
+        response = method(f"{url}{path}", timeout=30, **kwargs)
+        ms = (time.perf_counter() - t0) * 1000
+        with lock:
+            timings[name].append(ms)
+        return response.json()
+
+    def desk(index):
+        device_id = f"desk-{index}"
+        session = requests.Session()
+        body = {'device_id': device_id}
+        try:
+            timed('start_work', session.post, '/start_work', json=body)
+            for i in range(args.samples):
+                timed('add_distance', session.post, '/add_distance',
+                      json=dict(body, distance=40.0 + index % 20, ts=i))
+                if i % 10 == 9:
+                    timed('add_break_warning', session.post, '/add_break_warning', json=body)
+            info = timed('current_session', session.get,
+                         f"/api/current_session?device_id={device_id}")
+            if info.get('distance_count') != args.samples:
+                errors.append(f"{device_id}: {info.get('distance_count')} mẫu")
+            result = timed('stop_work', session.post, '/stop_work', json=body)
+            if result.get('break_warnings') != args.samples // 10:
+                errors.append(f"{device_id}: {result.get('break_warnings')} cảnh báo")
+        except Exception as e:
+            errors.append(f"{device_id}: {e}")
+
+    # Bàn "nóng": gửi mẫu liên tục suốt thời gian đo
+    stop = threading.Event()
+    hot_samples = [0]
+
+    def hot_desk():
+        session = requests.Session()
+        body = {'device_id': 'hot-desk'}
+        session.post(f"{url}/start_work", json=body)
+        while not stop.is_set():
+            session.post(f"{url}/add_distance", json=dict(body, distance=45.0))
+            hot_samples[0] += 1
+        session.post(f"{url}/stop_work", json=body)
+
+    hot = threading.Thread(target=hot_desk, daemon=True)
+    hot.start()
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(desk, range(args.devices)))
+        stop.set()
+        hot.join()
+    elapsed = time.time() - start
+    server.shutdown()
+
+    total = sum(len(v) for v in timings.values())
+    print(f"{args.devices} bàn x {args.samples} mẫu, concurrency={args.concurrency}, "
+          f"bàn nóng gửi {hot_samples[0]} mẫu; {total} request trong {elapsed:.1f}s "
+          f"({total / elapsed:.0f} req/s)")
+    for name, values in timings.items():
+        print_latency(name, values)
+    print(f"  Sai lệch dữ liệu: {len(errors)}" + (f" ({errors[:3]})" if errors else ""))
+
+
+# Cách /api/chart_data tính trước khi có bảng daily_stats
+CHART_SCAN_SQL = '''
+    SELECT date(start_ts, 'unixepoch', 'localtime') AS day, COUNT(*) AS sessions,
+           SUM(duration_s) AS total_seconds, AVG(avg_distance) AS avg_distance,
+           SUM(distance_warning) AS distance_warnings, SUM(break_warnings) AS break_warnings
+    FROM sessions
+    WHERE start_ts >= ? AND start_ts < ?
+    GROUP BY day
+    ORDER BY day
+'''
+
+
+def build_history_db(path, years, per_day):
+    """Database phiên giả lập: years năm, per_day phiên mỗi ngày (kèm daily_stats)"""
+    import random
+    from datetime import datetime, timedelta
+
+    from session_db import SessionDB
+
+    db = SessionDB(path)
+    db.init_db()
+    rng = random.Random(1)
+    days = years * 365
+    first = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0) - timedelta(days=days)
+    rows = []
+    for d in range(days):
+        day_start = int((first + timedelta(days=d)).timestamp())
+        for i in range(per_day):
+            start_ts = day_start + i * 3600 + rng.randint(0, 600)
+            rows.append((start_ts, start_ts + rng.randint(300, 3000), rng.uniform(35, 70),
+                         rng.randint(0, 3), rng.randint(0, 1), f"desk-{i % 5}"))
+    with db.get_connection() as conn:
+        with conn:
+            conn.executemany('''
+                INSERT INTO sessions (start_ts, end_ts, duration_s, avg_distance,
+                                      break_warnings, distance_warning, device_id)
+                VALUES (?1, ?2, ?2 - ?1, ?3, ?4, ?5, ?6)
+            ''', rows)
+    t0 = time.perf_counter()
+    db.rebuild_daily_stats()
+    print(f"{len(rows)} phiên / {days} ngày; rebuild-daily {(time.perf_counter() - t0) * 1000:.0f}ms")
+    return db
+
+
+def bench_chart(args):
+    """/api/chart_data: quét + GROUP BY bảng sessions so với đọc daily_stats"""
+    import tempfile
+    from datetime import datetime, timedelta
+
+    db = build_history_db(os.path.join(tempfile.mkdtemp(), 'bench_chart.db'),
+                          args.years, args.per_day)
+
+    def scan(start_day, end_day):
+        start = datetime.strptime(start_day or '1970-01-02', '%Y-%m-%d')
+        end = datetime.strptime(end_day, '%Y-%m-%d') + timedelta(days=1) if end_day else datetime(9999, 1, 1)
+        with db.get_connection() as conn:
+            return conn.execute(CHART_SCAN_SQL, (int(start.timestamp()), int(end.timestamp()))).fetchall()
+
+    recent = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+    for label, start_day in (('toàn bộ', None), ('30 ngày', recent)):
+        expected = [tuple(r) for r in scan(start_day, None)]
+        got = [tuple(r) for r in db.daily_summary(start_day, None)]
+        same = len(expected) == len(got) and all(
+            e[:3] == g[:3] and abs(e[3] - g[3]) < 1e-6 and e[4:] == g[4:] for e, g in zip(expected, got))
+        for name, func in (('quét sessions', scan), ('daily_stats', db.daily_summary)):
+            timings = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                func(start_day, None)
+                timings.append((time.perf_counter() - t0) * 1000)
+            print(f"  {label:<8} {name:<14} p50={percentile(timings, 50):8.2f}ms "
+                  f"p99={percentile(timings, 99):8.2f}ms ({len(got)} ngày, khớp={same})")
+
+    # Chi phí thêm cho mỗi lần kết thúc phiên
+    now = int(time.time())
+    timings = []
+    for i in range(200):
+        t0 = time.perf_counter()
+        db.insert_session(now - 1800, now, 50.0, 1, 0, 'bench')
+        timings.append((time.perf_counter() - t0) * 1000)
+    print_latency('insert_session + upsert', timings)
+
+
+def bench_history(args):
+    """/api/history: toàn bộ lịch sử so với trang đầu / trang sâu / 304"""
+    import tempfile
+    from datetime import datetime, timedelta
+
+    import webserver
+
+    webserver.session_db = build_history_db(os.path.join(tempfile.mkdtemp(), 'bench_history.db'),
+                                            args.years, args.per_day)
+    webserver.response_cache.max_entries = 0  # đo truy vấn, không đo cache
+    client = webserver.app.test_client()
+
+    # Trang sâu: đi theo next_cursor tới giữa lịch sử
+    cursor, pages = None, 0
+    total = args.years * 365 * args.per_day
+    while pages < total // (2 * args.limit):
+        cursor = client.get(f"/api/history?limit={args.limit}&cursor={cursor or ''}").get_json()['next_cursor']
+        pages += 1
+    etag = client.get(f"/api/history?limit={args.limit}").headers['ETag']
+    recent = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+
+    def full_list():
+        # Cách cũ: đọc và định dạng mọi phiên
+        return [dict(row) for row in webserver.session_db.list_sessions()]
+
+    cases = [
+        ('toàn bộ (cách cũ)', full_list),
+        (f'trang đầu ({args.limit})', lambda: client.get(f"/api/history?limit={args.limit}")),
+        (f'trang {pages + 1}', lambda: client.get(f"/api/history?limit={args.limit}&cursor={cursor}")),
+        ('chỉ cảnh báo', lambda: client.get(f"/api/history?limit={args.limit}&warnings=1")),
+        ('30 ngày', lambda: client.get(f"/api/history?limit={args.limit}&start={recent}")),
+        ('304 (ETag khớp)', lambda: client.get(f"/api/history?limit={args.limit}",
+                                               headers={'If-None-Match': etag})),
+    ]
+    for name, func in cases:
+        timings = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - t0) * 1000)
+        print_latency(name, timings)
+
+
+def bench_cache(args):
+    """Dashboard tải lại liên tục: /api/history + /api/chart_data có và không có cache"""
+    import tempfile
+
+    import webserver
+
+    webserver.session_db = build_history_db(os.path.join(tempfile.mkdtemp(), 'bench_cache.db'),
+                                            args.years, args.per_day)
+    client = webserver.app.test_client()
+    paths = ['/api/history', '/api/chart_data', '/api/history?warnings=1']
+    now = int(time.time())
+
+    for label, size in (('không cache', 0), ('có cache', webserver.RESPONSE_CACHE_SIZE)):
+        webserver.response_cache = cache = webserver.ResponseCache(max_entries=size)
+        timings = []
+        start = time.perf_counter()
+        for i in range(args.refreshes):
+            # Cứ args.write_every lần tải lại có một phiên kết thúc (như stop_work)
+            if args.write_every and i % args.write_every == args.write_every - 1:
+                webserver.session_db.insert_session(now - 600, now, 50.0, 0, 0, 'bench')
+                cache.invalidate()
+            t0 = time.perf_counter()
+            for path in paths:
+                client.get(path)
+            timings.append((time.perf_counter() - t0) * 1000)
+        print_latency(label, timings, time.perf_counter() - start)
+        stats = cache.get_stats()
+        print(f"    hits={stats['hits']} misses={stats['misses']} hit_rate={stats['hit_rate']}")
+
+
+def free_port():
+    import socket
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def bench_servers(args):
+    """Server phát triển (app.run debug) so với serve.py: req/s và độ trễ đuôi"""
+    import signal
+    import subprocess
+    import sys
+    import tempfile
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    modes = {
+        'dev (app.run debug)': lambda port, db: [
+            sys.executable, '-c',
+            "import sys, webserver; webserver.create_app(sys.argv[2]); "
+            "webserver.app.run(host='127.0.0.1', port=int(sys.argv[1]), debug=True, use_reloader=False)",
+            str(port), db],
+    }
+    for server in args.servers:
+        modes[f"serve.py {server} x{args.threads}"] = lambda port, db, server=server: [
+            sys.executable, os.path.join(here, 'serve.py'), '--host', '127.0.0.1',
+            '--port', str(port), '--threads', str(args.threads), '--server', server, '--db', db]
+
+    env = dict(os.environ, CAMERA_SOURCE=os.environ.get('CAMERA_SOURCE', 'synthetic'))
+    print(f"{args.requests} request mỗi endpoint, concurrency={args.concurrency}")
+    for name, command in modes.items():
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        db = os.path.join(tempfile.mkdtemp(), 'bench_servers.db')
+        process = subprocess.Popen(command(port, db), cwd=here, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            for _ in range(300):
+                try:
+                    requests.get(f"{url}/api/cache_stats", timeout=1)
+                    break
+                except requests.exceptions.ConnectionError:
+                    time.sleep(0.1)
+            else:
+                print(f"  {name}: server không khởi động được")
+                continue
+
+            print(f"  {name}")
+            for endpoint in ('current_session', 'add_distance'):
+                per_worker = args.requests // args.concurrency
+
+                def client(index, endpoint=endpoint):
+                    session = requests.Session()
+                    body = {'device_id': f"bench-{index}"}
+                    session.post(f"{url}/start_work", json=body, timeout=30)
+                    timings = []
+                    for i in range(per_worker):
+                        t0 = time.perf_counter()
+                        if endpoint == 'current_session':
+                            session.get(f"{url}/api/current_session", params=body, timeout=30)
+                        else:
+                            session.post(f"{url}/add_distance", json=dict(body, distance=45.0, ts=i),
+                                         timeout=30)
+                        timings.append((time.perf_counter() - t0) * 1000)
+                    session.post(f"{url}/stop_work", json=body, timeout=30)
+                    return timings
+
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                    results = list(pool.map(client, range(args.concurrency)))
+                elapsed = time.perf_counter() - start
+                print_latency(endpoint, [ms for timings in results for ms in timings], elapsed)
+        finally:
+            t0 = time.perf_counter()
+            process.send_signal(signal.SIGTERM)
+            try:
+                code = process.wait(timeout=30)
+                print(f"    SIGTERM -> thoát sau {(time.perf_counter() - t0) * 1000:.0f}ms (code {code})")
+            except subprocess.TimeoutExpired:
+                process.kill()
+                print("    SIGTERM -> không thoát sau 30s")
+
+
+def bench_workers(args):
+    """Nhiều worker process: mẫu có bị mất không, theo từng kho phiên (SESSION_STORE)"""
+    import signal
+    import subprocess
+    import sys
+    import tempfile
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    print(f"{args.devices} bàn x {args.samples} mẫu, concurrency={args.concurrency}")
+    for store in args.stores:
+        for workers in sorted({1, args.workers}):
+            tmp = tempfile.mkdtemp()
+            helpers = []
+            if store == 'memory':
+                spec = 'memory'
+            elif store == 'sqlite':
+                spec = f"sqlite:{os.path.join(tmp, 'session_state.db')}"
+            else:
+                store_port = free_port()
+                spec = f"manager:127.0.0.1:{store_port}"
+                helpers.append(subprocess.Popen(
+                    [sys.executable, os.path.join(here, 'session_store.py'), 'serve',
+                     '--port', str(store_port)], stdout=subprocess.DEVNULL))
+                time.sleep(1)
+            port = free_port()
+            url = f"http://127.0.0.1:{port}"
+            env = dict(os.environ, SESSION_STORE=spec,
+                       CAMERA_SOURCE=os.environ.get('CAMERA_SOURCE', 'synthetic'))
+            server = subprocess.Popen(
+                [sys.executable, os.path.join(here, 'serve.py'), '--host', '127.0.0.1',
+                 '--port', str(port), '--workers', str(workers), '--server', 'werkzeug',
+                 '--db', os.path.join(tmp, 'bench_workers.db')],
+                cwd=here, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                for _ in range(300):
+                    try:
+                        requests.get(f"{url}/api/cache_stats", timeout=1)
+                        break
+                    except requests.exceptions.ConnectionError:
+                        time.sleep(0.1)
+                time.sleep(workers * 0.5)  # các worker còn lại khởi động xong
+
+                timings = []
+                lock = threading.Lock()
+
+                def desk(index):
+                    body = {'device_id': f"desk-{index}"}
+                    requests.post(f"{url}/start_work", json=body, timeout=30)
+                    for i in range(args.samples):
+                        t0 = time.perf_counter()
+                        requests.post(f"{url}/add_distance", json=dict(body, distance=45.0, ts=i),
+                                      timeout=30)
+                        with lock:
+                            timings.append((time.perf_counter() - t0) * 1000)
+                    result = requests.post(f"{url}/stop_work", json=body, timeout=30).json()
+                    return result.get('stats', {}).get('count', 0)
+
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                    received = sum(pool.map(desk, range(args.devices)))
+                elapsed = time.perf_counter() - start
+                sent = args.devices * args.samples
+                print_latency(f"{store} x{workers} worker", timings, elapsed)
+                print(f"    mẫu được lưu vào phiên: {received}/{sent} (mất {sent - received})")
+            finally:
+                server.send_signal(signal.SIGTERM)
+                server.wait()
+                for helper in helpers:
+                    helper.terminate()
+                    helper.wait()
+
+
+def bench_checkpoint(args):
+    """Chi phí mỗi lượt checkpoint phiên đang chạy và ảnh hưởng tới độ trễ request"""
+    import tempfile
+
+    from session_checkpoint import SessionCheckpointer
+    from session_registry import SessionRegistry
+
+    tmp = tempfile.mkdtemp()
+    for synchronous in ('FULL', 'NORMAL'):
+        for count in args.sessions:
+            registry = SessionRegistry()
+            for index in range(count):
+                session = registry.start(f"desk-{index}")
+                for i in range(100):
+                    session.add_distance(40.0 + i % 20, i)
+            path = os.path.join(tmp, f"checkpoint_{synchronous}_{count}.db")
+            checkpointer = SessionCheckpointer(registry, path, synchronous=synchronous)
+            timings = []
+            for round_index in range(args.rounds):
+                # Mọi phiên đều có mẫu mới giữa hai lượt (trường hợp xấu nhất)
+                for session in registry.active():
+                    session.add_distance(45.0, 1000 + round_index)
+                t0 = time.perf_counter()
+                checkpointer.checkpoint()
+                timings.append((time.perf_counter() - t0) * 1000)
+            print_latency(f"{synchronous:<6} {count:>5} phiên", timings)
+
+            t0 = time.perf_counter()
+            recovered = SessionCheckpointer(SessionRegistry(), path).recover()
+            print(f"    khôi phục {len(recovered)} phiên: {(time.perf_counter() - t0) * 1000:.1f}ms")
+
+    # Phiên rảnh (không có mẫu mới) rồi server tắt đột ngột 30s: heartbeat giữ
+    # ts mới nên phiên được khôi phục, không bị đóng tại lần ghi mẫu cuối
+    registry = SessionRegistry()
+    registry.start('idle').add_distance(45.0, 1)
+    path = os.path.join(tmp, 'idle.db')
+    checkpointer = SessionCheckpointer(registry, path)
+    for elapsed in range(0, 1201, 5):
+        checkpointer.checkpoint(now=1000 + elapsed)
+    expired = []
+    recovered = SessionCheckpointer(SessionRegistry(), path).recover(
+        max_gap=600, on_expired=lambda session, ended_at: expired.append(ended_at), now=2230)
+    ok = len(recovered) == 1 and not expired and round(recovered[0][1]) == 30
+    print(f"  phiên rảnh 20 phút rồi tắt 30s: khôi phục {len(recovered)}, đóng {len(expired)}, "
+          f"gap {recovered[0][1] if recovered else '-'}s -> {'OK' if ok else 'LỖI'}")
+    if not ok:
+        raise SystemExit(1)
+
+    # Độ trễ /add_distance khi checkpoint chạy nền (chu kỳ ngắn để dễ thấy ảnh hưởng)
+    webserver, server, url = start_local_server()
+    session = requests.Session()
+    for index in range(args.desks):
+        session.post(f"{url}/start_work", json={'device_id': f"desk-{index}"})
+    checkpointer = SessionCheckpointer(webserver.sessions, os.path.join(tmp, 'live.db'),
+                                       interval=args.interval)
+    for label in ('không checkpoint', f"checkpoint mỗi {args.interval}s"):
+        if label != 'không checkpoint':
+            checkpointer.start()
+        timings = []
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(args.requests):
+                t0 = time.perf_counter()
+                session.post(f"{url}/add_distance",
+                             json={'device_id': f"desk-{i % args.desks}", 'distance': 45.0, 'ts': i})
+                timings.append((time.perf_counter() - t0) * 1000)
+        print_latency(label, timings, time.perf_counter() - start)
+    checkpointer.stop()
+    print(f"    {checkpointer.rounds} lượt, {checkpointer.rows_written} dòng, "
+          f"p50 {checkpointer.timing.snapshot()['p50_ms']}ms/lượt")
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark web server")
+    parser.add_argument('--url', default="http://localhost:5000")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('latency', help="p99 của API lịch sử khi có suy luận song song")
+    p.add_argument('--requests', type=int, default=500)
+    p.add_argument('--concurrency', type=int, default=8)
+    p.add_argument('--inference-load', type=int, default=2,
+                   help="Số luồng gọi /check_distance liên tục")
+    p.set_defaults(func=bench_latency)
+
+    p = sub.add_parser('transport', help="Chi phí mỗi mẫu: EventBus so với HTTP loopback")
+    p.add_argument('--samples', type=int, default=2000)
+    p.set_defaults(func=bench_transport)
+
+    p = sub.add_parser('fanout', help="SSE: chi phí publish theo số người xem")
+    p.add_argument('--viewers', type=int, nargs='+', default=[1, 10, 50, 100])
+    p.add_argument('--events', type=int, default=200)
+    p.add_argument('--rate', type=float, default=50, help="Số sự kiện mỗi giây")
+    p.set_defaults(func=bench_fanout)
+
+    p = sub.add_parser('sessions', help="Tải nhiều bàn: registry phiên theo device_id")
+    p.add_argument('--devices', type=int, default=300)
+    p.add_argument('--samples', type=int, default=20, help="Số mẫu mỗi bàn")
+    p.add_argument('--concurrency', type=int, default=32)
+    p.set_defaults(func=bench_sessions)
+
+    p = sub.add_parser('chart', help="/api/chart_data: quét sessions so với daily_stats")
+    p.add_argument('--years', type=int, default=5)
+    p.add_argument('--per-day', type=int, default=10, help="Số phiên mỗi ngày")
+    p.add_argument('--repeat', type=int, default=50)
+    p.set_defaults(func=bench_chart)
+
+    p = sub.add_parser('history', help="/api/history: phân trang keyset và 304")
+    p.add_argument('--years', type=int, default=5)
+    p.add_argument('--per-day', type=int, default=10, help="Số phiên mỗi ngày")
+    p.add_argument('--limit', type=int, default=50, help="Số phiên mỗi trang")
+    p.add_argument('--repeat', type=int, default=50)
+    p.set_defaults(func=bench_history)
+
+    p = sub.add_parser('cache', help="Cache response của API lịch sử / biểu đồ")
+    p.add_argument('--years', type=int, default=5)
+    p.add_argument('--per-day', type=int, default=10, help="Số phiên mỗi ngày")
+    p.add_argument('--refreshes', type=int, default=300, help="Số lần dashboard tải lại")
+    p.add_argument('--write-every', type=int, default=50,
+                   help="Một phiên mới sau mỗi N lần tải lại (0 = không ghi)")
+    p.set_defaults(func=bench_cache)
+
+    p = sub.add_parser('servers', help="Server phát triển so với serve.py (production)")
+    p.add_argument('--requests', type=int, default=3000, help="Số request mỗi endpoint")
+    p.add_argument('--concurrency', type=int, default=16)
+    p.add_argument('--threads', type=int, default=16, help="--threads của serve.py")
+    p.add_argument('--servers', nargs='+', default=['werkzeug'], choices=['werkzeug', 'waitress'])
+    p.set_defaults(func=bench_servers)
+
+    p = sub.add_parser('workers', help="Nhiều worker process với từng kho phiên")
+    p.add_argument('--workers', type=int, default=4)
+    p.add_argument('--stores', nargs='+', default=['memory', 'sqlite'],
+                   choices=['memory', 'sqlite', 'manager'])
+    p.add_argument('--devices', type=int, default=20)
+    p.add_argument('--samples', type=int, default=50, help="Số mẫu mỗi bàn")
+    p.add_argument('--concurrency', type=int, default=8)
+    p.set_defaults(func=bench_workers)
+
+    p = sub.add_parser('checkpoint', help="Chi phí checkpoint phiên đang chạy")
+    p.add_argument('--sessions', type=int, nargs='+', default=[10, 100, 1000],
+                   help="Số phiên đang chạy")
+    p.add_argument('--rounds', type=int, default=50)
+    p.add_argument('--desks', type=int, default=50, help="Số bàn gửi mẫu khi đo độ trễ")
+    p.add_argument('--requests', type=int, default=3000)
+    p.add_argument('--interval', type=float, default=0.5, help="Chu kỳ checkpoint khi đo độ trễ")
+    p.set_defaults(func=bench_checkpoint)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import collections
+import json
+import threading
+
+
+class Broadcaster:
+    def __init__(self, history=200, heartbeat=15, retry_ms=3000):
+        """
+        Phát sự kiện Server-Sent Events tới mọi dashboard đang kết nối
+
+        Mỗi sự kiện được encode một lần thành bytes và nối vào một log dùng
+        chung; các client đọc từ log đó nên chi phí publish() không tăng theo
+        số người xem. Log giữ history sự kiện cuối để client kết nối lại (gửi
+        Last-Event-ID) nhận bù phần đã lỡ.
+
+        Args:
+            history: số sự kiện giữ lại để phát bù
+            heartbeat: gửi dòng comment sau chừng này giây không có sự kiện
+                để giữ kết nối qua proxy
+            retry_ms: thời gian trình duyệt chờ trước khi tự kết nối lại
+        """
+        self.heartbeat = heartbeat
+        self.retry_ms = retry_ms
+        self._log = collections.deque(maxlen=history)
+        self._cond = threading.Condition()
+        self._last_id = 0
+        self._closed = False
+        self.subscribers = 0
+        self.published = 0
+
+    def publish(self, event, data):
+        """Encode sự kiện một lần và đánh thức các client"""
+        with self._cond:
+            self._last_id += 1
+            message = (f"id: {self._last_id}\nevent: {event}\n"
+                       f"data: {json.dumps(data)}\n\n").encode('utf-8')
+            self._log.append((self._last_id, message))
+            self.published += 1
+            self._cond.notify_all()
+        return self._last_id
+
+    def _pending(self, after_id):
+        """Các sự kiện có id > after_id còn trong log (gọi khi đang giữ khóa)"""
+        if not self._log or self._log[-1][0] <= after_id:
+            return []
+        return [message for event_id, message in self._log if event_id > after_id]
+
+    def stream(self, last_event_id=None):
+        """
+        Generator bytes cho một client (dùng làm body của Response)
+
+        Args:
+            last_event_id: id sự kiện cuối client đã nhận (header Last-Event-ID);
+                None = chỉ nhận sự kiện mới
+        """
+        with self._cond:
+            self.subscribers += 1
+            if last_event_id is None:
+                cursor = self._last_id
+            else:
+                # id lớn hơn id hiện tại: server đã khởi động lại, nhận từ giờ
+                cursor = min(last_event_id, self._last_id)
+        try:
+            yield f"retry: {self.retry_ms}\n\n".encode('utf-8')
+            while not self._closed:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._last_id > cursor or self._closed,
+                                        self.heartbeat)
+                    messages = self._pending(cursor)
+                    cursor = self._last_id
+                if messages:
+                    yield b''.join(messages)
+                elif not self._closed:
+                    yield b": heartbeat\n\n"
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+    def close(self):
+        """Kết thúc mọi stream (khi tắt server)"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def get_stats(self):
+        return {
+            'subscribers': self.subscribers,
+            'published': self.published,
+            'last_id': self._last_id
+        }
@@ -0,0 +1,47 @@
+"""
+Chạy camera trên máy riêng và gửi mẫu đo về web server theo lô
+
+Ví dụ:
+    python camera_node.py --server http://192.168.1.10:5000 --source 0
+"""
+import argparse
+import socket
+import time
+
+from distance_utils import DistanceCamera
+from telemetry_uploader import TelemetryUploader
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Camera node gửi dữ liệu về server")
+    parser.add_argument('--server', default="http://localhost:5000")
+    parser.add_argument('--source', default='0', help="Số webcam, file video hoặc synthetic")
+    parser.add_argument('--device-id', default=socket.gethostname(),
+                        help="Mã bàn; bắt đầu phiên bằng POST /start_work {\"device_id\": ...}")
+    parser.add_argument('--interval', type=float, default=3)
+    parser.add_argument('--batch-size', type=int, default=20)
+    parser.add_argument('--flush-interval', type=float, default=5)
+    parser.add_argument('--spool', default='telemetry_spool.jsonl')
+    args = parser.parse_args()
+
+    uploader = TelemetryUploader(args.server, device_id=args.device_id,
+                                 batch_size=args.batch_size,
+                                 flush_interval=args.flush_interval, spool_path=args.spool)
+    camera = DistanceCamera(source=args.source, threaded_capture=True, motion_gate=True)
+
+    uploader.start()
+    camera.start_monitoring(interval=args.interval, adaptive=True, transport=uploader)
+    print(f"🎥 [{args.device_id}] Đang gửi dữ liệu về {args.server} (Ctrl+C để dừng)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("⏹️ Dừng camera node...")
+    finally:
+        camera.stop_monitoring()
+        uploader.stop()
+        print(f"📊 {uploader.get_stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+import multiprocessing as mp
+import threading
+import time
+
+import cv2
+
+from event_bus import CAMERA_TOPICS, EventBus, TOPIC_DISTANCE
+from frame_ring import FrameRing
+
+# Các hàm của DistanceCamera được phép gọi từ process web
+ALLOWED_METHODS = (
+    'get_distance', 'measure', 'is_too_close', 'save_image_with_distance',
+    'start_monitoring', 'stop_monitoring', 'stop_camera', 'get_stats', 'get_metrics',
+    'get_preview_jpeg'
+)
+
+# Thông báo frame vừa phân tích (không phải topic của EventBus)
+_ANALYZED = 'analyzed'
+
+# Process web chỉ copy frame phân tích từ ring khi preview được xem gần đây
+_PREVIEW_IDLE = 2.0
+
+
+def _worker_main(conn, event_conn, camera_kwargs):
+    """
+    Hàm chạy trong process riêng: giữ DistanceCamera (camera + MediaPipe)
+    và thực hiện lệnh nhận qua pipe
+
+    Sự kiện của vòng giám sát được publish vào EventBus của process con rồi
+    chuyển qua event_conn cho process web, cùng với thông báo frame vừa phân
+    tích (tên ring, seq của frame trong ring, khoảng cách, vị trí mắt).
+    """
+    from distance_utils import DistanceCamera
+
+    send_lock = threading.Lock()
+
+    def send_event(topic, payload):
+        # Vòng giám sát và lệnh measure gửi từ hai thread khác nhau
+        with send_lock:
+            event_conn.send((topic, payload))
+
+    camera = DistanceCamera(**camera_kwargs)
+    if camera_kwargs.get('shared_frames'):
+        camera.on_analyzed = lambda *info: send_event(_ANALYZED, info)
+    bus = EventBus()
+    for topic in CAMERA_TOPICS:
+        bus.subscribe(topic, lambda payload, topic=topic: send_event(topic, payload))
+    try:
+        while True:
+            try:
+                method, args, kwargs = conn.recv()
+            except (EOFError, OSError):
+                break
+            if method == 'shutdown':
+                conn.send(('ok', None, {}))
+                break
+
+            try:
+                if method not in ALLOWED_METHODS:
+                    raise ValueError(f"Không hỗ trợ lệnh {method}")
+                if kwargs.pop('forward_events', False):
+                    kwargs['event_bus'] = bus
+                result = getattr(camera, method)(*args, **kwargs)
+                status = 'ok'
+            except Exception as e:
+                result = str(e)
+                status = 'error'
+            state = {
+                'last_distance': camera.last_distance,
+                'last_cached': camera.last_cached,
+                'last_measured_at': camera.last_measured_at
+            }
+            conn.send((status, result, state))
+    finally:
+        camera.stop_monitoring()
+        camera.stop_camera()
+        event_conn.close()
+
+
+class ProcessCamera:
+    def __init__(self, call_timeout=10, **camera_kwargs):
+        """
+        DistanceCamera chạy trong process riêng
+
+        Camera và suy luận MediaPipe nằm ở process con nên không tranh GIL với
+        các thread của Flask; process web chỉ gửi lệnh và nhận kết quả qua pipe.
+        Có cùng các hàm với DistanceCamera mà webserver sử dụng.
+
+        Với shared_frames > 0 (và threaded_capture), preview không nhận JPEG
+        qua pipe: process con báo seq của frame vừa phân tích kèm khoảng cách
+        và vị trí mắt, process web copy đúng frame đó từ ring buffer shared
+        memory rồi vẽ và encode. Seq của preview do process web tự đếm nên
+        không bị ảnh hưởng khi ring được tạo lại (camera khởi động lại, đổi
+        kích thước frame).
+
+        Args:
+            call_timeout: Thời gian chờ kết quả tối đa cho mỗi lệnh (giây)
+            **camera_kwargs: tham số truyền cho DistanceCamera
+        """
+        self.camera_kwargs = camera_kwargs
+        self.safe_distance = camera_kwargs.get('safe_distance', 50)
+        self.call_timeout = call_timeout
+        self.last_distance = 0
+        self.last_cached = False
+        self.last_measured_at = 0
+        self.event_bus = None
+        self._ring = None
+        self._ring_lock = threading.Lock()
+        self.last_analyzed = None
+        self._analyzed_seq = 0
+        self._preview_until = 0
+        self._conn = None
+        self._process = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Khởi động process con (nếu chưa chạy)"""
+        with self._lock:
+            self._start_locked()
+
+    def _start_locked(self):
+        if self._process is not None and self._process.is_alive():
+            return
+        ctx = mp.get_context('spawn')
+        parent_conn, child_conn = ctx.Pipe()
+        event_recv, event_send = ctx.Pipe(duplex=False)
+        self._process = ctx.Process(target=_worker_main,
+                                    args=(child_conn, event_send, self.camera_kwargs),
+                                    name='camera-worker', daemon=True)
+        self._process.start()
+        child_conn.close()
+        event_send.close()
+        self._conn = parent_conn
+        threading.Thread(target=self._forward_events, args=(event_recv,),
+                         name='camera-events', daemon=True).start()
+
+    def _forward_events(self, event_conn):
+        """Nhận sự kiện từ process con và publish lại vào EventBus của process web"""
+        while True:
+            try:
+                topic, payload = event_conn.recv()
+            except (EOFError, OSError):
+                break
+            if topic == _ANALYZED:
+                if time.time() < self._preview_until:
+                    self._remember_analyzed(*payload)
+                continue
+            if topic == TOPIC_DISTANCE:
+                self.last_distance = payload['distance']
+            if self.event_bus is not None:
+                self.event_bus.publish(topic, payload)
+        event_conn.close()
+
+    def _call(self, method, *args, **kwargs):
+        with self._lock:
+            self._start_locked()
+            self._conn.send((method, args, kwargs))
+            if not self._conn.poll(self.call_timeout):
+                # Process con bị treo: dừng hẳn để lần gọi sau khởi động lại
+                self._process.kill()
+                self._process = None
+                raise TimeoutError(f"Camera worker không phản hồi lệnh {method}")
+            status, result, state = self._conn.recv()
+
+        if state:
+            self.last_distance = state['last_distance']
+            self.last_cached = state['last_cached']
+            self.last_measured_at = state['last_measured_at']
+        if status == 'error':
+            raise Exception(result)
+        return result
+
+    def get_distance(self):
+        return tuple(self._call('get_distance'))
+
+    def measure(self, max_age=0):
+        return tuple(self._call('measure', max_age))
+
+    def is_too_close(self, max_age=0):
+        return tuple(self._call('is_too_close', max_age))
+
+    def save_image_with_distance(self, save_path="./"):
+        return tuple(self._call('save_image_with_distance', save_path))
+
+    def start_monitoring(self, *args, event_bus=None, **kwargs):
+        if event_bus is not None:
+            # EventBus không gửi qua pipe được: process con publish vào bus
+            # riêng, sự kiện được chuyển về và publish lại vào event_bus
+            self.event_bus = event_bus
+            kwargs['forward_events'] = True
+        return self._call('start_monitoring', *args, **kwargs)
+
+    def stop_monitoring(self):
+        if self._process is not None:
+            self._call('stop_monitoring')
+
+    def stop_camera(self):
+        if self._process is not None:
+            self._call('stop_camera')
+
+    def get_stats(self):
+        stats = self._call('get_stats')
+        stats['worker_pid'] = self._process.pid if self._process else None
+        return stats
+
+    def get_metrics(self):
+        return self._call('get_metrics')
+
+    def get_preview_jpeg(self, after_seq=0, quality=70):
+        if not self.camera_kwargs.get('shared_frames'):
+            return tuple(self._call('get_preview_jpeg', after_seq, quality))
+        
+        from distance_utils import draw_distance_overlay
+        
+        self._preview_until = time.time() + _PREVIEW_IDLE
+        analyzed = self.last_analyzed
+        if analyzed is None or analyzed[0] <= after_seq:
+            return after_seq, None
+        seq, frame, distance_cm, eyes = analyzed
+        image = draw_distance_overlay(frame.copy(), distance_cm, eyes, self.safe_distance)
+        ok, buf = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return seq, (buf.tobytes() if ok else None)
+    
+    def _remember_analyzed(self, ring_name, frame_seq, distance_cm, eyes):
+        """Copy frame vừa phân tích từ ring buffer của process con cho preview"""
+        with self._ring_lock:
+            ring = self._attach_ring(ring_name)
+            if ring is None:
+                return
+            frame, _ = ring.read(frame_seq)
+            if frame is None:
+                # Frame đã bị ghi đè trước khi kịp đọc
+                return
+            image = frame.copy()
+            if not ring.is_valid(frame_seq):
+                return
+            self._analyzed_seq += 1
+            self.last_analyzed = (self._analyzed_seq, image, distance_cm, eyes)
+    
+    def _attach_ring(self, name):
+        """Ring buffer tên name; attach lại khi process con đã tạo ring mới"""
+        if self._ring is not None and (self._ring.name != name or self._ring.closed):
+            self._ring.close()
+            self._ring = None
+        if self._ring is None and name:
+            try:
+                self._ring = FrameRing.attach(name)
+            except FileNotFoundError:
+                return None
+        return self._ring
+
+    def open_frame_ring(self):
+        """
+        Mở ring buffer frame của process con (cần shared_frames > 0)
+
+        Returns:
+            FrameRing hoặc None nếu camera chưa có frame
+        """
+        name = self.get_stats()['capture'].get('ring')
+        return FrameRing.attach(name) if name else None
+
+    def shutdown(self):
+        """Dừng process con"""
+        with self._ring_lock:
+            if self._ring is not None:
+                self._ring.close()
+                self._ring = None
+        with self._lock:
+            if self._process is None:
+                return
+            try:
+                self._conn.send(('shutdown', (), {}))
+                self._conn.poll(5)
+            except (BrokenPipeError, OSError):
+                pass
+            self._process.join(timeout=5)
+            if self._process.is_alive():
+                self._process.kill()
+            self._process = None
+            self._conn.close()
@@ -1,12 +1,49 @@
 import cv2
 import mediapipe as mp
+import numpy as np
 import time
-import requests
 import threading
 from datetime import datetime
+from adaptive_sampler import AdaptiveSampler
+from event_bus import HttpTransport, TOPIC_BREAK_WARNING, TOPIC_DISTANCE
+from frame_grabber import FrameGrabber
+from frame_sources import open_source
+from metrics import CameraMetrics
+
+def draw_distance_overlay(frame, distance_cm, eyes, safe_distance):
+    """
+    Vẽ khoảng cách và vị trí hai mắt lên frame (vẽ trực tiếp, không copy)
+    
+    Args:
+        frame: ảnh BGR
+        distance_cm: khoảng cách đo được (<= 0: không thấy khuôn mặt)
+        eyes: (x1, y1, x2, y2), hoặc None để chỉ ghi khoảng cách
+        safe_distance: ngưỡng an toàn (chọn màu chữ)
+    """
+    if distance_cm <= 0:
+        cv2.putText(frame, "No face", (30, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 165, 255), 2)
+        return frame
+    
+    # Ghi thông tin lên ảnh
+    color = (0, 255, 0) if distance_cm >= safe_distance else (0, 0, 255)
+    cv2.putText(frame, f"Distance: {distance_cm:.2f} cm", (30, 30),
+                cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
+    
+    if eyes is None:
+        return frame
+    
+    # Vẽ mắt
+    x1, y1, x2, y2 = eyes
+    cv2.circle(frame, (x1, y1), 5, (255, 0, 0), -1)
+    cv2.circle(frame, (x2, y2), 5, (0, 0, 255), -1)
+    cv2.line(frame, (x1, y1), (x2, y2), (255, 255, 0), 2)
+    return frame
 
 class DistanceCamera:
-    def __init__(self, cam_id=0, focal_length=840, real_eye_distance=6.3, safe_distance=50):
+    def __init__(self, cam_id=0, focal_length=840, real_eye_distance=6.3, safe_distance=50,
+                 threaded_capture=False, inference_width=None, motion_gate=False, motion_threshold=4.0,
+                 motion_max_skips=10, flow_tracking=False, mesh_every=5,
+                 flow_max_error=12.0, shared_frames=0, source=None):
         """
         Khởi tạo camera đo khoảng cách
         
@@ -15,11 +52,38 @@ class DistanceCamera:
             focal_length: Tiêu cự ảo của camera
             real_eye_distance: Khoảng cách thực giữa hai mắt (cm)
             safe_distance: Khoảng cách an toàn tối thiểu (cm)
+            threaded_capture: Đọc frame liên tục bằng thread riêng, mỗi lần đo
+                lấy frame mới nhất thay vì frame cũ nằm trong buffer driver
+            inference_width: Chiều rộng ảnh đưa vào face mesh; ảnh rộng hơn được
+                thu nhỏ trước (None = giữ nguyên độ phân giải)
+            motion_gate: Bỏ qua face mesh khi khung hình gần như không đổi so với
+                frame đã phân tích gần nhất, dùng lại kết quả cũ
+            motion_threshold: Mức chênh lệch xám trung bình (0-255) coi là có thay đổi
+            motion_max_skips: Số lần bỏ qua liên tiếp tối đa trước khi bắt buộc đo lại
+            flow_tracking: Giữa các lần chạy face mesh, bám hai điểm mắt bằng
+                optical flow Lucas-Kanade
+            mesh_every: Chạy face mesh đầy đủ mỗi N frame khi flow_tracking
+            flow_max_error: Sai số bám điểm tối đa, vượt quá thì chạy lại face mesh
+            shared_frames: > 0 (cần threaded_capture) thì thread đọc frame ghi thêm
+                vào ring buffer shared memory với số slot này; consumer khác
+                mở bằng FrameRing.attach(camera.frame_ring_name)
+            source: nguồn frame thay cho webcam cam_id: FrameSource, đường dẫn
+                video / thư mục ảnh, hoặc "synthetic" (xem frame_sources.open_source)
         """
         self.cam_id = cam_id
         self.focal_length = focal_length
         self.real_eye_distance = real_eye_distance
         self.safe_distance = safe_distance
+        self.threaded_capture = threaded_capture
+        self.inference_width = inference_width
+        self.motion_gate = motion_gate
+        self.motion_threshold = motion_threshold
+        self.motion_max_skips = motion_max_skips
+        self.flow_tracking = flow_tracking
+        self.mesh_every = mesh_every
+        self.flow_max_error = flow_max_error
+        self.shared_frames = shared_frames
+        self.source = source
         
         # Khởi tạo Face Mesh từ Mediapipe
         self.mp_face_mesh = mp.solutions.face_mesh
@@ -32,23 +96,188 @@ class DistanceCamera:
         
         # Khởi tạo camera
         self.cap = None
+        self.grabber = None
         self.is_monitoring = False
         self.monitoring_thread = None
+        self._stop_event = threading.Event()
+        self.sampler = None
         self.last_distance = 0
+        self.last_frame_seq = 0
+        self.last_frame_time = 0
+        self.frames_read = 0
+        self.metrics = CameraMetrics()
+        self.last_eyes = None
+        
+        # Frame phân tích gần nhất (seq, frame, distance, eyes) cho preview
+        self.last_analyzed = None
+        self._analyzed_seq = 0
+        # Hàm(ring_name, frame_seq, distance, eyes) gọi sau mỗi frame phân tích
+        # (ProcessCamera dùng để dựng preview từ ring buffer ở process web)
+        self.on_analyzed = None
+        
+        # Chỉ một thread được dùng camera + face mesh tại một thời điểm;
+        # measure() gộp các lần đo đồng thời thành một (single-flight)
+        self._mesh_lock = threading.RLock()
+        self._flight = threading.Condition()
+        self._in_flight = False
+        self._flight_gen = 0
+        self._flight_error = None
+        self.last_measurement = None
+        self.last_measured_at = 0
+        self.measure_runs = 0
+        self.measure_shared = 0
+        self.measure_cached = 0
+        
+        # Buffer dựng sẵn cho ảnh thu nhỏ (tránh cấp phát mỗi frame)
+        self._small_buf = None
+        self._rgb_buf = None
+        
+        # Motion gate: ảnh xám thu nhỏ của frame đã phân tích gần nhất
+        self._gate_small = np.empty((48, 64, 3), dtype=np.uint8)
+        self._gate_gray = np.empty((48, 64), dtype=np.uint8)
+        self._gate_ref = None
+        self._gate_ref_id = 0
+        self._gate_result = None
+        self._gate_skips = 0
+        self._gate_lock = threading.Lock()
+        self.last_cached = False
+        self.frames_skipped = 0
+        self.frames_processed = 0
+        
+        # Optical flow: ảnh xám và toạ độ mắt (float) của frame trước
+        self._flow_prev_gray = None
+        self._flow_points = None
+        self._flow_since_mesh = 0
+        self.flow_tracked = 0
+        self.flow_failures = 0
+        self.mesh_runs = 0
         
     def start_camera(self):
         """Khởi động camera"""
         if self.cap is None or not self.cap.isOpened():
-            self.cap = cv2.VideoCapture(self.cam_id)
+            spec = self.source if self.source is not None else self.cam_id
+            self.cap = open_source(spec, loop=True)
             if not self.cap.isOpened():
-                raise Exception(f"Không thể mở camera {self.cam_id}")
+                raise Exception(f"Không thể mở nguồn frame {self.cap.describe()}")
+            if self.threaded_capture:
+                self.grabber = FrameGrabber(self.cap, ring_slots=self.shared_frames)
+                self.grabber.start()
         return True
     
     def stop_camera(self):
         """Dừng camera"""
-        if self.cap is not None:
-            self.cap.release()
-            self.cap = None
+        with self._mesh_lock:
+            if self.grabber is not None:
+                self.grabber.stop()
+                self.grabber = None
+            if self.cap is not None:
+                self.cap.release()
+                self.cap = None
+    
+    @property
+    def frame_ring_name(self):
+        """Tên ring buffer shared memory (None nếu chưa có frame hoặc không bật)"""
+        if self.grabber is not None and self.grabber.ring is not None:
+            return self.grabber.ring.name
+        return None
+    
+    def _read_frame(self):
+        """
+        Lấy một frame từ camera
+        
+        Với threaded_capture, trả về frame mới nhất của thread đọc frame
+        (không chặn); ngược lại đọc trực tiếp từ camera.
+        
+        Returns:
+            tuple: (success, frame)
+        """
+        t0 = time.perf_counter()
+        if self.grabber is not None:
+            ret, frame, seq, timestamp = self.grabber.read_latest()
+            if ret:
+                self.last_frame_seq = seq
+                self.last_frame_time = timestamp
+        else:
+            ret, frame = self.cap.read()
+            if ret:
+                self.frames_read += 1
+                self.last_frame_seq = self.frames_read
+                self.last_frame_time = time.time()
+        self.metrics.record('capture', time.perf_counter() - t0)
+        return ret, frame
+    
+    def read_next_frame(self, last_seq=0, timeout=1.0):
+        """
+        Lấy frame mới hơn last_seq (chờ nếu chưa có), dùng cho các vòng đọc liên tục
+        
+        Returns:
+            tuple: (success, frame, seq, timestamp)
+        """
+        if self.grabber is not None:
+            ret, frame, seq, timestamp = self.grabber.wait_for_new(last_seq, timeout)
+            if ret:
+                self.last_frame_seq = seq
+                self.last_frame_time = timestamp
+            return ret, frame, seq, timestamp
+        
+        ret, frame = self._read_frame()
+        return ret, frame, self.last_frame_seq, self.last_frame_time
+    
+    def get_stats(self):
+        """
+        Thống kê camera
+        
+        Returns:
+            dict: thông tin đọc frame (số frame, frame bị bỏ qua, tuổi frame)
+        """
+        if self.grabber is not None:
+            capture = self.grabber.get_stats()
+        else:
+            capture = {
+                'frames_read': self.frames_read,
+                'frames_dropped': 0,
+                'read_errors': 0,
+                'last_seq': self.last_frame_seq,
+                'ring': None,
+                'last_frame_age': None
+            }
+        return {
+            'source': self.cap.describe() if self.cap is not None else None,
+            'threaded_capture': self.threaded_capture,
+            'capture': capture,
+            'inference_width': self.inference_width,
+            'motion_gate': {
+                'enabled': self.motion_gate,
+                'threshold': self.motion_threshold,
+                'skipped': self.frames_skipped,
+                'processed': self.frames_processed
+            },
+            'flow': {
+                'enabled': self.flow_tracking,
+                'mesh_every': self.mesh_every,
+                'tracked': self.flow_tracked,
+                'failures': self.flow_failures,
+                'mesh_runs': self.mesh_runs
+            },
+            'measure': {
+                'runs': self.measure_runs,
+                'shared': self.measure_shared,
+                'cached': self.measure_cached,
+                'last_measured_at': self.last_measured_at
+            },
+            'sampler': self.sampler.get_stats() if self.sampler else None,
+            'last_distance': self.last_distance
+        }
+    
+    def get_metrics(self):
+        """
+        Số liệu thời gian theo stage
+        
+        Returns:
+            dict: histogram capture/convert/inference/send/measure, tỉ lệ
+            thấy/mất khuôn mặt và tốc độ lấy mẫu thực tế
+        """
+        return self.metrics.snapshot()
     
     def get_distance(self):
         """
@@ -57,65 +286,343 @@ class DistanceCamera:
         Returns:
             tuple: (distance_cm, success)
         """
-        if not self.start_camera():
-            return 0, False
+        with self._mesh_lock:
+            if not self.start_camera():
+                return 0, False
+            
+            t0 = time.perf_counter()
+            ret, frame = self._read_frame()
+            if not ret:
+                return 0, False
+            
+            result = self.process_frame(frame)
+            self.metrics.record('measure', time.perf_counter() - t0)
+            return result
+    
+    def measure(self, max_age=0):
+        """
+        Đo khoảng cách, dùng chung kết quả giữa các thread
+        
+        - Kết quả gần nhất chưa quá max_age giây: trả lại ngay, không đo
+        - Đang có thread khác đo: chờ và dùng chung kết quả đó
+        - Ngược lại: thread này đo (chỉ nó dùng camera + face mesh)
+        
+        Args:
+            max_age: Tuổi tối đa (giây) của kết quả được dùng lại; 0 = luôn đo
+                mới (nhưng vẫn gộp với lần đo đang chạy)
+        
+        Returns:
+            tuple: (distance_cm, success, measured_at)
+        """
+        with self._flight:
+            last = self.last_measurement
+            if last is not None and max_age > 0 and time.time() - last[2] <= max_age:
+                self.measure_cached += 1
+                return last
+            if self._in_flight:
+                gen = self._flight_gen
+                self._flight.wait_for(lambda: self._flight_gen != gen)
+                if self._flight_error is not None:
+                    raise self._flight_error
+                self.measure_shared += 1
+                return self.last_measurement
+            self._in_flight = True
+        
+        result = error = None
+        try:
+            distance, success = self.get_distance()
+            result = (distance, success, time.time())
+        except Exception as e:
+            error = e
+        
+        with self._flight:
+            self.measure_runs += 1
+            self._flight_error = error
+            if result is not None:
+                self.last_measurement = result
+                self.last_measured_at = result[2]
+            self._in_flight = False
+            self._flight_gen += 1
+            self._flight.notify_all()
+        
+        if error is not None:
+            raise error
+        return result
+    
+    def process_frame(self, frame, rgb=None, gate=None):
+        """
+        Đo khoảng cách trên một frame có sẵn
         
-        ret, frame = self.cap.read()
-        if not ret:
+        Toạ độ hai mắt (pixel trên frame gốc) được lưu vào self.last_eyes
+        
+        Args:
+            frame: ảnh BGR
+            rgb: ảnh đã chuẩn bị bằng prepare_frame(frame), nếu có
+            gate: kết quả check_motion(frame) nếu đã gọi trước đó
+        
+        Returns:
+            tuple: (distance_cm, success)
+        """
+        if gate is None:
+            gate = self.check_motion(frame)
+        if gate is not None:
+            changed, ref_id = gate
+            # Frame tham chiếu có thể chưa được phân tích (bị bỏ trong pipeline)
+            if not changed and self._gate_result is not None and self._gate_result[0] == ref_id:
+                # Khung hình không đổi: dùng lại kết quả lần phân tích trước
+                self.frames_skipped += 1
+                self.last_cached = True
+                _, distance_cm, success, self.last_eyes = self._gate_result
+                self.metrics.mark_face(success)
+                self._remember_analyzed(frame, distance_cm, success)
+                return distance_cm, success
+        
+        self.frames_processed += 1
+        self.last_cached = False
+        distance_cm, success = self._measure_eyes(frame, rgb)
+        if gate is not None:
+            self._gate_result = (gate[1], distance_cm, success, self.last_eyes)
+        self.metrics.mark_face(success)
+        self._remember_analyzed(frame, distance_cm, success)
+        return distance_cm, success
+    
+    def _remember_analyzed(self, frame, distance_cm, success):
+        """Giữ frame vừa phân tích và kết quả của nó cho preview (không copy)"""
+        self._analyzed_seq += 1
+        eyes = self.last_eyes if success else None
+        self.last_analyzed = (self._analyzed_seq, frame, distance_cm, eyes)
+        if self.on_analyzed is not None:
+            self.on_analyzed(self.frame_ring_name, self.last_frame_seq, distance_cm, eyes)
+    
+    def get_preview_jpeg(self, after_seq=0, quality=70):
+        """
+        Ảnh JPEG có vẽ mắt và khoảng cách của frame phân tích gần nhất
+        
+        Chỉ dùng kết quả các lần đo đã có, không chạy thêm face mesh.
+        
+        Args:
+            after_seq: seq của ảnh người gọi đã có
+            quality: chất lượng JPEG (0-100)
+        
+        Returns:
+            tuple: (seq, jpeg_bytes); jpeg_bytes là None nếu chưa có frame mới hơn after_seq
+        """
+        analyzed = self.last_analyzed
+        if analyzed is None or analyzed[0] <= after_seq:
+            return after_seq, None
+        seq, frame, distance_cm, eyes = analyzed
+        image = draw_distance_overlay(frame.copy(), distance_cm, eyes, self.safe_distance)
+        ok, buf = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return seq, (buf.tobytes() if ok else None)
+    
+    def _measure_eyes(self, frame, rgb=None):
+        """Tìm hai mắt (face mesh hoặc optical flow) và tính khoảng cách"""
+        if self.flow_tracking:
+            eyes = self._track_or_locate_eyes(frame, rgb)
+        else:
+            eyes = self._locate_eyes(frame, rgb)
+            self.mesh_runs += 1
+        self.last_eyes = eyes
+        if eyes is None:
             return 0, False
         
-        h, w, _ = frame.shape
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.face_mesh.process(rgb_frame)
+        x1, y1, x2, y2 = eyes
+        # Tính khoảng cách pixel giữa 2 mắt
+        pixel_distance = ((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5
         
-        if results.multi_face_landmarks:
-            for face in results.multi_face_landmarks:
-                # Mắt trái: landmark 33, mắt phải: 263
-                left_eye = face.landmark[33]
-                right_eye = face.landmark[263]
-                
-                x1 = int(left_eye.x * w)
-                y1 = int(left_eye.y * h)
-                x2 = int(right_eye.x * w)
-                y2 = int(right_eye.y * h)
-                
-                # Tính khoảng cách pixel giữa 2 mắt
-                pixel_distance = ((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5
-                
-                if pixel_distance > 0:
-                    distance_cm = (self.real_eye_distance * self.focal_length) / pixel_distance
-                    self.last_distance = distance_cm
-                    return distance_cm, True
+        if pixel_distance > 0:
+            distance_cm = (self.real_eye_distance * self.focal_length) / pixel_distance
+            self.last_distance = distance_cm
+            return distance_cm, True
         
         return 0, False
     
-    def is_too_close(self):
+    def check_motion(self, frame):
+        """
+        Quyết định của motion gate cho frame, gọi được trước prepare_frame
+        
+        Returns:
+            tuple: (changed, ref_id) với ref_id là frame tham chiếu; changed=False
+                thì process_frame dùng lại kết quả của frame đó. None nếu không
+                bật motion gate
+        """
+        if not self.motion_gate:
+            return None
+        with self._gate_lock:
+            changed = self._scene_changed(frame)
+            return changed, self._gate_ref_id
+    
+    def _scene_changed(self, frame):
+        """
+        So sánh ảnh xám 64x48 của frame với frame đã phân tích gần nhất
+        
+        Returns:
+            bool: True nếu cần chạy lại face mesh
+        """
+        cv2.resize(frame, (64, 48), dst=self._gate_small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._gate_small, cv2.COLOR_BGR2GRAY, dst=self._gate_gray)
+        
+        if (self._gate_ref is None or self._gate_result is None
+                or self._gate_skips >= self.motion_max_skips
+                or cv2.absdiff(self._gate_gray, self._gate_ref).mean() > self.motion_threshold):
+            self._gate_ref = self._gate_gray.copy()
+            self._gate_ref_id += 1
+            self._gate_skips = 0
+            return True
+        
+        self._gate_skips += 1
+        return False
+    
+    def prepare_frame(self, frame):
+        """
+        Chuyển frame BGR sang ảnh RGB (đã thu nhỏ theo inference_width) cho face mesh
+        
+        Ảnh trả về là mảng mới, có thể đưa sang thread khác rồi truyền lại
+        vào process_frame(frame, rgb=...).
+        """
+        t0 = time.perf_counter()
+        rgb = self._to_rgb(frame, reuse_buffers=False)
+        self.metrics.record('convert', time.perf_counter() - t0)
+        return rgb
+    
+    def _to_rgb(self, image, reuse_buffers=True):
+        """Thu nhỏ theo inference_width (nếu cần) và đổi BGR -> RGB"""
+        h, w = image.shape[:2]
+        if not self.inference_width or w <= self.inference_width:
+            return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        
+        size = (self.inference_width, max(1, round(h * self.inference_width / w)))
+        if not reuse_buffers:
+            return cv2.cvtColor(cv2.resize(image, size, interpolation=cv2.INTER_LINEAR),
+                                cv2.COLOR_BGR2RGB)
+        if self._small_buf is None or self._small_buf.shape[:2] != (size[1], size[0]):
+            self._small_buf = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            self._rgb_buf = np.empty_like(self._small_buf)
+        cv2.resize(image, size, dst=self._small_buf, interpolation=cv2.INTER_LINEAR)
+        return cv2.cvtColor(self._small_buf, cv2.COLOR_BGR2RGB, dst=self._rgb_buf)
+    
+    def _run_face_mesh(self, image, rgb=None):
+        """
+        Chạy face mesh, trả về landmark hoặc None
+        
+        Landmark được chuẩn hoá theo ảnh đầu vào (0..1) nên không đổi khi ảnh
+        bị thu nhỏ theo inference_width; người gọi nhân với kích thước gốc.
+        rgb là ảnh đã chuẩn bị sẵn bằng prepare_frame(image), nếu có.
+        """
+        if rgb is None:
+            t0 = time.perf_counter()
+            rgb = self._to_rgb(image)
+            self.metrics.record('convert', time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        results = self.face_mesh.process(rgb)
+        self.metrics.record('inference', time.perf_counter() - t0)
+        if results.multi_face_landmarks:
+            return results.multi_face_landmarks[0].landmark
+        return None
+    
+    def _track_or_locate_eyes(self, frame, rgb=None):
+        """
+        Bám hai điểm mắt bằng optical flow, chạy face mesh mỗi mesh_every frame
+        hoặc khi bám điểm thất bại
+        
+        Returns:
+            tuple: (x1, y1, x2, y2) hoặc None
+        """
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        prev_gray, prev_points = self._flow_prev_gray, self._flow_points
+        self._flow_prev_gray = gray
+        
+        if (prev_points is not None and prev_gray.shape == gray.shape
+                and self._flow_since_mesh < self.mesh_every - 1):
+            points, status, err = cv2.calcOpticalFlowPyrLK(
+                prev_gray, gray, prev_points, None, winSize=(21, 21), maxLevel=3,
+                criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+            if status is not None and status.all() and err.max() <= self.flow_max_error:
+                self._flow_points = points
+                self._flow_since_mesh += 1
+                self.flow_tracked += 1
+                (x1, y1), (x2, y2) = points.reshape(2, 2)
+                return int(x1), int(y1), int(x2), int(y2)
+            self.flow_failures += 1
+        
+        eyes = self._locate_eyes(frame, rgb)
+        self.mesh_runs += 1
+        self._flow_since_mesh = 0
+        if eyes is None:
+            self._flow_points = None
+        else:
+            self._flow_points = np.array(eyes, dtype=np.float32).reshape(2, 1, 2)
+        return eyes
+    
+    def _locate_eyes(self, frame, rgb=None):
+        """
+        Tìm toạ độ pixel của hai mắt trên frame
+        
+        Returns:
+            tuple: (x1, y1, x2, y2) hoặc None
+        """
+        h, w, _ = frame.shape
+        landmarks = self._run_face_mesh(frame, rgb)
+        if not landmarks:
+            return None
+        
+        # Mắt trái: landmark 33, mắt phải: 263
+        left_eye = landmarks[33]
+        right_eye = landmarks[263]
+        return (int(left_eye.x * w), int(left_eye.y * h),
+                int(right_eye.x * w), int(right_eye.y * h))
+    
+    def is_too_close(self, max_age=0):
         """
         Kiểm tra xem người dùng có ngồi quá gần không
         
+        Args:
+            max_age: Dùng lại kết quả đo chưa quá max_age giây (xem measure)
+        
         Returns:
             tuple: (is_too_close, distance_cm)
         """
-        distance, success = self.get_distance()
+        distance, success, _ = self.measure(max_age)
         if success and distance > 0:
             return distance < self.safe_distance, distance
         return False, 0
     
-    def start_monitoring(self, server_url="http://localhost:5000", interval=5):
+    def start_monitoring(self, server_url="http://localhost:5000", interval=5,
+                         adaptive=False, min_interval=1, max_interval=None, event_bus=None,
+                         transport=None):
         """
         Bắt đầu giám sát liên tục và gửi dữ liệu lên server
         
         Args:
-            server_url: URL của web server
+            server_url: URL của web server (dùng khi không có event_bus)
             interval: Khoảng thời gian giữa các lần đo (giây)
+            adaptive: Tự điều chỉnh khoảng nghỉ theo khoảng cách (AdaptiveSampler)
+            min_interval: Khoảng nghỉ ngắn nhất khi adaptive (giây)
+            max_interval: Khoảng nghỉ dài nhất khi adaptive (giây); None = 2 * interval
+            event_bus: EventBus của webserver chạy cùng process; có thì
+                publish trực tiếp thay vì gửi HTTP về server_url
+            transport: đối tượng có publish(topic, payload) dùng khi không có
+                event_bus, vd. TelemetryUploader cho camera ở máy khác
         """
         if self.is_monitoring:
             return False
         
+        if event_bus is not None:
+            transport = event_bus
+        elif transport is None:
+            transport = HttpTransport(server_url)
+        
+        self.sampler = None
+        if adaptive:
+            self.sampler = AdaptiveSampler(self.safe_distance, base_interval=interval,
+                                           min_interval=min_interval,
+                                           max_interval=max_interval)
+        
         self.is_monitoring = True
+        self._stop_event.clear()
         self.monitoring_thread = threading.Thread(
             target=self._monitoring_loop, 
-            args=(server_url, interval)
+            args=(transport, interval)
         )
         self.monitoring_thread.daemon = True
         self.monitoring_thread.start()
@@ -124,116 +631,98 @@ class DistanceCamera:
     def stop_monitoring(self):
         """Dừng giám sát"""
         self.is_monitoring = False
+        self._stop_event.set()
         if self.monitoring_thread:
             self.monitoring_thread.join(timeout=2)
         self.stop_camera()
     
-    def _monitoring_loop(self, server_url, interval):
+    def _monitoring_loop(self, transport, interval):
         """Vòng lặp giám sát chạy trong thread riêng"""
         consecutive_warnings = 0
+        sampler = self.sampler
+        
+        # Cảnh báo break khi quá gần liên tục 3 lần đo, tức là suốt
+        # 3 * interval giây. Khi adaptive, khoảng nghỉ thay đổi nên xét theo
+        # thời gian: tính từ lần đo an toàn cuối (hoặc lần cảnh báo trước),
+        # nhưng không sớm hơn một interval trước lần đo quá gần đầu tiên.
+        warning_window = 3 * interval
+        last_safe_time = time.time()
+        streak_start = None
         
         while self.is_monitoring:
             try:
-                too_close, distance = self.is_too_close()
+                distance, success, measured_at = self.measure()
+                if not success:
+                    distance = 0
+                too_close = 0 < distance < self.safe_distance
+                now = time.time()
+                self.metrics.samples.mark(now)
                 
                 if distance > 0:
-                    # Gửi dữ liệu khoảng cách lên server
-                    self._send_distance_to_server(server_url, distance)
+                    # Gửi dữ liệu khoảng cách lên server; ts giúp server bỏ qua
+                    # mẫu đã nhận (cùng một lần đo dùng chung với /check_distance)
+                    self._publish(transport, TOPIC_DISTANCE,
+                                  {'distance': distance, 'ts': measured_at})
                     
                     # Kiểm tra cảnh báo liên tục
                     if too_close:
                         consecutive_warnings += 1
+                        if streak_start is None:
+                            streak_start = max(last_safe_time, now - interval)
                         print(f"⚠️ Cảnh báo: Khoảng cách {distance:.1f}cm quá gần! ({consecutive_warnings})")
                         
                         # Gửi cảnh báo break nếu quá gần liên tục
-                        if consecutive_warnings >= 3:  # 3 lần liên tục
-                            self._send_break_warning_to_server(server_url)
+                        if sampler is None:
+                            should_warn = consecutive_warnings >= 3  # 3 lần liên tục
+                        else:
+                            should_warn = now - streak_start >= warning_window - 0.1 * interval
+                        if should_warn:
+                            self._publish(transport, TOPIC_BREAK_WARNING, {})
                             consecutive_warnings = 0
+                            last_safe_time = now
+                            streak_start = None
                     else:
                         consecutive_warnings = 0
+                        last_safe_time = now
+                        streak_start = None
                         print(f"✅ Khoảng cách an toàn: {distance:.1f}cm")
                 
-                time.sleep(interval)
+                delay = sampler.next_interval(distance, now) if sampler else interval
+                self._stop_event.wait(delay)
                 
             except Exception as e:
                 print(f"❌ Lỗi trong quá trình giám sát: {e}")
-                time.sleep(1)
-    
-    def _send_distance_to_server(self, server_url, distance):
-        """Gửi dữ liệu khoảng cách lên server"""
-        try:
-            response = requests.post(
-                f"{server_url}/add_distance",
-                json={"distance": distance},
-                timeout=5
-            )
-            if response.status_code == 200:
-                print(f"📤 Đã gửi khoảng cách: {distance:.1f}cm")
-            else:
-                print(f"⚠️ Không thể gửi khoảng cách: {response.status_code}")
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Lỗi kết nối server khi gửi khoảng cách: {e}")
+                self._stop_event.wait(1)
     
-    def _send_break_warning_to_server(self, server_url):
-        """Gửi cảnh báo nghỉ giải lao lên server"""
-        try:
-            response = requests.post(
-                f"{server_url}/add_break_warning",
-                timeout=5
-            )
-            if response.status_code == 200:
-                print("📤 Đã gửi cảnh báo nghỉ giải lao")
-            else:
-                print(f"⚠️ Không thể gửi cảnh báo: {response.status_code}")
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Lỗi kết nối server khi gửi cảnh báo: {e}")
+    def _publish(self, transport, topic, payload):
+        """Gửi một sự kiện (EventBus hoặc HttpTransport) và ghi thời gian gửi"""
+        t0 = time.perf_counter()
+        transport.publish(topic, payload)
+        self.metrics.record('send', time.perf_counter() - t0)
     
     def save_image_with_distance(self, save_path="./"):
         """Lưu ảnh với thông tin khoảng cách"""
-        if not self.start_camera():
-            return False, "Không thể khởi động camera"
-        
-        ret, frame = self.cap.read()
-        if not ret:
-            return False, "Không thể lấy frame từ camera"
+        with self._mesh_lock:
+            if not self.start_camera():
+                return False, "Không thể khởi động camera"
+            
+            ret, frame = self._read_frame()
+            if not ret:
+                return False, "Không thể lấy frame từ camera"
+            
+            distance_cm, success = self.process_frame(frame)
+            eyes = self.last_eyes
+        if not success:
+            return False, "Không phát hiện khuôn mặt"
         
-        h, w, _ = frame.shape
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.face_mesh.process(rgb_frame)
+        frame = draw_distance_overlay(frame.copy(), distance_cm, eyes, self.safe_distance)
         
-        if results.multi_face_landmarks:
-            for face in results.multi_face_landmarks:
-                left_eye = face.landmark[33]
-                right_eye = face.landmark[263]
-                
-                x1 = int(left_eye.x * w)
-                y1 = int(left_eye.y * h)
-                x2 = int(right_eye.x * w)
-                y2 = int(right_eye.y * h)
-                
-                pixel_distance = ((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5
-                
-                if pixel_distance > 0:
-                    distance_cm = (self.real_eye_distance * self.focal_length) / pixel_distance
-                    
-                    # Ghi thông tin lên ảnh
-                    color = (0, 255, 0) if distance_cm >= self.safe_distance else (0, 0, 255)
-                    cv2.putText(frame, f"Distance: {distance_cm:.2f} cm", (30, 30),
-                                cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
-                    
-                    # Vẽ mắt
-                    cv2.circle(frame, (x1, y1), 5, (255, 0, 0), -1)
-                    cv2.circle(frame, (x2, y2), 5, (0, 0, 255), -1)
-                    cv2.line(frame, (x1, y1), (x2, y2), (255, 255, 0), 2)
-                    
-                    # Lưu ảnh
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    filename = f"{save_path}/distance_{timestamp}_{distance_cm:.1f}cm.jpg"
-                    cv2.imwrite(filename, frame)
-                    
-                    return True, f"Đã lưu ảnh: {filename}"
+        # Lưu ảnh
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"{save_path}/distance_{timestamp}_{distance_cm:.1f}cm.jpg"
+        cv2.imwrite(filename, frame)
         
-        return False, "Không phát hiện khuôn mặt"
+        return True, f"Đã lưu ảnh: {filename}"
 
 # Hàm test độc lập
 def test_distance_camera():
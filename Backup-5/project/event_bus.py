@@ -0,0 +1,89 @@
+import threading
+
+import requests
+
+# Các loại sự kiện camera phát ra
+TOPIC_DISTANCE = 'distance'            # payload: {'distance': cm}
+TOPIC_BREAK_WARNING = 'break_warning'  # payload: {}
+CAMERA_TOPICS = (TOPIC_DISTANCE, TOPIC_BREAK_WARNING)
+
+
+class EventBus:
+    def __init__(self):
+        """
+        Kênh publish/subscribe trong cùng process
+
+        Khi camera và webserver chạy chung process, publish() gọi thẳng các
+        handler đã subscribe: không mở kết nối TCP, không encode/decode JSON.
+        Handler chạy ngay trong thread của bên publish nên cần ngắn gọn.
+        """
+        self._handlers = {}
+        self._lock = threading.Lock()
+        self.published = 0
+        self.errors = 0
+
+    def subscribe(self, topic, handler):
+        """Đăng ký handler(payload) cho topic"""
+        with self._lock:
+            # Tạo list mới để publish() đọc không cần khóa
+            self._handlers[topic] = self._handlers.get(topic, []) + [handler]
+        return handler
+
+    def unsubscribe(self, topic, handler):
+        with self._lock:
+            handlers = [h for h in self._handlers.get(topic, []) if h is not handler]
+            self._handlers[topic] = handlers
+
+    def publish(self, topic, payload=None):
+        """
+        Gửi sự kiện tới mọi handler của topic
+
+        Returns:
+            int: số handler đã nhận sự kiện
+        """
+        self.published += 1
+        handlers = self._handlers.get(topic, ())
+        for handler in handlers:
+            try:
+                handler(payload if payload is not None else {})
+            except Exception as e:
+                self.errors += 1
+                print(f"❌ Lỗi xử lý sự kiện {topic}: {e}")
+        return len(handlers)
+
+
+class HttpTransport:
+    # Endpoint của webserver tương ứng với từng topic
+    PATHS = {
+        TOPIC_DISTANCE: '/add_distance',
+        TOPIC_BREAK_WARNING: '/add_break_warning'
+    }
+
+    def __init__(self, server_url, timeout=5, device_id='local'):
+        """
+        Gửi sự kiện camera lên webserver qua HTTP
+
+        Cùng giao diện publish() với EventBus; chỉ dùng khi camera chạy ở
+        máy / process khác với webserver.
+        """
+        self.server_url = server_url
+        self.timeout = timeout
+        self.device_id = device_id
+
+    def publish(self, topic, payload=None):
+        try:
+            response = requests.post(
+                f"{self.server_url}{self.PATHS[topic]}",
+                json=dict(payload or {}, device_id=self.device_id),
+                timeout=self.timeout
+            )
+            if response.status_code == 200:
+                if topic == TOPIC_DISTANCE:
+                    print(f"📤 Đã gửi khoảng cách: {payload['distance']:.1f}cm")
+                else:
+                    print("📤 Đã gửi cảnh báo nghỉ giải lao")
+                return 1
+            print(f"⚠️ Không thể gửi {topic}: {response.status_code}")
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Lỗi kết nối server khi gửi {topic}: {e}")
+        return 0
@@ -0,0 +1,136 @@
+import threading
+import time
+
+from frame_ring import FrameRing
+
+
+class FrameGrabber:
+    def __init__(self, cap, ring_slots=0):
+        """
+        Thread đọc frame liên tục từ camera vào một slot "frame mới nhất"
+
+        Slot chỉ giữ một frame và bị ghi đè mỗi lần đọc, nên người dùng luôn
+        lấy được frame mới nhất mà không phải chờ driver xả hết buffer.
+
+        Args:
+            cap: đối tượng có read()/isOpened() giống cv2.VideoCapture
+            ring_slots: > 0 thì ghi thêm mỗi frame vào FrameRing (shared memory)
+                với số slot này, để process khác đọc chung frame
+        """
+        self.cap = cap
+        self.ring_slots = ring_slots
+        self.ring = None
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._timestamp = 0
+        self._consumed_seq = 0
+        self._running = False
+        self._thread = None
+
+        # Thống kê
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.read_errors = 0
+
+    def start(self):
+        """Bắt đầu thread đọc frame"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Dừng thread đọc frame"""
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+    def _run(self):
+        """Vòng lặp đọc frame chạy trong thread riêng"""
+        while self._running:
+            ret, frame = self.cap.read()
+            if not ret:
+                self.read_errors += 1
+                time.sleep(0.01)
+                continue
+
+            if self.ring_slots > 0:
+                # seq trong ring trùng seq của read_latest()
+                self._write_ring(frame, self._seq + 1)
+
+            with self._cond:
+                # Frame cũ chưa ai lấy mà đã bị ghi đè -> tính là bỏ qua
+                if self._seq > self._consumed_seq:
+                    self.frames_dropped += 1
+                self._frame = frame
+                self._seq += 1
+                self._timestamp = time.time()
+                self.frames_read += 1
+                self._cond.notify_all()
+
+    def _write_ring(self, frame, seq):
+        """
+        Ghi frame vào FrameRing, tạo ring theo kích thước frame đầu tiên
+
+        Frame đổi kích thước thì ring cũ được đóng (consumer thấy ring.closed
+        và attach lại theo tên mới trong get_stats()['ring']).
+        """
+        if self.ring is not None and self.ring.shape != frame.shape:
+            self.ring.close()
+            self.ring = None
+        if self.ring is None:
+            self.ring = FrameRing.create(frame.shape, slots=self.ring_slots)
+        self.ring.write(frame, seq=seq)
+
+    def read_latest(self, timeout=2.0):
+        """
+        Lấy frame mới nhất
+
+        Chỉ chờ khi chưa có frame nào (lúc camera vừa khởi động).
+
+        Returns:
+            tuple: (success, frame, seq, timestamp)
+        """
+        with self._cond:
+            if self._frame is None:
+                self._cond.wait_for(lambda: self._frame is not None or not self._running,
+                                    timeout)
+            if self._frame is None:
+                return False, None, 0, 0
+            self._consumed_seq = self._seq
+            return True, self._frame, self._seq, self._timestamp
+
+    def wait_for_new(self, last_seq, timeout=1.0):
+        """
+        Chờ frame có seq lớn hơn last_seq
+
+        Returns:
+            tuple: (success, frame, seq, timestamp)
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > last_seq or not self._running, timeout)
+            if self._seq <= last_seq or self._frame is None:
+                return False, None, self._seq, self._timestamp
+            self._consumed_seq = self._seq
+            return True, self._frame, self._seq, self._timestamp
+
+    def get_stats(self):
+        """Thống kê thread đọc frame"""
+        with self._cond:
+            return {
+                'frames_read': self.frames_read,
+                'frames_dropped': self.frames_dropped,
+                'read_errors': self.read_errors,
+                'last_seq': self._seq,
+                'ring': self.ring.name if self.ring is not None else None,
+                'last_frame_age': time.time() - self._timestamp if self._timestamp else None
+            }
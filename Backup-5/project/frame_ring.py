@@ -0,0 +1,166 @@
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# Header: [write_seq, slots, height, width, channels, closed, 0, 0] (int64)
+#         + với mỗi slot: [seq (int64), timestamp (float64)]
+_HEADER_FIELDS = 8
+
+
+class FrameRing:
+    def __init__(self, shm, owner):
+        """
+        Ring buffer frame trên shared memory: một producer ghi, nhiều consumer
+        (cùng process hoặc process khác) đọc trực tiếp, không sao chép
+
+        Mỗi slot có seq riêng theo kiểu seqlock: producer đặt seq = -1 khi đang
+        ghi và seq = số thứ tự frame khi ghi xong. Consumer kiểm tra lại seq
+        sau khi dùng xong frame (is_valid) để biết frame chưa bị ghi đè.
+
+        Khi producer đóng ring (dừng camera, đổi kích thước frame), cờ closed
+        được bật trước khi xoá vùng nhớ; consumer thấy closed thì đóng ring
+        của mình và attach lại ring mới.
+
+        Dùng FrameRing.create(...) hoặc FrameRing.attach(name).
+        """
+        self.shm = shm
+        self.owner = owner
+        self.name = shm.name
+        header = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        self.slots = int(header[1])
+        self.shape = (int(header[2]), int(header[3]), int(header[4]))
+        self._header = header
+        offset = header.nbytes
+        self._seqs = np.ndarray((self.slots,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += self._seqs.nbytes
+        self._times = np.ndarray((self.slots,), dtype=np.float64, buffer=shm.buf, offset=offset)
+        offset += self._times.nbytes
+        self.frames = np.ndarray((self.slots,) + self.shape, dtype=np.uint8,
+                                 buffer=shm.buf, offset=offset)
+
+    @classmethod
+    def create(cls, shape, slots=4, name=None):
+        """
+        Tạo ring buffer mới (phía producer)
+
+        Args:
+            shape: (height, width, channels) của frame
+            slots: số slot frame dựng sẵn
+            name: tên vùng shared memory (None = tự sinh)
+        """
+        frame_bytes = int(np.prod(shape))
+        size = 8 * _HEADER_FIELDS + 16 * slots + frame_bytes * slots
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[1] = slots
+        header[2:5] = shape
+        ring = cls(shm, owner=True)
+        ring._seqs[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name):
+        """Mở ring buffer đã có (phía consumer)"""
+        # Consumer không sở hữu vùng nhớ: không đăng ký với resource_tracker,
+        # nếu không nó sẽ xoá vùng nhớ khi process consumer kết thúc
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            register = resource_tracker.register
+            resource_tracker.register = lambda *args: None
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+        return cls(shm, owner=False)
+
+    @property
+    def write_seq(self):
+        """Số thứ tự frame mới nhất đã ghi xong"""
+        return int(self._header[0])
+
+    @property
+    def closed(self):
+        """Producer đã đóng ring này, không còn frame mới"""
+        return self._header is None or bool(self._header[5])
+
+    def write(self, frame, timestamp=None, seq=None):
+        """
+        Ghi frame vào slot kế tiếp (chỉ một producer)
+
+        Args:
+            seq: số thứ tự của frame (tăng dần), mặc định write_seq + 1;
+                producer truyền seq của mình để consumer tìm đúng frame
+
+        Returns:
+            int: seq của frame vừa ghi
+        """
+        if seq is None:
+            seq = self.write_seq + 1
+        slot = seq % self.slots
+        self._seqs[slot] = -1
+        self.frames[slot][...] = frame
+        self._times[slot] = timestamp if timestamp is not None else time.time()
+        self._seqs[slot] = seq
+        self._header[0] = seq
+        return seq
+
+    def read(self, seq):
+        """
+        Lấy frame theo seq, không sao chép
+
+        Returns:
+            tuple: (frame_view, timestamp) hoặc (None, 0) nếu frame đã bị ghi đè
+        """
+        slot = seq % self.slots
+        if seq <= 0 or self._seqs[slot] != seq:
+            return None, 0
+        return self.frames[slot], float(self._times[slot])
+
+    def read_latest(self):
+        """
+        Lấy frame mới nhất, không sao chép
+
+        Returns:
+            tuple: (seq, frame_view, timestamp); seq = 0 nếu chưa có frame
+        """
+        seq = self.write_seq
+        frame, timestamp = self.read(seq)
+        if frame is None:
+            return 0, None, 0
+        return seq, frame, timestamp
+
+    def is_valid(self, seq):
+        """Frame seq vẫn còn nguyên (chưa bị producer ghi đè)"""
+        return seq > 0 and self._seqs[seq % self.slots] == seq
+
+    def wait_for_new(self, last_seq, timeout=1.0, poll=0.002):
+        """Chờ tới khi có frame mới hơn last_seq"""
+        deadline = time.time() + timeout
+        while self.write_seq <= last_seq:
+            if time.time() >= deadline:
+                return 0, None, 0
+            time.sleep(poll)
+        return self.read_latest()
+
+    def close(self):
+        """Đóng ring buffer; producer báo cho consumer (closed) rồi xoá vùng shared memory"""
+        if self._header is None:
+            return
+        if self.owner:
+            self._header[5] = 1
+        # Bỏ các view numpy trước khi đóng shared memory
+        self._header = self._seqs = self._times = self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # Vẫn còn view đang được dùng; vùng nhớ được giải phóng khi view bị huỷ
+            pass
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
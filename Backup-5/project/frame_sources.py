@@ -0,0 +1,262 @@
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class FrameSource:
+    """
+    Nguồn frame có cùng giao diện với cv2.VideoCapture (isOpened/read/release)
+
+    Mọi nơi đang dùng VideoCapture (DistanceCamera, FrameGrabber, script test)
+    đều nhận được FrameSource. Gọi open() trước khi đọc.
+    """
+
+    def open(self):
+        return self
+
+    def isOpened(self):
+        return False
+
+    def read(self):
+        return False, None
+
+    def release(self):
+        pass
+
+    def describe(self):
+        return self.__class__.__name__
+
+
+class CameraSource(FrameSource):
+    def __init__(self, cam_id=0, width=None, height=None, fps=None):
+        """
+        Webcam thật (V4L2 trên Linux, backend mặc định của OpenCV trên hệ khác)
+
+        Args:
+            cam_id: chỉ số camera
+            width, height, fps: yêu cầu driver dùng thông số này (nếu hỗ trợ)
+        """
+        self.cam_id = cam_id
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.cap = None
+
+    def open(self):
+        if self.cap is None or not self.cap.isOpened():
+            backend = cv2.CAP_V4L2 if sys.platform.startswith('linux') else cv2.CAP_ANY
+            self.cap = cv2.VideoCapture(self.cam_id, backend)
+            if self.width:
+                self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+            if self.height:
+                self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+            if self.fps:
+                self.cap.set(cv2.CAP_PROP_FPS, self.fps)
+        return self
+
+    def isOpened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def read(self):
+        if self.cap is None:
+            return False, None
+        return self.cap.read()
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def describe(self):
+        return f"camera:{self.cam_id}"
+
+
+class _PacedSource(FrameSource):
+    def __init__(self, fps, speed):
+        """
+        Phát frame theo nhịp: speed=1 đúng thời gian thực, speed=2 nhanh gấp
+        đôi, speed=0 nhanh nhất có thể
+        """
+        self.fps = fps
+        self.speed = speed
+        self._next_time = None
+
+    def _wait_for_next_frame(self):
+        if not self.speed or not self.fps:
+            return
+        period = 1.0 / (self.fps * self.speed)
+        now = time.time()
+        if self._next_time is None or now - self._next_time > period:
+            # Lần đầu hoặc người đọc chậm hơn nhịp phát: không dồn frame bù
+            self._next_time = now
+        elif self._next_time > now:
+            time.sleep(self._next_time - now)
+        self._next_time += period
+
+
+class VideoFileSource(_PacedSource):
+    def __init__(self, path, fps=None, speed=1.0, loop=False):
+        """
+        Phát lại file video hoặc chuỗi ảnh
+
+        Args:
+            path: file video, thư mục ảnh, hoặc mẫu glob (vd. "frames/*.png")
+            fps: nhịp phát (None = theo file video, 30 với chuỗi ảnh)
+            speed: 1 = thời gian thực, 0 = nhanh nhất có thể
+            loop: hết dữ liệu thì phát lại từ đầu
+        """
+        super().__init__(fps, speed)
+        self.path = path
+        self.loop = loop
+        self.cap = None
+        self.images = None
+        self.index = 0
+
+    def open(self):
+        if self.isOpened():
+            return self
+        if os.path.isdir(self.path) or glob.has_magic(self.path):
+            pattern = os.path.join(self.path, '*') if os.path.isdir(self.path) else self.path
+            self.images = sorted(p for p in glob.glob(pattern)
+                                 if p.lower().endswith(IMAGE_EXTENSIONS))
+            self.index = 0
+            self.fps = self.fps or 30
+        else:
+            self.cap = cv2.VideoCapture(self.path)
+            self.fps = self.fps or self.cap.get(cv2.CAP_PROP_FPS) or 30
+        self._next_time = None
+        return self
+
+    def isOpened(self):
+        if self.images is not None:
+            return len(self.images) > 0
+        return self.cap is not None and self.cap.isOpened()
+
+    def read(self):
+        if not self.isOpened():
+            return False, None
+        self._wait_for_next_frame()
+
+        if self.images is not None:
+            if self.index >= len(self.images):
+                if not self.loop:
+                    return False, None
+                self.index = 0
+            frame = cv2.imread(self.images[self.index])
+            self.index += 1
+            return frame is not None, frame
+
+        ret, frame = self.cap.read()
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        return ret, frame
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+        self.images = None
+
+    def describe(self):
+        return f"file:{self.path}"
+
+
+class SyntheticSource(_PacedSource):
+    def __init__(self, width=640, height=480, fps=30, speed=1.0, seed=0, frames=None):
+        """
+        Sinh frame tất định (cùng seed -> cùng dữ liệu từng byte), không cần camera
+
+        Nền nhiễu cố định và một khối sáng di chuyển, co giãn theo chu kỳ để
+        giả lập người dùng nghiêng tới lui. Dùng để benchmark đọc frame,
+        pipeline, motion gate... trên máy không có webcam.
+
+        Args:
+            width, height: kích thước frame
+            fps: nhịp phát
+            speed: 1 = thời gian thực, 0 = nhanh nhất có thể
+            seed: hạt giống sinh nhiễu nền
+            frames: số frame tối đa (None = vô hạn)
+        """
+        super().__init__(fps, speed)
+        self.width = width
+        self.height = height
+        self.seed = seed
+        self.frames = frames
+        self.index = 0
+        self._background = None
+
+    def open(self):
+        if self._background is None:
+            rng = np.random.default_rng(self.seed)
+            noise = rng.integers(0, 40, (self.height, self.width, 3), dtype=np.uint8)
+            gradient = np.linspace(60, 160, self.width, dtype=np.uint8)
+            gradient = np.tile(gradient[None, :, None], (self.height, 1, 3))
+            self._background = cv2.add(noise, gradient)
+            self.index = 0
+            self._next_time = None
+        return self
+
+    def isOpened(self):
+        return self._background is not None
+
+    def read(self):
+        if not self.isOpened() or (self.frames is not None and self.index >= self.frames):
+            return False, None
+        self._wait_for_next_frame()
+        frame = self.render(self.index)
+        self.index += 1
+        return True, frame
+
+    def render(self, index):
+        """Vẽ frame thứ index (chỉ phụ thuộc seed và index)"""
+        frame = self._background.copy()
+        phase = index / max(1, self.fps)
+        cx = int(self.width / 2 + self.width / 8 * np.sin(phase * 0.7))
+        cy = int(self.height / 2 + self.height / 12 * np.cos(phase * 0.5))
+        radius = int(min(self.width, self.height) * (0.18 + 0.06 * np.sin(phase * 0.3)))
+        cv2.circle(frame, (cx, cy), radius, (170, 190, 220), -1)
+        cv2.circle(frame, (cx - radius // 3, cy - radius // 5), radius // 8, (40, 40, 40), -1)
+        cv2.circle(frame, (cx + radius // 3, cy - radius // 5), radius // 8, (40, 40, 40), -1)
+        cv2.putText(frame, str(index), (10, self.height - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        return frame
+
+    def release(self):
+        self._background = None
+
+    def describe(self):
+        return f"synthetic:{self.width}x{self.height}@{self.fps}"
+
+
+def open_source(spec, speed=1.0, loop=False):
+    """
+    Tạo FrameSource từ mô tả
+
+    Args:
+        spec: FrameSource có sẵn, số camera (0, "0"), "synthetic" hoặc
+            "synthetic:640x480@30", hoặc đường dẫn video / thư mục ảnh / glob
+        speed: nhịp phát cho nguồn ghi sẵn và synthetic (1 = thời gian thực, 0 = tối đa)
+        loop: phát lại file từ đầu khi hết
+
+    Returns:
+        FrameSource đã open()
+    """
+    if isinstance(spec, FrameSource):
+        return spec.open()
+    if isinstance(spec, int) or (isinstance(spec, str) and spec.isdigit()):
+        return CameraSource(int(spec)).open()
+    if spec.startswith('synthetic'):
+        width, height, fps = 640, 480, 30
+        if ':' in spec:
+            size, _, rate = spec.split(':', 1)[1].partition('@')
+            width, height = (int(v) for v in size.split('x'))
+            fps = int(rate) if rate else fps
+        return SyntheticSource(width, height, fps, speed=speed).open()
+    return VideoFileSource(spec, speed=speed, loop=loop).open()
@@ -0,0 +1,122 @@
+import bisect
+import collections
+import threading
+import time
+
+# Cận trên của các bucket (ms); giá trị lớn hơn bucket cuối rơi vào "+Inf"
+DEFAULT_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class LatencyHistogram:
+    def __init__(self, buckets_ms=DEFAULT_BUCKETS_MS):
+        """
+        Histogram thời gian với các bucket cố định
+
+        Ghi một giá trị chỉ tốn một lần bisect và vài phép cộng, bộ nhớ
+        không đổi, nên có thể bật thường trực.
+        """
+        self.buckets_ms = tuple(buckets_ms)
+        self.counts = [0] * (len(self.buckets_ms) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        """Ghi một khoảng thời gian (giây)"""
+        ms = seconds * 1000
+        index = bisect.bisect_left(self.buckets_ms, ms)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total_ms += ms
+            if ms > self.max_ms:
+                self.max_ms = ms
+
+    def percentile(self, p):
+        """Ước lượng phân vị p (0-100) bằng cận trên của bucket chứa nó"""
+        if self.count == 0:
+            return 0
+        rank = self.count * p / 100
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                if index < len(self.buckets_ms):
+                    # Không vượt quá giá trị lớn nhất đã thấy
+                    return min(self.buckets_ms[index], round(self.max_ms, 3))
+                return round(self.max_ms, 3)
+        return self.max_ms
+
+    def snapshot(self):
+        with self._lock:
+            labels = [f"le_{b:g}" for b in self.buckets_ms] + ['le_inf']
+            return {
+                'count': self.count,
+                'mean_ms': round(self.total_ms / self.count, 3) if self.count else 0,
+                'max_ms': round(self.max_ms, 3),
+                'p50_ms': self.percentile(50),
+                'p95_ms': self.percentile(95),
+                'p99_ms': self.percentile(99),
+                'buckets': dict(zip(labels, self.counts))
+            }
+
+
+class RateMeter:
+    def __init__(self, window=60, max_events=1000):
+        """Đếm số sự kiện mỗi giây trong cửa sổ trượt window giây"""
+        self.window = window
+        self._events = collections.deque(maxlen=max_events)
+        self.total = 0
+
+    def mark(self, now=None):
+        self._events.append(now if now is not None else time.time())
+        self.total += 1
+
+    def rate(self, now=None):
+        now = now if now is not None else time.time()
+        recent = [t for t in list(self._events) if now - t <= self.window]
+        if len(recent) < 2:
+            return 0
+        span = now - recent[0]
+        return len(recent) / span if span > 0 else 0
+
+
+class CameraMetrics:
+    STAGES = ('capture', 'convert', 'inference', 'send', 'measure')
+
+    def __init__(self):
+        """
+        Số liệu của đường đo khoảng cách
+
+        - Histogram thời gian theo stage: capture (cap.read), convert
+          (resize + cvtColor), inference (face_mesh.process), send (gửi mẫu
+          lên server), measure (cả một lần đo)
+        - Tỉ lệ thấy / mất khuôn mặt
+        - Tốc độ lấy mẫu thực tế của vòng giám sát
+        """
+        self.stages = {name: LatencyHistogram() for name in self.STAGES}
+        self.face_found = 0
+        self.face_lost = 0
+        self.samples = RateMeter()
+
+    def record(self, stage, seconds):
+        self.stages[stage].record(seconds)
+
+    def mark_face(self, found):
+        if found:
+            self.face_found += 1
+        else:
+            self.face_lost += 1
+
+    def snapshot(self):
+        total = self.face_found + self.face_lost
+        return {
+            'stages': {name: hist.snapshot() for name, hist in self.stages.items()},
+            'face_found': self.face_found,
+            'face_lost': self.face_lost,
+            'face_found_ratio': round(self.face_found / total, 4) if total else 0,
+            'face_lost_ratio': round(self.face_lost / total, 4) if total else 0,
+            'samples': self.samples.total,
+            'sampling_rate_hz': round(self.samples.rate(), 4)
+        }
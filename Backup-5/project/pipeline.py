@@ -0,0 +1,203 @@
+import collections
+import threading
+import time
+
+
+class DropOldestQueue:
+    def __init__(self, maxsize=2):
+        """
+        Hàng đợi có giới hạn, khi đầy thì bỏ phần tử cũ nhất
+
+        Stage phía sau luôn nhận dữ liệu mới nhất thay vì xử lý tồn đọng.
+        """
+        self.maxsize = maxsize
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=0.5):
+        """Lấy phần tử cũ nhất, trả về None nếu hết thời gian chờ hoặc đã đóng"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._items or self._closed, timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+
+class PipelineStage:
+    def __init__(self, name, func, input_queue=None, output_queue=None):
+        """
+        Một stage chạy trong thread riêng
+
+        Args:
+            name: tên stage (dùng trong thống kê)
+            func: hàm xử lý; stage đầu (không có input_queue) gọi func() liên tục,
+                các stage sau gọi func(item). Trả về None để bỏ kết quả.
+            input_queue: DropOldestQueue đầu vào
+            output_queue: DropOldestQueue đầu ra
+        """
+        self.name = name
+        self.func = func
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.processed = 0
+        self.busy_time = 0
+        self.started_at = None
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name=f"pipeline-{self.name}")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self.input_queue is not None:
+            self.input_queue.close()
+
+    def join(self, timeout=2):
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+    def _run(self):
+        while self._running:
+            if self.input_queue is None:
+                item = None
+            else:
+                item = self.input_queue.get()
+                if item is None:
+                    continue
+
+            t0 = time.perf_counter()
+            try:
+                result = self.func() if self.input_queue is None else self.func(item)
+            except Exception as e:
+                print(f"❌ Lỗi ở stage {self.name}: {e}")
+                result = None
+            self.busy_time += time.perf_counter() - t0
+
+            if result is not None:
+                self.processed += 1
+                if self.output_queue is not None:
+                    self.output_queue.put(result)
+
+    def get_stats(self):
+        elapsed = time.time() - self.started_at if self.started_at else 0
+        return {
+            'processed': self.processed,
+            'dropped': self.input_queue.dropped if self.input_queue is not None else 0,
+            'queued': len(self.input_queue) if self.input_queue is not None else 0,
+            'fps': self.processed / elapsed if elapsed > 0 else 0,
+            'busy_ms': self.busy_time * 1000 / self.processed if self.processed else 0
+        }
+
+
+class DistancePipeline:
+    def __init__(self, camera, on_result=None, queue_size=2):
+        """
+        Chạy đo khoảng cách theo các stage song song:
+        capture -> preprocess -> inference -> publish
+
+        Giữa các stage là DropOldestQueue nên việc đọc frame N+1 chạy song song
+        với suy luận trên frame N, stage chậm không làm nghẽn stage khác.
+        Stage preprocess hỏi motion gate trước, frame không đổi thì không cần
+        chuẩn bị ảnh. Không chạy khi camera đang start_monitoring.
+
+        Args:
+            camera: DistanceCamera
+            on_result: hàm nhận dict kết quả (distance, success, eyes, seq, ...)
+                ở stage publish, ví dụ gửi lên server
+            queue_size: kích thước mỗi hàng đợi
+        """
+        self.camera = camera
+        self.on_result = on_result
+        self.last_seq = 0
+        self.capture_failures = 0
+
+        to_preprocess = DropOldestQueue(queue_size)
+        to_inference = DropOldestQueue(queue_size)
+        to_publish = DropOldestQueue(queue_size)
+        self.stages = [
+            PipelineStage('capture', self._capture, None, to_preprocess),
+            PipelineStage('preprocess', self._preprocess, to_preprocess, to_inference),
+            PipelineStage('inference', self._inference, to_inference, to_publish),
+            PipelineStage('publish', self._publish, to_publish, None),
+        ]
+
+    def start(self):
+        if self.camera.is_monitoring:
+            print("⚠️ Camera đang giám sát, không chạy pipeline")
+            return False
+        self.camera.start_camera()
+        for stage in self.stages:
+            stage.start()
+        return True
+
+    def stop(self):
+        for stage in self.stages:
+            stage.stop()
+        for stage in self.stages:
+            stage.join()
+
+    def _capture(self):
+        ret, frame, seq, timestamp = self.camera.read_next_frame(self.last_seq)
+        if not ret:
+            self.capture_failures += 1
+            time.sleep(0.01)
+            return None
+        self.last_seq = seq
+        return {'frame': frame, 'seq': seq, 'timestamp': timestamp}
+
+    def _preprocess(self, item):
+        gate = self.camera.check_motion(item['frame'])
+        item['gate'] = gate
+        if gate is not None and not gate[0]:
+            # Motion gate sẽ dùng lại kết quả cũ, bỏ qua bước chuyển ảnh
+            item['rgb'] = None
+        else:
+            item['rgb'] = self.camera.prepare_frame(item['frame'])
+        return item
+
+    def _inference(self, item):
+        # Face mesh và kết quả last_* của camera dùng chung với các lần đo khác
+        with self.camera._mesh_lock:
+            distance, success = self.camera.process_frame(
+                item['frame'], rgb=item.pop('rgb'), gate=item.pop('gate'))
+            item['eyes'] = self.camera.last_eyes
+            item['cached'] = self.camera.last_cached
+        item['distance'] = distance
+        item['success'] = success
+        return item
+
+    def _publish(self, item):
+        item['latency'] = time.time() - item['timestamp']
+        if self.on_result:
+            self.on_result(item)
+        return item
+
+    def get_stats(self):
+        """Thống kê theo stage: số frame xử lý, frame bị bỏ, fps, ms/frame"""
+        stats = {stage.name: stage.get_stats() for stage in self.stages}
+        stats['capture_failures'] = self.capture_failures
+        return stats
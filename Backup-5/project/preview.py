@@ -0,0 +1,96 @@
+import threading
+import time
+
+
+class PreviewStream:
+    def __init__(self, camera, max_fps=5, quality=70, boundary='frame'):
+        """
+        Preview MJPEG (multipart/x-mixed-replace) của frame camera đã phân tích
+
+        Một thread duy nhất lấy ảnh JPEG mới từ camera (camera.get_preview_jpeg,
+        đã vẽ mắt + khoảng cách) tối đa max_fps lần mỗi giây, chỉ khi có người
+        xem. Mỗi ảnh chỉ encode một lần rồi gửi cho mọi người xem; preview
+        không gây thêm lần chạy face mesh nào. ProcessCamera có shared_frames
+        thì ảnh là đúng frame worker vừa phân tích, đọc từ ring buffer shared
+        memory, vẽ mắt + khoảng cách ở process web.
+
+        Args:
+            camera: DistanceCamera hoặc ProcessCamera
+            max_fps: số ảnh tối đa mỗi giây
+            quality: chất lượng JPEG (0-100)
+            boundary: chuỗi phân tách các ảnh trong response
+        """
+        self.camera = camera
+        self.max_fps = max_fps
+        self.quality = quality
+        self.boundary = boundary
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._part = None
+        self._closed = False
+        self._thread = None
+        self.viewers = 0
+        self.frames_encoded = 0
+
+    @property
+    def mimetype(self):
+        return f"multipart/x-mixed-replace; boundary={self.boundary}"
+
+    def _run(self):
+        """Lấy ảnh mới từ camera khi còn người xem"""
+        period = 1.0 / self.max_fps
+        while True:
+            with self._cond:
+                if self.viewers == 0 or self._closed:
+                    self._thread = None
+                    return
+            started = time.time()
+            try:
+                seq, jpeg = self.camera.get_preview_jpeg(self._seq, self.quality)
+            except Exception as e:
+                print(f"❌ Lỗi lấy ảnh preview: {e}")
+                seq, jpeg = self._seq, None
+            if jpeg is not None:
+                part = (f"--{self.boundary}\r\nContent-Type: image/jpeg\r\n"
+                        f"Content-Length: {len(jpeg)}\r\n\r\n").encode('ascii') + jpeg + b"\r\n"
+                with self._cond:
+                    self._seq = seq
+                    self._part = part
+                    self.frames_encoded += 1
+                    self._cond.notify_all()
+            time.sleep(max(0, period - (time.time() - started)))
+
+    def stream(self):
+        """Generator bytes cho một người xem"""
+        with self._cond:
+            self.viewers += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='preview')
+                self._thread.daemon = True
+                self._thread.start()
+            seen = 0
+        try:
+            while not self._closed:
+                with self._cond:
+                    # Ảnh hiện có được gửi ngay cho người mới vào
+                    self._cond.wait_for(lambda: (self._seq != seen and self._part is not None)
+                                        or self._closed, timeout=5)
+                    if self._seq == seen or self._part is None:
+                        continue
+                    seen, part = self._seq, self._part
+                yield part
+        finally:
+            with self._cond:
+                self.viewers -= 1
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def get_stats(self):
+        return {
+            'viewers': self.viewers,
+            'frames_encoded': self.frames_encoded,
+            'max_fps': self.max_fps
+        }
@@ -0,0 +1,82 @@
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    def __init__(self, max_entries=256, version=None):
+        """
+        Cache kết quả API trong process, LRU theo số mục
+
+        Mỗi lần dữ liệu nguồn thay đổi (thêm / xóa phiên) gọi invalidate():
+        generation tăng và mọi mục cũ bị bỏ. Kết quả tính xong sau khi đã
+        invalidate (tính song song với lần ghi) không được lưu, nên cache không
+        bao giờ trả về dữ liệu cũ hơn lần ghi gần nhất.
+
+        Khi có nhiều worker process, lần ghi ở worker khác không gọi được
+        invalidate() của process này: truyền version là hàm đọc phiên bản dữ
+        liệu nguồn dùng chung (vd. id phiên lớn nhất); mỗi lần tra cache,
+        phiên bản đổi thì coi như invalidate().
+
+        Args:
+            max_entries: số mục tối đa; 0 = tắt cache
+            version: hàm trả về phiên bản dữ liệu nguồn (None = chỉ dùng invalidate())
+        """
+        self.max_entries = max_entries
+        self.version = version
+        self._version = None
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_compute(self, key, compute):
+        """Giá trị đã cache cho key, hoặc gọi compute() rồi lưu lại"""
+        version = self.version() if self.version else None
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._invalidate_locked()
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            generation = self.generation
+
+        value = compute()
+
+        with self._lock:
+            if self.max_entries > 0 and generation == self.generation:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def invalidate(self):
+        """Dữ liệu nguồn đã đổi: bỏ toàn bộ cache"""
+        with self._lock:
+            self._invalidate_locked()
+
+    def _invalidate_locked(self):
+        self.generation += 1
+        self.invalidations += 1
+        self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'generation': self.generation,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
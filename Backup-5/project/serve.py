@@ -0,0 +1,274 @@
+"""
+Chạy webserver ở chế độ production (không debug, thread pool cố định)
+
+    python serve.py --port 5000 --threads 16
+    CAMERA_MODE=process python serve.py --server waitress
+
+Dùng waitress nếu đã cài (pip install waitress), nếu không thì dùng server
+WSGI của Werkzeug với thread pool. Ctrl+C / SIGTERM: ngừng nhận request, đóng
+các luồng SSE / preview, tắt camera rồi mới thoát.
+
+Mỗi luồng /api/stream hoặc /api/preview giữ một thread trong suốt thời gian
+xem. Với werkzeug các luồng này chạy trên thread riêng ngoài pool; với
+waitress chúng dùng thread của pool. Số luồng mở cùng lúc bị giới hạn bởi
+--max-streams (mặc định DEFAULT_MAX_STREAMS với werkzeug, --threads / 2 với waitress), vượt quá
+thì trả về 503 để các request thường vẫn còn thread xử lý.
+
+Nhiều worker process (Linux, SO_REUSEPORT) cần kho phiên dùng chung:
+    SESSION_STORE=sqlite:session_state.db python serve.py --workers 4
+Camera của máy chủ (device_id "local") bị tắt trong chế độ này (LOCAL_CAMERA=0:
+start_work của bàn local trả về 409), chỉ nhận dữ liệu từ camera_node.py.
+Luồng SSE vẫn thuộc từng worker.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+from werkzeug.wsgi import ClosingIterator
+
+# Response kéo dài suốt thời gian xem (SSE, MJPEG)
+STREAM_PATHS = ('/api/stream', '/api/preview')
+DEFAULT_MAX_STREAMS = 64
+# Thời gian chờ dòng đầu request trên thread của pool (giây)
+PEEK_TIMEOUT = 5
+
+
+def _is_stream_path(path):
+    return path.split('?', 1)[0] in STREAM_PATHS
+
+
+class StreamLimiter:
+    def __init__(self, app, max_streams):
+        """
+        Middleware WSGI giới hạn số luồng STREAM_PATHS mở cùng lúc
+
+        Luồng vượt quá max_streams nhận 503 (Retry-After) thay vì chiếm thêm
+        thread; một luồng được tính tới khi server đóng response.
+        """
+        self.app = app
+        self.max_streams = max_streams
+        self.active = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        if not _is_stream_path(environ.get('PATH_INFO', '')):
+            return self.app(environ, start_response)
+        with self._lock:
+            full = self.active >= self.max_streams
+            if full:
+                self.rejected += 1
+            else:
+                self.active += 1
+        if full:
+            start_response('503 Service Unavailable',
+                           [('Content-Type', 'text/plain'), ('Retry-After', '5')])
+            return [b'Too many open streams\n']
+        try:
+            return ClosingIterator(self.app(environ, start_response), self._release)
+        except BaseException:
+            self._release()
+            raise
+
+    def _release(self):
+        with self._lock:
+            self.active -= 1
+
+
+class _RequestHandler(WSGIRequestHandler):
+    # Đóng kết nối sau mỗi response: kết nối keep-alive không giữ thread của pool
+    protocol_version = 'HTTP/1.0'
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    # Báo cho Werkzeug / Flask rằng request chạy song song
+    multithread = True
+
+    def __init__(self, host, port, app, threads=16, reuse_port=False):
+        """
+        Server WSGI của Werkzeug, xử lý request bằng thread pool cố định
+
+        Khác với threaded=True (mỗi kết nối một thread mới, không giới hạn),
+        số thread tối đa là threads; kết nối đến khi pool bận sẽ chờ.
+        Request tới STREAM_PATHS được chuyển sang thread riêng để người xem
+        dashboard không chiếm thread của pool (số luồng do StreamLimiter giới hạn).
+        reuse_port cho phép nhiều process cùng nghe một cổng (kernel chia kết nối).
+        """
+        self.allow_reuse_port = reuse_port
+        super().__init__(host, port, app, handler=_RequestHandler)
+        self.threads = threads
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='http')
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            stream = self._is_stream(request)
+        except socket.timeout:
+            # Client không gửi gì trong PEEK_TIMEOUT: trả thread về cho pool
+            self.shutdown_request(request)
+            return
+        if stream:
+            threading.Thread(target=self._serve, args=(request, client_address),
+                             name='http-stream', daemon=True).start()
+            return
+        self._serve(request, client_address)
+
+    @staticmethod
+    def _is_stream(request):
+        """
+        Xem trước dòng đầu request (không lấy khỏi socket) để nhận ra luồng dài
+
+        Raises:
+            socket.timeout: không có dữ liệu trong PEEK_TIMEOUT giây
+        """
+        timeout = request.gettimeout()
+        request.settimeout(PEEK_TIMEOUT)
+        try:
+            head = request.recv(1024, socket.MSG_PEEK)
+        except socket.timeout:
+            raise
+        except OSError:
+            return False
+        finally:
+            request.settimeout(timeout)
+        parts = head.split(b' ', 2)
+        return len(parts) > 1 and _is_stream_path(parts[1].decode('latin-1'))
+
+    def _serve(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def run_werkzeug(app, host, port, threads, reuse_port=False, max_streams=DEFAULT_MAX_STREAMS):
+    server = PooledWSGIServer(host, port, StreamLimiter(app, max_streams), threads, reuse_port)
+    thread = threading.Thread(target=server.serve_forever, name='http-accept')
+    thread.start()
+    print(f"✅ Werkzeug ({threads} thread) tại http://{host}:{server.server_port}")
+    try:
+        while thread.is_alive():
+            thread.join(0.5)
+    except KeyboardInterrupt:
+        print("⏹️ Dừng server...")
+    finally:
+        server.shutdown()
+        thread.join()
+        server.server_close()
+
+
+def run_waitress(app, host, port, threads, max_streams=None):
+    from waitress import create_server
+
+    # Luồng dài dùng thread của pool: giữ lại ít nhất một nửa cho request thường
+    if max_streams is None:
+        max_streams = max(1, threads // 2)
+    server = create_server(StreamLimiter(app, max_streams), host=host, port=port, threads=threads)
+    print(f"✅ Waitress ({threads} thread) tại http://{host}:{port}")
+    try:
+        # waitress tự đóng server khi nhận KeyboardInterrupt
+        server.run()
+    except KeyboardInterrupt:
+        pass
+    print("⏹️ Dừng server...")
+
+
+def run_workers(args):
+    """Chạy args.workers process serve.py cùng cổng; SIGTERM / Ctrl+C được chuyển cho từng worker"""
+    if os.environ.get('SESSION_STORE', 'memory') == 'memory':
+        print("⚠️ SESSION_STORE=memory: mỗi worker giữ phiên riêng, mẫu gửi tới worker "
+              "khác sẽ bị mất. Dùng SESSION_STORE=sqlite:session_state.db")
+    command = [sys.executable, os.path.abspath(__file__), '--host', args.host,
+               '--port', str(args.port), '--threads', str(args.threads),
+               '--server', 'werkzeug', '--workers', '1', '--reuse-port']
+    if args.db:
+        command += ['--db', args.db]
+    if args.access_log:
+        command.append('--access-log')
+    if args.max_streams is not None:
+        command += ['--max-streams', str(args.max_streams)]
+    # Mỗi worker có camera riêng: start / stop giám sát sẽ rơi vào worker khác nhau
+    env = dict(os.environ, LOCAL_CAMERA='0')
+    workers = [subprocess.Popen(command, env=env) for _ in range(args.workers)]
+    print(f"✅ {args.workers} worker tại http://{args.host}:{args.port}")
+    signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        for worker in workers:
+            worker.wait()
+    except KeyboardInterrupt:
+        print("⏹️ Dừng các worker...")
+    finally:
+        for worker in workers:
+            if worker.poll() is None:
+                worker.send_signal(signal.SIGTERM)
+        for worker in workers:
+            worker.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chạy webserver ở chế độ production")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=16, help="Số thread xử lý request")
+    parser.add_argument('--server', choices=['auto', 'waitress', 'werkzeug'], default='auto')
+    parser.add_argument('--db', default=None, help="File database (mặc định work_sessions.db)")
+    parser.add_argument('--access-log', action='store_true', help="In log từng request")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Số worker process (chỉ với server werkzeug)")
+    parser.add_argument('--max-streams', type=int, default=None,
+                        help="Số luồng /api/stream + /api/preview tối đa "
+                             f"(mặc định {DEFAULT_MAX_STREAMS} với werkzeug, --threads / 2 với waitress)")
+    parser.add_argument('--reuse-port', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        run_workers(args)
+        return
+
+    server = args.server
+    if server == 'auto':
+        try:
+            import waitress  # noqa: F401
+            server = 'waitress'
+        except ImportError:
+            server = 'werkzeug'
+
+    logging.basicConfig(level=logging.INFO if args.access_log else logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.INFO if args.access_log else logging.WARNING)
+
+    import webserver
+
+    print("🚀 Khởi động Work Session Monitor...")
+    app = webserver.create_app(args.db)
+    signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        if server == 'waitress':
+            run_waitress(app, args.host, args.port, args.threads, args.max_streams)
+        else:
+            run_werkzeug(app, args.host, args.port, args.threads, args.reuse_port,
+                         args.max_streams or DEFAULT_MAX_STREAMS)
+    finally:
+        webserver.cleanup()
+
+
+if __name__ == '__main__':
+    main()
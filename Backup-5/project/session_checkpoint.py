@@ -0,0 +1,211 @@
+import json
+import sqlite3
+import threading
+import time
+
+from metrics import LatencyHistogram
+from session_registry import WorkSession
+
+
+class SessionCheckpointer:
+    def __init__(self, registry, path='session_checkpoints.db', interval=5,
+                 compact_rows=10000, synchronous='FULL'):
+        """
+        Lưu định kỳ trạng thái các phiên đang chạy để khôi phục sau khi server tắt đột ngột
+
+        Mỗi lượt chỉ thêm dòng mới (append-only) cho các phiên đã thay đổi;
+        phiên không đổi chỉ được cập nhật ts của dòng mới nhất (heartbeat).
+        Cả lượt commit một lần. Phiên đã kết thúc được ghi một dòng state
+        NULL. Khi khởi động, dòng mới nhất của mỗi thiết bị cho biết phiên
+        nào còn dở và lần cuối server còn chạy với phiên đó (ts).
+
+        Args:
+            registry: SessionRegistry (kho phiên trong RAM)
+            path: file database checkpoint (WAL)
+            interval: số giây giữa hai lượt checkpoint
+            compact_rows: số dòng đã ghi trước khi xóa các checkpoint cũ
+            synchronous: PRAGMA synchronous; 'FULL' giữ được checkpoint cả khi mất điện
+        """
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.compact_rows = compact_rows
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(f'PRAGMA synchronous={synchronous}')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS session_checkpoints (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                device_id TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                ts REAL NOT NULL,
+                state TEXT                  -- WorkSession.get_state() (JSON); NULL = đã kết thúc
+            )
+        ''')
+        self._conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_checkpoints_device
+            ON session_checkpoints (device_id, id)
+        ''')
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._written = {}          # device_id -> (started_at, (số mẫu, số cảnh báo)) đã ghi
+        self._stop = threading.Event()
+        self._thread = None
+        self.rows_since_compact = 0
+        self.rounds = 0
+        self.rows_written = 0
+        self.errors = 0
+        self.timing = LatencyHistogram()
+
+    def recover(self, is_saved=None, max_gap=None, on_expired=None, now=None):
+        """
+        Đưa các phiên còn dở trong checkpoint trở lại registry
+
+        Phiên có checkpoint cuối cũ hơn max_gap giây (server tắt qua đêm...)
+        không được khôi phục: thời gian server không chạy không phải thời
+        gian làm việc. Phiên được đóng và giao cho on_expired để lưu với thời
+        điểm kết thúc là ts của checkpoint cuối.
+
+        Args:
+            is_saved: hàm(session) -> True nếu phiên đã được lưu vào bảng
+                sessions (server tắt ngay sau stop_work, trước lượt checkpoint
+                ghi dòng kết thúc); các phiên này không được khôi phục
+            max_gap: số giây tối đa từ checkpoint cuối để phiên được khôi phục
+                (None = luôn khôi phục)
+            on_expired: hàm(session, ended_at) cho phiên quá max_gap, gọi
+                sau session.close()
+            now: thời điểm khôi phục (mặc định time.time())
+
+        Returns:
+            list: (WorkSession, số giây từ checkpoint cuối) của các phiên đã khôi phục
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT device_id, started_at, ts, state FROM session_checkpoints
+                WHERE id IN (SELECT MAX(id) FROM session_checkpoints GROUP BY device_id)
+            ''').fetchall()
+            recovered = []
+            ended = []
+            for device_id, started_at, ts, state in rows:
+                if state is None:
+                    continue
+                session = WorkSession.from_state(json.loads(state))
+                if is_saved is not None and is_saved(session):
+                    continue
+                gap = max(0, now - ts)
+                if max_gap is not None and gap > max_gap:
+                    session.close()
+                    if on_expired is not None:
+                        on_expired(session, ts)
+                    ended.append((device_id, started_at, now, None))
+                    continue
+                if self.registry.restore(session):
+                    recovered.append((session, gap))
+                    self._written[device_id] = (started_at, self._marker(session))
+            if ended:
+                with self._conn:
+                    self._conn.executemany('''
+                        INSERT INTO session_checkpoints (device_id, started_at, ts, state)
+                        VALUES (?, ?, ?, ?)
+                    ''', ended)
+            self._compact_locked()
+            return recovered
+
+    @staticmethod
+    def _marker(session):
+        # Đổi khi phiên nhận thêm mẫu hoặc cảnh báo
+        return session.stats.count, session.break_warnings
+
+    def checkpoint(self, force=False, now=None):
+        """
+        Một lượt checkpoint: phiên mới / đã đổi, heartbeat cho phiên không
+        đổi và phiên đã kết thúc
+
+        Args:
+            force: ghi dòng mới cả cho phiên không đổi
+            now: thời điểm của lượt (mặc định time.time())
+
+        Returns:
+            int: số dòng đã ghi (không tính heartbeat)
+        """
+        started = time.perf_counter()
+        now = time.time() if now is None else now
+        with self._lock:
+            active = {session.device_id: session for session in self.registry.active()}
+            rows = []
+            alive = []
+            written = {}
+            for device_id, session in active.items():
+                marker = self._marker(session)
+                previous = self._written.get(device_id)
+                if force or previous != (session.started_at, marker):
+                    rows.append((device_id, session.started_at, now, json.dumps(session.get_state())))
+                else:
+                    # Phiên rảnh vẫn đang chạy: chỉ dời ts của dòng mới nhất
+                    alive.append((now, device_id, session.started_at))
+                written[device_id] = (session.started_at, marker)
+            for device_id, (started_at, _) in self._written.items():
+                if device_id not in active or active[device_id].started_at != started_at:
+                    rows.insert(0, (device_id, started_at, now, None))
+
+            if rows or alive:
+                with self._conn:
+                    self._conn.executemany('''
+                        INSERT INTO session_checkpoints (device_id, started_at, ts, state)
+                        VALUES (?, ?, ?, ?)
+                    ''', rows)
+                    self._conn.executemany('''
+                        UPDATE session_checkpoints SET ts = ?1
+                        WHERE id = (SELECT MAX(id) FROM session_checkpoints WHERE device_id = ?2)
+                          AND started_at = ?3
+                    ''', alive)
+            self._written = written
+            self.rows_written += len(rows)
+            self.rows_since_compact += len(rows)
+            if self.rows_since_compact >= self.compact_rows:
+                self._compact_locked()
+            self.rounds += 1
+        self.timing.record(time.perf_counter() - started)
+        return len(rows)
+
+    def _compact_locked(self):
+        """Chỉ giữ dòng mới nhất của mỗi phiên còn chạy"""
+        with self._conn:
+            self._conn.execute('''
+                DELETE FROM session_checkpoints
+                WHERE id NOT IN (SELECT MAX(id) FROM session_checkpoints GROUP BY device_id)
+            ''')
+            self._conn.execute('DELETE FROM session_checkpoints WHERE state IS NULL')
+        self.rows_since_compact = 0
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.checkpoint()
+            except sqlite3.Error as e:
+                self.errors += 1
+                print(f"❌ Lỗi checkpoint phiên: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='session-checkpoint', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Dừng thread và ghi lượt cuối với ts của mọi phiên đang chạy là lúc tắt"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.checkpoint(force=True)
+
+    def get_stats(self):
+        return {
+            'interval': self.interval,
+            'rounds': self.rounds,
+            'rows_written': self.rows_written,
+            'errors': self.errors,
+            'timing': self.timing.snapshot()
+        }
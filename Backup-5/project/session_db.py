@@ -0,0 +1,365 @@
+"""
+Lưu trữ phiên làm việc (bảng sessions) với schema dạng số
+
+Chuyển database cũ (duration "1h 5m", avg_distance "52.3cm"):
+    python session_db.py migrate work_sessions.db
+    python session_db.py migrate "backups/*.db" --no-backup
+
+Tính lại bảng tổng hợp theo ngày (sau khi nhập / sửa dữ liệu sessions):
+    python session_db.py rebuild-daily work_sessions.db
+"""
+import argparse
+import glob
+import os
+import shutil
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+SCHEMA_VERSION = 3
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        start_ts INTEGER NOT NULL,          -- epoch (giây)
+        end_ts INTEGER,
+        duration_s INTEGER DEFAULT 0,       -- thời gian làm việc (giây)
+        avg_distance REAL DEFAULT 0,        -- khoảng cách trung bình (cm)
+        break_warnings INTEGER DEFAULT 0,
+        distance_warning INTEGER DEFAULT 0,
+        device_id TEXT DEFAULT 'local'
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_sessions_start ON sessions (start_ts)',
+    'CREATE INDEX IF NOT EXISTS idx_sessions_device_start ON sessions (device_id, start_ts)',
+    # Tổng hợp theo ngày (giờ địa phương), cập nhật cùng transaction với insert_session
+    '''CREATE TABLE IF NOT EXISTS daily_stats (
+        day TEXT PRIMARY KEY,               -- YYYY-MM-DD
+        sessions INTEGER NOT NULL DEFAULT 0,
+        total_seconds INTEGER NOT NULL DEFAULT 0,
+        distance_sum REAL NOT NULL DEFAULT 0,   -- tổng avg_distance các phiên
+        distance_warnings INTEGER NOT NULL DEFAULT 0,
+        break_warnings INTEGER NOT NULL DEFAULT 0
+    )'''
+)
+
+REBUILD_DAILY = '''
+    INSERT INTO daily_stats (day, sessions, total_seconds, distance_sum,
+                             distance_warnings, break_warnings)
+    SELECT date(start_ts, 'unixepoch', 'localtime'), COUNT(*),
+           COALESCE(SUM(duration_s), 0), COALESCE(SUM(avg_distance), 0),
+           COALESCE(SUM(distance_warning), 0), COALESCE(SUM(break_warnings), 0)
+    FROM sessions
+    GROUP BY 1
+'''
+
+
+class SessionDB:
+    def __init__(self, db_path='work_sessions.db'):
+        self.db_path = db_path
+
+    @contextmanager
+    def get_connection(self):
+        """Context manager kết nối database"""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row  # Cho phép truy cập column bằng tên
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def init_db(self):
+        """Tạo bảng; database schema cũ được chuyển đổi tại chỗ (sao lưu trước vào <db>.bak)"""
+        with self.get_connection() as conn:
+            legacy = _is_legacy(conn)
+            if not legacy:
+                _upgrade(conn)
+        if legacy:
+            migrated = migrate_file(self.db_path)
+            print(f"🔄 Đã chuyển {migrated} phiên sang schema mới ({self.db_path}, "
+                  f"bản cũ: {self.db_path}.bak)")
+
+    def insert_session(self, start_ts, end_ts, avg_distance, break_warnings,
+                       distance_warning, device_id='local'):
+        """Lưu một phiên đã kết thúc và cộng vào daily_stats (cùng transaction), trả về id"""
+        duration = int(end_ts) - int(start_ts)
+        distance_warning = int(bool(distance_warning))
+        with self.get_connection() as conn:
+            with conn:
+                cursor = conn.execute('''
+                    INSERT INTO sessions (start_ts, end_ts, duration_s, avg_distance,
+                                          break_warnings, distance_warning, device_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (int(start_ts), int(end_ts), duration, avg_distance,
+                      break_warnings, distance_warning, device_id))
+                conn.execute('''
+                    INSERT INTO daily_stats (day, sessions, total_seconds, distance_sum,
+                                             distance_warnings, break_warnings)
+                    VALUES (date(?, 'unixepoch', 'localtime'), 1, ?, ?, ?, ?)
+                    ON CONFLICT(day) DO UPDATE SET
+                        sessions = sessions + 1,
+                        total_seconds = total_seconds + excluded.total_seconds,
+                        distance_sum = distance_sum + excluded.distance_sum,
+                        distance_warnings = distance_warnings + excluded.distance_warnings,
+                        break_warnings = break_warnings + excluded.break_warnings
+                ''', (int(start_ts), duration, avg_distance, distance_warning, break_warnings))
+            return cursor.lastrowid
+
+    def rebuild_daily_stats(self):
+        """Tính lại daily_stats từ bảng sessions, trả về số ngày"""
+        with self.get_connection() as conn:
+            with conn:
+                conn.execute('DELETE FROM daily_stats')
+                conn.execute(REBUILD_DAILY)
+            return conn.execute('SELECT COUNT(*) FROM daily_stats').fetchone()[0]
+
+    def list_sessions(self, limit=None, before=None, start_ts=None, end_ts=None,
+                      warnings_only=False):
+        """
+        Phiên mới nhất trước, phân trang theo keyset (start_ts, id)
+
+        Mỗi trang chỉ đọc limit dòng theo index idx_sessions_start, không phụ
+        thuộc số phiên đã lưu hay trang thứ mấy.
+
+        Args:
+            limit: số phiên tối đa (None = tất cả)
+            before: (start_ts, id) của phiên cuối trang trước
+            start_ts, end_ts: chỉ lấy phiên bắt đầu trong [start_ts, end_ts)
+            warnings_only: chỉ lấy phiên có cảnh báo khoảng cách hoặc nghỉ giải lao
+        """
+        upper = end_ts if end_ts is not None else 2 ** 62
+        if before is not None:
+            # Gộp cursor vào cận trên để SQLite chỉ duyệt đúng khoảng index còn lại
+            upper = min(upper, before[0] + 1)
+        where = ['start_ts >= ?', 'start_ts < ?']
+        params = [start_ts if start_ts is not None else 0, upper]
+        if before is not None:
+            where.append('(start_ts < ? OR id < ?)')
+            params.extend(before)
+        if warnings_only:
+            where.append('(distance_warning = 1 OR break_warnings > 0)')
+        sql = f'''
+            SELECT * FROM sessions WHERE {' AND '.join(where)}
+            ORDER BY start_ts DESC, id DESC
+        '''
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        with self.get_connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def has_session(self, device_id, start_ts):
+        """Đã có phiên của device_id bắt đầu lúc start_ts (epoch, giây) chưa"""
+        with self.get_connection() as conn:
+            return conn.execute('SELECT 1 FROM sessions WHERE device_id = ? AND start_ts = ?',
+                                (device_id, int(start_ts))).fetchone() is not None
+
+    def latest_id(self):
+        """id lớn nhất trong sessions (0 nếu chưa có phiên); đổi mỗi khi thêm phiên"""
+        with self.get_connection() as conn:
+            return conn.execute('SELECT COALESCE(MAX(id), 0) FROM sessions').fetchone()[0]
+
+    def daily_summary(self, start_day=None, end_day=None):
+        """
+        Tổng hợp theo ngày (giờ địa phương) đọc từ daily_stats
+
+        Args:
+            start_day, end_day: 'YYYY-MM-DD' (gồm cả hai đầu); None = không giới hạn
+        """
+        with self.get_connection() as conn:
+            return conn.execute('''
+                SELECT day, sessions, total_seconds,
+                       distance_sum / sessions AS avg_distance,
+                       distance_warnings, break_warnings
+                FROM daily_stats
+                WHERE day >= ? AND day <= ?
+                ORDER BY day
+            ''', (start_day or '0000-00-00', end_day or '9999-99-99')).fetchall()
+
+
+# Định dạng hiển thị (chỉ dùng khi trả response)
+def format_time(ts):
+    return datetime.fromtimestamp(ts).strftime(TIME_FORMAT) if ts else ''
+
+
+def format_duration(seconds):
+    """Định dạng kiểu "1h 5m" / "5m" như giao diện vẫn dùng"""
+    seconds = seconds or 0
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    return f"{hours}h {minutes}m" if hours > 0 else f"{minutes}m"
+
+
+def format_distance(cm):
+    return f"{cm or 0:.1f}cm"
+
+
+# Chuyển đổi schema cũ
+def _parse_time(text):
+    return int(datetime.strptime(text, TIME_FORMAT).timestamp()) if text else None
+
+
+def _parse_duration(text):
+    """ "1h 5m" -> 3900"""
+    minutes = 0
+    text = (text or '').strip()
+    if 'h' in text:
+        hours, _, text = text.partition('h')
+        minutes += int(hours) * 60
+    text = text.replace('m', '').strip()
+    if text:
+        minutes += int(text)
+    return minutes * 60
+
+
+def _parse_distance(text):
+    """ "52.3cm" -> 52.3"""
+    text = (text or '').replace('cm', '').strip()
+    return float(text) if text else 0.0
+
+
+def _upgrade(conn):
+    """Tạo bảng / index còn thiếu; database trước khi có daily_stats được tính bù"""
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    with conn:
+        for statement in SCHEMA:
+            conn.execute(statement)
+        if version < 3:
+            conn.execute('DELETE FROM daily_stats')
+            conn.execute(REBUILD_DAILY)
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+
+def _is_legacy(conn):
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(sessions)')]
+    return 'start_time' in columns
+
+
+def _migrate(conn):
+    """
+    Chuyển bảng sessions dạng chuỗi sang schema số trong một transaction
+
+    duration lấy từ end - start nếu có đủ hai mốc (chính xác tới giây), nếu
+    không thì từ chuỗi "1h 5m". Phiên có thời gian bắt đầu không đọc được bị
+    bỏ qua; duration / avg_distance không đọc được thì ghi 0.
+
+    Returns:
+        int: số phiên đã chuyển
+    """
+    rows = conn.execute('SELECT * FROM sessions ORDER BY id').fetchall()
+    converted = []
+    for row in rows:
+        row = dict(row)
+        try:
+            start_ts = _parse_time(row['start_time'])
+            end_ts = _parse_time(row.get('end_time'))
+        except ValueError:
+            start_ts = None
+        if start_ts is None:
+            print(f"⚠️ Bỏ qua phiên {row['id']}: thời gian không hợp lệ")
+            continue
+        try:
+            duration = end_ts - start_ts if end_ts else _parse_duration(row.get('duration'))
+        except ValueError:
+            duration = 0
+        try:
+            avg_distance = _parse_distance(row.get('avg_distance'))
+        except ValueError:
+            avg_distance = 0.0
+        converted.append((row['id'], start_ts, end_ts, duration, avg_distance,
+                          row.get('break_warnings') or 0, int(bool(row.get('distance_warning'))),
+                          row.get('device_id') or 'local'))
+
+    # Tự quản lý transaction: lỗi ở bất kỳ bước nào thì giữ nguyên bảng cũ
+    conn.isolation_level = None
+    try:
+        conn.execute('BEGIN')
+        conn.execute('ALTER TABLE sessions RENAME TO sessions_legacy')
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.executemany('''
+            INSERT INTO sessions (id, start_ts, end_ts, duration_s, avg_distance,
+                                  break_warnings, distance_warning, device_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', converted)
+        conn.execute('DROP TABLE sessions_legacy')
+        conn.execute('PRAGMA user_version = 2')
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.isolation_level = ''
+    return len(converted)
+
+
+def migrate_file(path, backup=True):
+    """Chuyển một file database; trả về số phiên đã chuyển (0 nếu đã ở schema mới)"""
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Không tìm thấy {path}")
+    db = SessionDB(path)
+    with db.get_connection() as conn:
+        if not _is_legacy(conn):
+            _upgrade(conn)
+            return 0
+    if backup:
+        shutil.copy2(path, path + '.bak')
+    with db.get_connection() as conn:
+        migrated = _migrate(conn)
+        _upgrade(conn)
+    return migrated
+
+
+def _expand(patterns):
+    return [path for pattern in patterns for path in (sorted(glob.glob(pattern)) or [pattern])]
+
+
+def cmd_migrate(args):
+    for path in _expand(args.paths):
+        start = time.time()
+        try:
+            migrated = migrate_file(path, backup=not args.no_backup)
+        except (sqlite3.Error, OSError) as e:
+            print(f"❌ {path}: {e}")
+            continue
+        if migrated:
+            print(f"✅ {path}: {migrated} phiên ({time.time() - start:.2f}s)")
+        else:
+            print(f"⏭️ {path}: đã ở schema mới")
+
+
+def cmd_rebuild_daily(args):
+    for path in _expand(args.paths):
+        start = time.time()
+        try:
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"Không tìm thấy {path}")
+            db = SessionDB(path)
+            db.init_db()
+            days = db.rebuild_daily_stats()
+        except (sqlite3.Error, OSError) as e:
+            print(f"❌ {path}: {e}")
+            continue
+        print(f"✅ {path}: {days} ngày ({time.time() - start:.2f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quản lý database phiên làm việc")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('migrate', help="Chuyển database schema cũ sang schema số")
+    p.add_argument('paths', nargs='+', help="File database hoặc mẫu glob")
+    p.add_argument('--no-backup', action='store_true', help="Không tạo file .bak")
+    p.set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser('rebuild-daily', help="Tính lại bảng daily_stats từ sessions")
+    p.add_argument('paths', nargs='+', help="File database hoặc mẫu glob")
+    p.set_defaults(func=cmd_rebuild_daily)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+import threading
+import time
+from datetime import datetime
+
+from session_stats import StreamingStats
+
+# Thiết bị mặc định: camera gắn với chính máy chạy webserver
+LOCAL_DEVICE = 'local'
+
+
+class WorkSession:
+    def __init__(self, device_id, safe_distance=50):
+        """
+        Phiên làm việc của một bàn / thiết bị
+
+        Mọi thay đổi đi qua khóa riêng của phiên, nên bàn đang gửi nhiều mẫu
+        không làm chậm các bàn khác. Mẫu khoảng cách được gộp vào
+        StreamingStats, không giữ lại từng mẫu.
+        """
+        self.device_id = device_id
+        self.started_at = time.time()
+        self.start_time = datetime.fromtimestamp(self.started_at).strftime('%Y-%m-%d %H:%M:%S')
+        self.stats = StreamingStats(safe_distance)
+        self.break_warnings = 0
+        self.last_ts = None
+        self.last_warning_ts = None
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def add_distance(self, distance, ts=None):
+        """
+        Thêm một mẫu khoảng cách
+
+        ts của một thiết bị chỉ tăng dần: mẫu có ts không lớn hơn mẫu mới
+        nhất đã nhận là lần đo đã tính (vòng giám sát và /check_distance dùng
+        chung kết quả, hoặc lô được gửi lại sau khi mất response) nên bị bỏ.
+
+        Returns:
+            bool: True nếu mẫu được ghi nhận
+        """
+        with self.lock:
+            if self.closed:
+                return False
+            if ts is not None:
+                if self.last_ts is not None and ts <= self.last_ts:
+                    return False
+                self.last_ts = ts
+            self.stats.add(float(distance), ts)
+            return True
+
+    def add_break_warning(self, ts=None):
+        """
+        Cảnh báo có ts không lớn hơn cảnh báo mới nhất đã nhận bị bỏ (lô gửi lại)
+
+        Returns:
+            int: số cảnh báo sau khi cộng, None nếu phiên đã kết thúc hoặc trùng
+        """
+        with self.lock:
+            if self.closed:
+                return None
+            if ts is not None:
+                if self.last_warning_ts is not None and ts <= self.last_warning_ts:
+                    return None
+                self.last_warning_ts = ts
+            self.break_warnings += 1
+            return self.break_warnings
+
+    def close(self):
+        """Kết thúc phiên: không nhận thêm mẫu, trả về (stats, break_warnings)"""
+        with self.lock:
+            self.closed = True
+            return self.stats.snapshot(), self.break_warnings
+
+    def get_state(self):
+        """Trạng thái dạng dict (JSON được), để lưu ngoài process"""
+        with self.lock:
+            return {
+                'device_id': self.device_id,
+                'started_at': self.started_at,
+                'break_warnings': self.break_warnings,
+                'last_ts': self.last_ts,
+                'last_warning_ts': self.last_warning_ts,
+                'stats': self.stats.get_state()
+            }
+
+    @classmethod
+    def from_state(cls, state):
+        session = cls(state['device_id'], state['stats']['threshold'])
+        session.started_at = state['started_at']
+        session.start_time = datetime.fromtimestamp(session.started_at).strftime('%Y-%m-%d %H:%M:%S')
+        session.break_warnings = state['break_warnings']
+        session.last_ts = state['last_ts']
+        session.last_warning_ts = state.get('last_warning_ts')
+        session.stats = StreamingStats.from_state(state['stats'])
+        return session
+
+    def snapshot(self):
+        with self.lock:
+            stats = self.stats.snapshot()
+            return {
+                'active': not self.closed,
+                'device_id': self.device_id,
+                'start_time': self.start_time,
+                'distance_count': stats['count'],
+                'break_warnings': self.break_warnings,
+                'avg_distance': self.stats.mean,
+                'stats': stats
+            }
+
+
+class SessionRegistry:
+    def __init__(self, safe_distance=50):
+        """
+        Các phiên làm việc đang chạy, theo device_id
+
+        Khóa của registry chỉ giữ khi thêm / bỏ phiên; ghi mẫu chỉ khóa phiên
+        của thiết bị đó.
+        """
+        self.safe_distance = safe_distance
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def start(self, device_id):
+        """
+        Bắt đầu phiên cho device_id
+
+        Returns:
+            WorkSession mới, hoặc None nếu thiết bị đang có phiên
+        """
+        with self._lock:
+            if device_id in self._sessions:
+                return None
+            session = WorkSession(device_id, self.safe_distance)
+            self._sessions[device_id] = session
+            return session
+
+    def restore(self, session):
+        """
+        Đưa lại một phiên khôi phục từ checkpoint
+
+        Returns:
+            bool: False nếu thiết bị đã có phiên khác
+        """
+        with self._lock:
+            if session.device_id in self._sessions:
+                return False
+            self._sessions[session.device_id] = session
+            return True
+
+    def get(self, device_id):
+        """Phiên đang chạy của device_id (None nếu không có)"""
+        return self._sessions.get(device_id)
+
+    def stop(self, device_id):
+        """
+        Bỏ phiên của device_id khỏi registry
+
+        Returns:
+            WorkSession đã bỏ (chưa close), hoặc None
+        """
+        with self._lock:
+            return self._sessions.pop(device_id, None)
+
+    def active(self):
+        """Danh sách các phiên đang chạy"""
+        with self._lock:
+            return list(self._sessions.values())
+
+    def __len__(self):
+        return len(self._sessions)
@@ -0,0 +1,179 @@
+import math
+import time
+
+
+class P2Quantile:
+    def __init__(self, p):
+        """
+        Ước lượng phân vị p (0-1) theo thuật toán P² (Jain & Chlamtac)
+
+        Chỉ giữ 5 điểm đánh dấu, mỗi mẫu cập nhật O(1), không lưu dữ liệu gốc.
+        """
+        self.p = p
+        self._initial = []
+        self.heights = None
+        self.positions = None
+        self.desired = None
+        self.increments = (0, p / 2, p, (1 + p) / 2, 1)
+
+    def add(self, x):
+        if self.heights is None:
+            self._initial.append(x)
+            if len(self._initial) == 5:
+                self.heights = sorted(self._initial)
+                self.positions = [0, 1, 2, 3, 4]
+                self.desired = [0, 2 * self.p, 4 * self.p, 2 + 2 * self.p, 4]
+            return
+
+        q, n = self.heights, self.positions
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Dịch các điểm giữa về vị trí mong muốn
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def get_state(self):
+        """Trạng thái dạng dict (JSON được), để lưu ngoài process"""
+        return {'p': self.p, 'initial': self._initial, 'heights': self.heights,
+                'positions': self.positions, 'desired': self.desired}
+
+    @classmethod
+    def from_state(cls, state):
+        quantile = cls(state['p'])
+        quantile._initial = list(state['initial'])
+        quantile.heights = state['heights']
+        quantile.positions = state['positions']
+        quantile.desired = state['desired']
+        return quantile
+
+    def value(self):
+        if self.heights is not None:
+            return self.heights[2]
+        if not self._initial:
+            return 0
+        values = sorted(self._initial)
+        return values[int(round(self.p * (len(values) - 1)))]
+
+
+class StreamingStats:
+    def __init__(self, threshold, max_gap=60):
+        """
+        Thống kê khoảng cách của một phiên, bộ nhớ không đổi
+
+        count, mean / variance (Welford), min, max, số mẫu và số giây dưới
+        ngưỡng, p50 / p95 (P²). Thêm mẫu và đọc kết quả đều O(1).
+
+        Args:
+            threshold: ngưỡng khoảng cách an toàn (cm)
+            max_gap: khoảng cách thời gian tối đa (giây) giữa hai mẫu được tính
+                vào thời gian dưới ngưỡng; khoảng lâu hơn (camera tắt, mất
+                kết nối) chỉ tính max_gap
+        """
+        self.threshold = threshold
+        self.max_gap = max_gap
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+        self.below_count = 0
+        self.seconds_below = 0.0
+        self._last_ts = None
+        self._last_below = False
+        self._p50 = P2Quantile(0.5)
+        self._p95 = P2Quantile(0.95)
+
+    def add(self, value, ts=None):
+        """Thêm một mẫu (cm) đo lúc ts (mặc định: bây giờ)"""
+        ts = ts if ts is not None else time.time()
+        below = value < self.threshold
+
+        # Khoảng thời gian từ mẫu trước tính theo trạng thái của mẫu trước
+        if self._last_ts is not None and ts > self._last_ts:
+            if self._last_below:
+                self.seconds_below += min(ts - self._last_ts, self.max_gap)
+        if self._last_ts is None or ts >= self._last_ts:
+            self._last_ts = ts
+            self._last_below = below
+
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if below:
+            self.below_count += 1
+        self._p50.add(value)
+        self._p95.add(value)
+
+    def get_state(self):
+        """Toàn bộ trạng thái dạng dict (JSON được), khôi phục bằng from_state()"""
+        return {
+            'threshold': self.threshold, 'max_gap': self.max_gap,
+            'count': self.count, 'mean': self.mean, 'm2': self._m2,
+            'min': self.min, 'max': self.max,
+            'below_count': self.below_count, 'seconds_below': self.seconds_below,
+            'last_ts': self._last_ts, 'last_below': self._last_below,
+            'p50': self._p50.get_state(), 'p95': self._p95.get_state()
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        stats = cls(state['threshold'], state['max_gap'])
+        stats.count = state['count']
+        stats.mean = state['mean']
+        stats._m2 = state['m2']
+        stats.min = state['min']
+        stats.max = state['max']
+        stats.below_count = state['below_count']
+        stats.seconds_below = state['seconds_below']
+        stats._last_ts = state['last_ts']
+        stats._last_below = state['last_below']
+        stats._p50 = P2Quantile.from_state(state['p50'])
+        stats._p95 = P2Quantile.from_state(state['p95'])
+        return stats
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean': round(self.mean, 2),
+            'stddev': round(math.sqrt(self.variance), 2),
+            'min': round(self.min, 2) if self.min is not None else 0,
+            'max': round(self.max, 2) if self.max is not None else 0,
+            'p50': round(self._p50.value(), 2),
+            'p95': round(self._p95.value(), 2),
+            'below_count': self.below_count,
+            'seconds_below': round(self.seconds_below, 1),
+            'threshold': self.threshold
+        }
@@ -0,0 +1,320 @@
+"""
+Trạng thái phiên đang chạy dùng chung giữa nhiều worker process
+
+Chọn bằng biến môi trường SESSION_STORE của webserver:
+    memory                    (mặc định) SessionRegistry trong process, chỉ 1 worker
+    sqlite:session_state.db   SQLite (WAL), các worker trên cùng một máy
+    manager:127.0.0.1:50055   process riêng giữ trạng thái trong RAM:
+                              python session_store.py serve --port 50055
+
+Mọi backend có cùng giao diện với SessionRegistry (start / get / stop / active)
+và phiên có cùng các hàm với WorkSession, nên webserver không cần biết trạng
+thái nằm ở đâu.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from multiprocessing.managers import BaseManager
+
+from session_registry import SessionRegistry, WorkSession
+
+DEFAULT_MANAGER_PORT = 50055
+
+
+class SessionHandle:
+    def __init__(self, backend, device_id, session_id, started_at):
+        """
+        Phiên đang chạy nằm trong backend dùng chung
+
+        Handle chỉ giữ khóa (device_id, session_id); mỗi thao tác là một lần
+        gọi nguyên tử vào backend. Khi phiên đã kết thúc (kể cả khi thiết bị
+        đã bắt đầu phiên mới) thao tác được xử lý như với phiên đã đóng.
+        """
+        self.backend = backend
+        self.device_id = device_id
+        self.session_id = session_id
+        self.started_at = started_at
+        self.start_time = datetime.fromtimestamp(started_at).strftime('%Y-%m-%d %H:%M:%S')
+
+    def add_distance(self, distance, ts=None):
+        return self.backend.add_distance(self.device_id, self.session_id, float(distance), ts)
+
+    def add_break_warning(self, ts=None):
+        return self.backend.add_break_warning(self.device_id, self.session_id, ts)
+
+    @property
+    def break_warnings(self):
+        return self.snapshot().get('break_warnings', 0)
+
+    def snapshot(self):
+        state = self.backend.get_state(self.device_id, self.session_id)
+        if state is None:
+            return {'active': False, 'device_id': self.device_id}
+        return WorkSession.from_state(state).snapshot()
+
+
+class SharedSessionStore:
+    def __init__(self, backend):
+        """Giao diện SessionRegistry trên một backend dùng chung (SQLite / manager)"""
+        self.backend = backend
+
+    def start(self, device_id):
+        started = self.backend.begin(device_id)
+        return SessionHandle(self.backend, device_id, *started) if started else None
+
+    def get(self, device_id):
+        found = self.backend.lookup(device_id)
+        return SessionHandle(self.backend, device_id, *found) if found else None
+
+    def stop(self, device_id):
+        """Bỏ phiên khỏi backend, trả về WorkSession với trạng thái cuối (chưa close)"""
+        state = self.backend.end(device_id)
+        return WorkSession.from_state(state) if state else None
+
+    def active(self):
+        return [SessionHandle(self.backend, *row) for row in self.backend.list_active()]
+
+    def __len__(self):
+        return self.backend.count()
+
+
+class SqliteSessionBackend:
+    def __init__(self, path='session_state.db', safe_distance=50, timeout=30):
+        """
+        Phiên đang chạy lưu trong SQLite (WAL), dùng chung cho mọi process
+
+        Cảnh báo nghỉ là một lệnh UPDATE ... + 1; mẫu khoảng cách đọc - cộng -
+        ghi lại thống kê trong một transaction BEGIN IMMEDIATE, nên nhiều
+        worker ghi cùng một phiên không làm mất mẫu. Phiên còn nguyên sau khi
+        khởi động lại server.
+
+        Args:
+            path: file database
+            safe_distance: ngưỡng khoảng cách an toàn (cm) cho phiên mới
+            timeout: thời gian chờ khóa ghi tối đa (giây)
+        """
+        self.path = path
+        self.safe_distance = safe_distance
+        self.timeout = timeout
+        self._local = threading.local()
+        self._conn().execute('''
+            CREATE TABLE IF NOT EXISTS active_sessions (
+                device_id TEXT PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                break_warnings INTEGER NOT NULL DEFAULT 0,
+                last_warning_ts REAL,           -- ts cảnh báo mới nhất (bỏ cảnh báo gửi lại)
+                state TEXT NOT NULL             -- WorkSession.get_state() (JSON)
+            )
+        ''')
+        columns = [row[1] for row in self._conn().execute('PRAGMA table_info(active_sessions)')]
+        if 'last_warning_ts' not in columns:
+            self._conn().execute('ALTER TABLE active_sessions ADD COLUMN last_warning_ts REAL')
+
+    def _conn(self):
+        """Mỗi thread một kết nối (autocommit, transaction tự mở khi cần)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _state(row):
+        state = json.loads(row[0])
+        state['break_warnings'] = row[1]
+        state['last_warning_ts'] = row[2]
+        return state
+
+    def begin(self, device_id):
+        session = WorkSession(device_id, self.safe_distance)
+        session_id = uuid.uuid4().hex
+        cursor = self._conn().execute('''
+            INSERT INTO active_sessions (device_id, session_id, started_at, state)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(device_id) DO NOTHING
+        ''', (device_id, session_id, session.started_at, json.dumps(session.get_state())))
+        return (session_id, session.started_at) if cursor.rowcount == 1 else None
+
+    def lookup(self, device_id):
+        row = self._conn().execute(
+            'SELECT session_id, started_at FROM active_sessions WHERE device_id = ?',
+            (device_id,)).fetchone()
+        return tuple(row) if row else None
+
+    def add_distance(self, device_id, session_id, distance, ts=None):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('''
+                SELECT state, break_warnings, last_warning_ts FROM active_sessions
+                WHERE device_id = ? AND session_id = ?
+            ''', (device_id, session_id)).fetchone()
+            added = False
+            if row is not None:
+                session = WorkSession.from_state(self._state(row))
+                added = session.add_distance(distance, ts)
+                if added:
+                    conn.execute('UPDATE active_sessions SET state = ? WHERE device_id = ?',
+                                 (json.dumps(session.get_state()), device_id))
+            conn.execute('COMMIT')
+            return added
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def add_break_warning(self, device_id, session_id, ts=None):
+        rows = self._conn().execute('''
+            UPDATE active_sessions SET break_warnings = break_warnings + 1,
+                                       last_warning_ts = COALESCE(:ts, last_warning_ts)
+            WHERE device_id = :device_id AND session_id = :session_id
+              AND (:ts IS NULL OR last_warning_ts IS NULL OR :ts > last_warning_ts)
+            RETURNING break_warnings
+        ''', {'device_id': device_id, 'session_id': session_id, 'ts': ts}).fetchall()
+        return rows[0][0] if rows else None
+
+    def get_state(self, device_id, session_id):
+        row = self._conn().execute('''
+            SELECT state, break_warnings, last_warning_ts FROM active_sessions
+            WHERE device_id = ? AND session_id = ?
+        ''', (device_id, session_id)).fetchone()
+        return self._state(row) if row else None
+
+    def end(self, device_id):
+        rows = self._conn().execute(
+            'DELETE FROM active_sessions WHERE device_id = ? '
+            'RETURNING state, break_warnings, last_warning_ts',
+            (device_id,)).fetchall()
+        return self._state(rows[0]) if rows else None
+
+    def list_active(self):
+        return [tuple(row) for row in self._conn().execute(
+            'SELECT device_id, session_id, started_at FROM active_sessions ORDER BY started_at')]
+
+    def count(self):
+        return self._conn().execute('SELECT COUNT(*) FROM active_sessions').fetchone()[0]
+
+
+class MemorySessionBackend:
+    def __init__(self, safe_distance=50):
+        """Backend trong RAM, chạy trong process của session_store.py serve"""
+        self.safe_distance = safe_distance
+        self._sessions = {}     # device_id -> (session_id, WorkSession)
+        self._lock = threading.Lock()
+
+    def _session(self, device_id, session_id):
+        entry = self._sessions.get(device_id)
+        return entry[1] if entry and entry[0] == session_id else None
+
+    def begin(self, device_id):
+        with self._lock:
+            if device_id in self._sessions:
+                return None
+            session = WorkSession(device_id, self.safe_distance)
+            session_id = uuid.uuid4().hex
+            self._sessions[device_id] = (session_id, session)
+            return session_id, session.started_at
+
+    def lookup(self, device_id):
+        entry = self._sessions.get(device_id)
+        return (entry[0], entry[1].started_at) if entry else None
+
+    def add_distance(self, device_id, session_id, distance, ts=None):
+        session = self._session(device_id, session_id)
+        return session.add_distance(distance, ts) if session else False
+
+    def add_break_warning(self, device_id, session_id, ts=None):
+        session = self._session(device_id, session_id)
+        return session.add_break_warning(ts) if session else None
+
+    def get_state(self, device_id, session_id):
+        session = self._session(device_id, session_id)
+        return session.get_state() if session else None
+
+    def end(self, device_id):
+        with self._lock:
+            entry = self._sessions.pop(device_id, None)
+        if entry is None:
+            return None
+        entry[1].close()
+        return entry[1].get_state()
+
+    def list_active(self):
+        with self._lock:
+            return [(device_id, session_id, session.started_at)
+                    for device_id, (session_id, session) in self._sessions.items()]
+
+    def count(self):
+        return len(self._sessions)
+
+
+class _ManagerServer(BaseManager):
+    pass
+
+
+class _ManagerClient(BaseManager):
+    pass
+
+
+_ManagerClient.register('sessions')
+
+
+def _authkey():
+    return os.environ.get('SESSION_STORE_AUTHKEY', 'work-session-monitor').encode()
+
+
+def connect_manager(host='127.0.0.1', port=DEFAULT_MANAGER_PORT):
+    """Proxy tới MemorySessionBackend của process session_store.py serve"""
+    manager = _ManagerClient(address=(host, port), authkey=_authkey())
+    manager.connect()
+    return manager.sessions()
+
+
+def create_session_store(spec='memory', safe_distance=50):
+    """
+    Tạo kho phiên theo chuỗi cấu hình SESSION_STORE (xem đầu file)
+
+    Raises:
+        ValueError: chuỗi cấu hình không hợp lệ
+    """
+    kind, _, target = spec.partition(':')
+    if kind == 'memory':
+        return SessionRegistry(safe_distance=safe_distance)
+    if kind == 'sqlite':
+        return SharedSessionStore(SqliteSessionBackend(target or 'session_state.db', safe_distance))
+    if kind == 'manager':
+        host, _, port = target.rpartition(':')
+        return SharedSessionStore(connect_manager(host or '127.0.0.1',
+                                                  int(port or DEFAULT_MANAGER_PORT)))
+    raise ValueError(f"SESSION_STORE không hợp lệ: {spec}")
+
+
+def serve(host='127.0.0.1', port=DEFAULT_MANAGER_PORT, safe_distance=50):
+    """Chạy process giữ trạng thái phiên cho backend manager"""
+    backend = MemorySessionBackend(safe_distance)
+    _ManagerServer.register('sessions', callable=lambda: backend)
+    manager = _ManagerServer(address=(host, port), authkey=_authkey())
+    server = manager.get_server()
+    print(f"✅ Session store tại {host}:{port}")
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kho trạng thái phiên dùng chung")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('serve', help="Chạy process giữ trạng thái phiên (backend manager)")
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=DEFAULT_MANAGER_PORT)
+    p.add_argument('--safe-distance', type=float, default=50)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.safe_distance)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class TelemetryUploader:
+    def __init__(self, server_url, device_id='local', batch_size=20, flush_interval=5,
+                 spool_path='telemetry_spool.jsonl', timeout=5, pool_size=2,
+                 max_backoff=60):
+        """
+        Gửi mẫu đo từ camera ở máy khác lên server theo lô
+
+        - Gom mẫu, gửi khi đủ batch_size mẫu hoặc sau flush_interval giây
+        - Dùng chung một requests.Session (giữ kết nối keep-alive)
+        - Server không phản hồi (lỗi kết nối / 5xx): ghi lô vào file spool
+          (JSON lines, chỉ append), lần gửi sau phát lại spool đúng thứ tự
+          trước khi gửi lô mới
+        - Server từ chối lô (4xx, hoặc 200 với success=false như khi bàn
+          chưa có phiên): gửi lại cũng không được nên không spool, lô được
+          chuyển sang file <spool_path>.rejected để kiểm tra
+
+        Có publish(topic, payload) giống EventBus / HttpTransport nên dùng
+        được làm transport của DistanceCamera.start_monitoring().
+
+        Args:
+            server_url: URL của web server
+            device_id: mã bàn / thiết bị, server ghi mẫu vào phiên của mã này
+            batch_size: số mẫu tối đa mỗi request
+            flush_interval: thời gian giữ mẫu tối đa trước khi gửi (giây)
+            spool_path: file lưu mẫu chưa gửi được
+            timeout: timeout mỗi request (giây)
+            pool_size: số kết nối giữ trong pool
+            max_backoff: thời gian chờ tối đa giữa các lần thử lại (giây)
+        """
+        self.url = f"{server_url}/add_distance_batch"
+        self.device_id = device_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+        self._backoff = 0
+        self._retry_at = 0
+
+        # Thống kê
+        self.samples_sent = 0
+        self.batches_sent = 0
+        self.samples_spooled = 0
+        self.samples_replayed = 0
+        self.samples_rejected = 0
+        self.send_failures = 0
+
+    def start(self):
+        """Bắt đầu thread gửi"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='telemetry-uploader')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Dừng thread gửi; mẫu còn lại được gửi nốt hoặc ghi vào spool"""
+        self._running = False
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=self.timeout * 2)
+            self._thread = None
+        self._retry_at = 0
+        self.flush()
+        self.session.close()
+
+    def publish(self, topic, payload=None):
+        """Thêm một mẫu (distance / break_warning) vào lô đang gom"""
+        sample = dict(payload or {}, type=topic)
+        sample.setdefault('ts', time.time())
+        with self._lock:
+            self._buffer.append(sample)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wakeup.set()
+        return 1
+
+    def _run(self):
+        while self._running:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """
+        Gửi spool (nếu có) rồi đến các mẫu đang gom
+
+        Returns:
+            bool: True nếu không còn mẫu nào chờ gửi
+        """
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+
+        if time.time() < self._retry_at:
+            # Đang chờ thử lại: ghi thẳng vào spool để giữ thứ tự
+            self._spool(batch)
+            return False
+
+        if not self._replay_spool():
+            self._spool(batch)
+            return False
+
+        for i in range(0, len(batch), self.batch_size):
+            if not self._send(batch[i:i + self.batch_size]):
+                self._spool(batch[i:])
+                return False
+        return True
+
+    def _send(self, samples):
+        """Gửi một lô, trả về True nếu lô không cần gửi lại (server đã nhận hoặc đã từ chối)"""
+        if not samples:
+            return True
+        try:
+            response = self.session.post(self.url, json={'device_id': self.device_id, 'samples': samples},
+                                         timeout=self.timeout)
+            status = response.status_code
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Lỗi kết nối server khi gửi lô {len(samples)} mẫu: {e}")
+            status = None
+
+        if status is not None and 400 <= status < 500:
+            self._reject(samples, f"HTTP {status}")
+            return True
+
+        if status != 200:
+            self.send_failures += 1
+            self._backoff = min(self.max_backoff, max(1, self._backoff * 2))
+            self._retry_at = time.time() + self._backoff
+            return False
+
+        self._backoff = 0
+        self._retry_at = 0
+        try:
+            result = response.json()
+        except ValueError:
+            result = {}
+        if isinstance(result, dict) and result.get('success') is False:
+            # Vd. "No active session": mẫu đo ngoài phiên, không thuộc phiên nào sau này
+            self._reject(samples, result.get('error') or 'success=false')
+            return True
+        self.samples_sent += len(samples)
+        self.batches_sent += 1
+        print(f"📤 Đã gửi lô {len(samples)} mẫu")
+        return True
+
+    def _reject(self, samples, reason):
+        """Lô bị server từ chối: ghi sang file .rejected, không thử lại"""
+        with open(self.spool_path + '.rejected', 'a', encoding='utf-8') as f:
+            for sample in samples:
+                f.write(json.dumps(sample) + '\n')
+        self.samples_rejected += len(samples)
+        print(f"⚠️ Server từ chối lô {len(samples)} mẫu ({reason}), "
+              f"đã chuyển sang {self.spool_path}.rejected")
+
+    def _spool(self, samples):
+        """Ghi nối các mẫu chưa gửi được vào file spool"""
+        if not samples:
+            return
+        with open(self.spool_path, 'a', encoding='utf-8') as f:
+            for sample in samples:
+                f.write(json.dumps(sample) + '\n')
+        self.samples_spooled += len(samples)
+        print(f"💾 Lưu {len(samples)} mẫu vào {self.spool_path}")
+
+    def _replay_spool(self):
+        """
+        Gửi lại spool theo đúng thứ tự ghi
+
+        Gửi được phần nào thì ghi lại file chỉ với phần còn lại.
+
+        Returns:
+            bool: True nếu spool đã gửi hết (hoặc không có)
+        """
+        if not os.path.exists(self.spool_path):
+            return True
+        with open(self.spool_path, encoding='utf-8') as f:
+            samples = [json.loads(line) for line in f if line.strip()]
+
+        sent = 0
+        while sent < len(samples):
+            chunk = samples[sent:sent + self.batch_size]
+            if not self._send(chunk):
+                break
+            sent += len(chunk)
+        self.samples_replayed += sent
+
+        if sent == len(samples):
+            os.remove(self.spool_path)
+            return True
+        if sent:
+            tmp_path = self.spool_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for sample in samples[sent:]:
+                    f.write(json.dumps(sample) + '\n')
+            os.replace(tmp_path, self.spool_path)
+        return False
+
+    def get_stats(self):
+        """Thống kê gửi / spool"""
+        with self._lock:
+            pending = len(self._buffer)
+        spool_size = os.path.getsize(self.spool_path) if os.path.exists(self.spool_path) else 0
+        return {
+            'samples_sent': self.samples_sent,
+            'batches_sent': self.batches_sent,
+            'samples_spooled': self.samples_spooled,
+            'samples_replayed': self.samples_replayed,
+            'samples_rejected': self.samples_rejected,
+            'send_failures': self.send_failures,
+            'pending': pending,
+            'spool_bytes': spool_size,
+            'retry_in': max(0, round(self._retry_at - time.time(), 1))
+        }
@@ -1,6 +1,8 @@
 import cv2
 import mediapipe as mp
+import sys
 import time
+from frame_sources import open_source
 
 # Khởi tạo Face Mesh từ Mediapipe
 mp_face_mesh = mp.solutions.face_mesh
@@ -12,8 +14,8 @@ REAL_EYE_DISTANCE = 6.3  # cm
 # Tiêu cự ảo (focal length), cần tinh chỉnh để phù hợp camera
 FOCAL_LENGTH = 840  # có thể calibrate lại
 
-# Khởi động camera
-cap = cv2.VideoCapture(0)
+# Khởi động camera (hoặc nguồn khác: python test-camera.py video.mp4 | thư mục ảnh | synthetic)
+cap = open_source(sys.argv[1] if len(sys.argv) > 1 else 0)
 
 # Vòng lặp đọc frame và xử lý
 frame_count = 0
@@ -1,7 +1,7 @@
-import cv2
+from frame_sources import CameraSource
 
 for i in range(5):
-    cap = cv2.VideoCapture(i)
+    cap = CameraSource(i).open()
     if cap.read()[0]:
         print(f"Camera index {i} is available")
     cap.release()
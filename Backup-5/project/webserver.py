@@ -1,38 +1,167 @@
-from flask import Flask, render_template, request, jsonify
-import sqlite3
-from datetime import datetime, timedelta
+from flask import Flask, Response, render_template, request, jsonify
 from distance_utils import DistanceCamera
+from camera_worker import ProcessCamera
+from event_bus import EventBus, TOPIC_BREAK_WARNING, TOPIC_DISTANCE
+from broadcaster import Broadcaster
+from preview import PreviewStream
+from response_cache import ResponseCache
+from session_registry import LOCAL_DEVICE
+from session_store import create_session_store
+from session_checkpoint import SessionCheckpointer
+from session_db import SessionDB, format_distance, format_duration, format_time
 import atexit
-from collections import defaultdict
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta
 
 app = Flask(__name__)
 
 DB_PATH = 'work_sessions.db'
 SAFE_DISTANCE_CM = 50
+SAMPLE_INTERVAL = 3       # giây, khoảng nghỉ chuẩn giữa các lần đo
+SAMPLE_MIN_INTERVAL = 1   # đo dày khi gần ngưỡng hoặc di chuyển nhanh
+# Giãn tối đa khi ngồi ổn định ở khoảng cách an toàn; lần nhích lại gần bị
+# lỡ chỉ làm cảnh báo nghỉ đến muộn thêm tối đa một SAMPLE_INTERVAL
+SAMPLE_MAX_INTERVAL = 2 * SAMPLE_INTERVAL
+CHECK_MAX_AGE = 1.0       # giây, /check_distance dùng lại kết quả đo chưa quá tuổi này
+PREVIEW_MAX_FPS = 5       # số ảnh preview tối đa mỗi giây
+FRAME_RING_SLOTS = 8      # CAMERA_MODE=process: số slot ring buffer frame dùng chung cho preview
+HISTORY_PAGE_SIZE = 50    # số phiên mỗi trang /api/history (mặc định)
+HISTORY_MAX_PAGE_SIZE = 500
+RESPONSE_CACHE_SIZE = 256 # số response /api/history, /api/chart_data giữ trong cache
+CHECKPOINT_INTERVAL = 5   # giây giữa hai lần lưu trạng thái phiên đang chạy
+RECOVER_MAX_GAP = 600     # giây; server tắt lâu hơn thì phiên dở được đóng tại checkpoint cuối
+
+# 'thread': camera chạy trong process web; 'process': camera + MediaPipe chạy
+# ở process riêng để không tranh GIL với các request
+CAMERA_MODE = os.environ.get('CAMERA_MODE', 'thread')
+
+# Trạng thái phiên đang chạy: 'memory' (mặc định, một process) hoặc kho dùng
+# chung cho nhiều worker process: 'sqlite:session_state.db', 'manager:host:port'
+SESSION_STORE = os.environ.get('SESSION_STORE', 'memory')
+
+# Nguồn frame: số webcam, file video / thư mục ảnh, hoặc "synthetic"
+CAMERA_SOURCE = os.environ.get('CAMERA_SOURCE', '0')
+
+# LOCAL_CAMERA=0: không dùng camera của máy này (bàn "local"), chỉ nhận mẫu từ
+# camera_node.py. serve.py --workers N (N > 1) tự đặt: mỗi worker có camera
+# riêng nên start_work / stop_work tới hai worker khác nhau sẽ điều khiển hai
+# camera khác nhau.
+LOCAL_CAMERA = os.environ.get('LOCAL_CAMERA', '1') != '0'
 
 # Khởi tạo camera
-camera = DistanceCamera(cam_id=0, safe_distance=SAFE_DISTANCE_CM)
+CAMERA_OPTIONS = dict(source=CAMERA_SOURCE, safe_distance=SAFE_DISTANCE_CM,
+                      threaded_capture=True, motion_gate=True)
+if CAMERA_MODE == 'process':
+    # Preview đọc frame từ ring buffer shared memory của process camera
+    camera = ProcessCamera(shared_frames=FRAME_RING_SLOTS, **CAMERA_OPTIONS)
+else:
+    camera = DistanceCamera(**CAMERA_OPTIONS)
+
+# Preview MJPEG từ các frame camera đã phân tích
+preview = PreviewStream(camera, max_fps=PREVIEW_MAX_FPS)
+
+# Lưu trữ phiên đã kết thúc
+session_db = SessionDB(DB_PATH)
 
 def init_db():
-    """Khởi tạo database"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            start_time TEXT NOT NULL,
-            end_time TEXT,
-            duration TEXT,
-            avg_distance TEXT,
-            break_warnings INTEGER DEFAULT 0,
-            distance_warning BOOLEAN DEFAULT 0
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-# Biến lưu trữ session hiện tại
-current_session = None
+    """Khởi tạo database (database schema cũ được chuyển đổi tự động)"""
+    session_db.init_db()
+
+# Các phiên đang chạy, mỗi bàn / thiết bị một phiên
+sessions = create_session_store(SESSION_STORE, safe_distance=SAFE_DISTANCE_CM)
+
+# Lịch sử / biểu đồ chỉ đổi khi có phiên được lưu: cache theo query, xóa khi ghi.
+# Nhiều worker: phiên có thể được lưu ở worker khác, nên so thêm id phiên mới nhất
+response_cache = ResponseCache(
+    max_entries=RESPONSE_CACHE_SIZE,
+    version=None if SESSION_STORE == 'memory' else lambda: session_db.latest_id()
+)
+
+# Checkpoint phiên đang chạy trong RAM (tạo trong create_app); kho sqlite /
+# manager đã giữ phiên ngoài process web nên không cần
+checkpointer = None
+
+def _device_id(data=None):
+    """device_id của request: body JSON, query ?device_id= hoặc header X-Device-ID"""
+    device_id = (data or {}).get('device_id') or request.args.get('device_id') \
+        or request.headers.get('X-Device-ID')
+    return str(device_id) if device_id else LOCAL_DEVICE
+
+def _is_number(value):
+    """Số hữu hạn (không nhận bool, chuỗi, NaN, inf)"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def _sample_ts(payload):
+    """ts của mẫu; False nếu ts có nhưng không hợp lệ"""
+    ts = payload.get('ts')
+    return ts if ts is None or _is_number(ts) else False
+
+def _record_distance(payload, verbose=True, device_id=LOCAL_DEVICE):
+    """
+    Cộng dồn một mẫu khoảng cách vào phiên đang chạy của device_id
+    
+    Mẫu không hợp lệ (distance không phải số dương hữu hạn, ts không phải số)
+    bị bỏ qua. Mẫu có ts không mới hơn mẫu đã nhận là lần đo đã tính (dùng
+    chung kết quả đo, hoặc lô gửi lại) nên chỉ tính một lần.
+    """
+    distance = payload.get('distance')
+    ts = _sample_ts(payload)
+    if not _is_number(distance) or distance <= 0 or ts is False:
+        return False
+    session = sessions.get(device_id)
+    if session is None or not session.add_distance(distance, ts):
+        return False
+    if verbose:
+        print(f"📊 [{device_id}] Nhận dữ liệu khoảng cách: {distance:.1f}cm")
+    return True
+
+def _record_break_warning(payload=None, device_id=LOCAL_DEVICE):
+    """Cộng một cảnh báo nghỉ giải lao vào phiên đang chạy của device_id (bỏ cảnh báo trùng ts)"""
+    ts = _sample_ts(payload or {})
+    if ts is False:
+        return None
+    session = sessions.get(device_id)
+    warning_count = session.add_break_warning(ts) if session else None
+    if warning_count is not None:
+        print(f"⚠️ [{device_id}] Cảnh báo nghỉ giải lao #{warning_count}")
+    return warning_count
+
+# Luồng SSE cho dashboard: mỗi lần đo mới, cảnh báo, bắt đầu / kết thúc phiên
+broadcaster = Broadcaster()
+_last_broadcast_ts = {}
+
+def _broadcast_distance(payload, device_id=LOCAL_DEVICE):
+    """Đẩy một lần đo mới tới dashboard (mỗi lần đo chỉ một lần)"""
+    ts = payload.get('ts')
+    if ts is not None and ts == _last_broadcast_ts.get(device_id):
+        return
+    _last_broadcast_ts[device_id] = ts
+    distance = payload.get('distance', 0)
+    broadcaster.publish('distance', {
+        'device_id': device_id,
+        'distance': distance,
+        'warning': 0 < distance < SAFE_DISTANCE_CM,
+        'ts': ts
+    })
+
+def _broadcast_break_warning(payload=None, device_id=LOCAL_DEVICE, warning_count=None):
+    if warning_count is None:
+        session = sessions.get(device_id)
+        warning_count = session.break_warnings if session else 0
+    broadcaster.publish('break_warning', {
+        'device_id': device_id,
+        'warning_count': warning_count
+    })
+
+# Camera chạy cùng process publish mẫu đo thẳng vào đây, không qua HTTP
+event_bus = EventBus()
+event_bus.subscribe(TOPIC_DISTANCE, _record_distance)
+event_bus.subscribe(TOPIC_DISTANCE, _broadcast_distance)
+event_bus.subscribe(TOPIC_BREAK_WARNING, _record_break_warning)
+event_bus.subscribe(TOPIC_BREAK_WARNING, _broadcast_break_warning)
 
 @app.route('/')
 def index():
@@ -42,228 +171,312 @@ def index():
 def history():
     return render_template('history.html')
 
+def _valid_day(text):
+    try:
+        return datetime.strptime(text, '%Y-%m-%d').strftime('%Y-%m-%d') == text
+    except ValueError:
+        return False
+
+def _cache_key():
+    """Khóa cache: đường dẫn + query (không phụ thuộc thứ tự tham số)"""
+    return (request.path, tuple(sorted(request.args.items(multi=True))))
+
+def _json_response(body, etag=None):
+    response = app.response_class(body, mimetype='application/json')
+    if etag:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def _day_start_ts(day, days_after=0):
+    """'YYYY-MM-DD' -> epoch lúc 00:00 giờ địa phương (của days_after ngày sau đó)"""
+    return int((datetime.strptime(day, '%Y-%m-%d') + timedelta(days=days_after)).timestamp())
+
 @app.route('/api/history')
 def api_history():
-    """API lấy lịch sử làm việc"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM sessions ORDER BY start_time DESC')
-    sessions = cursor.fetchall()
-    conn.close()
+    """
+    API lấy lịch sử làm việc, mới nhất trước, phân trang theo cursor
+    
+    Query: limit (mặc định 50, tối đa 500), cursor (next_cursor của trang
+    trước), start / end (YYYY-MM-DD, gồm cả hai đầu), warnings=1 (chỉ phiên có
+    cảnh báo). ETag là id phiên mới nhất: trang không đổi trả về 304.
+    Kết quả được cache theo query tới khi có phiên mới.
+    """
+    args = request.args
+    try:
+        limit = int(args.get('limit', HISTORY_PAGE_SIZE))
+        if not 1 <= limit <= HISTORY_MAX_PAGE_SIZE:
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': f'limit must be 1-{HISTORY_MAX_PAGE_SIZE}'}), 400
+    
+    before = None
+    if args.get('cursor'):
+        try:
+            start_ts, _, session_id = args['cursor'].partition('_')
+            before = (int(start_ts), int(session_id))
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    
+    start_day, end_day = args.get('start'), args.get('end')
+    for day in (start_day, end_day):
+        if day and not _valid_day(day):
+            return jsonify({'error': f'Invalid date {day}, expected YYYY-MM-DD'}), 400
+    
+    etag, body = response_cache.get_or_compute(_cache_key(), lambda: _history_page(
+        limit, before,
+        start_ts=_day_start_ts(start_day) if start_day else None,
+        end_ts=_day_start_ts(end_day, 1) if end_day else None,
+        warnings_only=args.get('warnings') in ('1', 'true')
+    ))
+    if request.if_none_match.contains(etag):
+        return _json_response(None, etag), 304
+    return _json_response(body, etag)
+
+def _history_page(limit, before, start_ts, end_ts, warnings_only):
+    """Một trang lịch sử: (etag, JSON body)"""
+    # Thêm phiên mới là cách duy nhất làm lịch sử thay đổi, nên id lớn nhất
+    # đủ để biết client đã có bản mới nhất
+    etag = f"h{session_db.latest_id()}"
+    rows = session_db.list_sessions(limit=limit + 1, before=before, start_ts=start_ts,
+                                    end_ts=end_ts, warnings_only=warnings_only)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f"{rows[-1]['start_ts']}_{rows[-1]['id']}"
     
     history_data = []
-    for s in sessions:
+    for row in rows:
         history_data.append({
-            'id': s[0],
-            'start_time': s[1],
-            'end_time': s[2] if s[2] else '',
-            'duration': s[3] if s[3] else '',
-            'avg_distance': s[4] if s[4] else '0cm',
-            'break_warnings': s[5] if s[5] else 0,
-            'distance_warning': bool(s[6]) if s[6] is not None else False
+            'id': row['id'],
+            'device_id': row['device_id'],
+            'start_time': format_time(row['start_ts']),
+            'end_time': format_time(row['end_ts']),
+            'duration': format_duration(row['duration_s']),
+            'duration_seconds': row['duration_s'] or 0,
+            'avg_distance': format_distance(row['avg_distance']),
+            'avg_distance_cm': row['avg_distance'] or 0,
+            'break_warnings': row['break_warnings'] or 0,
+            'distance_warning': bool(row['distance_warning'])
         })
     
-    return jsonify(history_data)
+    return etag, jsonify({'sessions': history_data, 'next_cursor': next_cursor}).get_data()
 
 @app.route('/api/chart_data')
 def api_chart_data():
-    """API lấy dữ liệu cho biểu đồ cột theo ngày"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM sessions WHERE start_time IS NOT NULL ORDER BY start_time')
-    sessions = cursor.fetchall()
-    conn.close()
-    
-    # Group data by date
-    daily_data = defaultdict(lambda: {
-        'sessions': 0,
-        'total_minutes': 0,
-        'total_distance': 0,
-        'distance_warnings': 0,
-        'break_warnings': 0
-    })
-    
-    for session in sessions:
-        # Parse date từ start_time
-        try:
-            date_str = session[1].split(' ')[0]  # Lấy phần date từ 'YYYY-MM-DD HH:MM:SS'
-            
-            # Parse duration
-            duration = session[3] if session[3] else '0m'
-            minutes = 0
-            if 'h' in duration:
-                hours = int(duration.split('h')[0])
-                minutes += hours * 60
-                remaining = duration.split('h')[1].strip()
-                if 'm' in remaining:
-                    minutes += int(remaining.replace('m', ''))
-            elif 'm' in duration:
-                minutes = int(duration.replace('m', ''))
-            
-            # Parse distance
-            avg_distance = session[4] if session[4] else '0cm'
-            distance = float(avg_distance.replace('cm', '')) if avg_distance else 0
-            
-            # Accumulate data
-            daily_data[date_str]['sessions'] += 1
-            daily_data[date_str]['total_minutes'] += minutes
-            daily_data[date_str]['total_distance'] += distance
-            daily_data[date_str]['distance_warnings'] += 1 if session[6] else 0
-            daily_data[date_str]['break_warnings'] += session[5] if session[5] else 0
-            
-        except (ValueError, IndexError, AttributeError) as e:
-            print(f"Error parsing session data: {e}")
-            continue
-    
-    # Convert to chart format
+    """
+    API lấy dữ liệu cho biểu đồ cột theo ngày
+    
+    Đọc từ bảng tổng hợp daily_stats; ?start=YYYY-MM-DD&end=YYYY-MM-DD giới
+    hạn khoảng ngày (mặc định: toàn bộ). Kết quả được cache tới khi có phiên mới.
+    """
+    start_day = request.args.get('start')
+    end_day = request.args.get('end')
+    for day in (start_day, end_day):
+        if day and not _valid_day(day):
+            return jsonify({'error': f'Invalid date {day}, expected YYYY-MM-DD'}), 400
+    
+    body = response_cache.get_or_compute(_cache_key(), lambda: _chart_data(start_day, end_day))
+    return _json_response(body)
+
+def _chart_data(start_day, end_day):
     chart_data = []
-    for date, data in sorted(daily_data.items()):
-        avg_distance = data['total_distance'] / data['sessions'] if data['sessions'] > 0 else 0
-        
+    for row in session_db.daily_summary(start_day, end_day):
+        total_minutes = int(row['total_seconds'] // 60)
         chart_data.append({
-            'date': date,
-            'sessions': data['sessions'],
-            'total_hours': round(data['total_minutes'] / 60, 1),
-            'total_minutes': data['total_minutes'],
-            'avg_distance': round(avg_distance, 1),
-            'distance_warnings': data['distance_warnings'],
-            'break_warnings': data['break_warnings']
+            'date': row['day'],
+            'sessions': row['sessions'],
+            'total_hours': round(row['total_seconds'] / 3600, 1),
+            'total_minutes': total_minutes,
+            'avg_distance': round(row['avg_distance'], 1),
+            'distance_warnings': row['distance_warnings'],
+            'break_warnings': row['break_warnings']
         })
     
-    return jsonify(chart_data)
+    return jsonify(chart_data).get_data()
+
+def _local_camera_disabled():
+    """Response lỗi nếu camera của máy này bị tắt (LOCAL_CAMERA=0), ngược lại None"""
+    if LOCAL_CAMERA:
+        return None
+    return jsonify({'success': False, 'error': 'Local camera disabled (LOCAL_CAMERA=0)'}), 409
+
+def _start_camera_monitoring():
+    try:
+        camera.start_monitoring(interval=SAMPLE_INTERVAL, adaptive=True,
+                                min_interval=SAMPLE_MIN_INTERVAL,
+                                max_interval=SAMPLE_MAX_INTERVAL, event_bus=event_bus)
+        print("🎥 Bắt đầu giám sát camera")
+    except Exception as e:
+        print(f"⚠️ Không thể khởi động camera: {e}")
+
+def _save_session(session, end_ts):
+    """
+    Đóng phiên và lưu vào database
+    
+    Returns:
+        tuple: (stats, break_warnings, distance_warning)
+    """
+    stats, break_warnings = session.close()
+    
+    # Average distance và distance warning lấy từ thống kê của phiên (O(1))
+    distance_warning = stats['below_count'] > 0
+    
+    # Lưu vào database (dạng số, chuỗi hiển thị chỉ tạo cho response)
+    session_db.insert_session(session.started_at, end_ts, stats['mean'], break_warnings,
+                              distance_warning, session.device_id)
+    response_cache.invalidate()
+    return stats, break_warnings, distance_warning
 
 @app.route('/start_work', methods=['POST'])
 def start_work():
-    """Bắt đầu phiên làm việc"""
-    global current_session
+    """Bắt đầu phiên làm việc của một bàn (mặc định: camera của máy này)"""
+    device_id = _device_id(request.get_json(silent=True))
+    if device_id == LOCAL_DEVICE and not LOCAL_CAMERA:
+        return _local_camera_disabled()
     
-    if current_session is not None:
+    session = sessions.start(device_id)
+    if session is None:
         return jsonify({'success': False, 'error': 'Work session already started'})
     
-    # Tạo session mới
-    current_session = {
-        'start_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        'distances': [],
-        'break_warnings': 0
-    }
-    
-    # Bắt đầu giám sát camera
-    try:
-        camera.start_monitoring(server_url="http://localhost:5000", interval=3)
-        print("🎥 Bắt đầu giám sát camera")
-    except Exception as e:
-        print(f"⚠️ Không thể khởi động camera: {e}")
+    # Camera của máy này chỉ phục vụ bàn local; bàn khác tự gửi mẫu lên
+    if device_id == LOCAL_DEVICE:
+        _start_camera_monitoring()
     
+    broadcaster.publish('session', {'device_id': device_id, 'active': True,
+                                    'start_time': session.start_time})
     return jsonify({
         'success': True, 
-        'start_time': current_session['start_time']
+        'device_id': device_id,
+        'start_time': session.start_time
     })
 
 @app.route('/stop_work', methods=['POST'])
 def stop_work():
-    """Kết thúc phiên làm việc"""
-    global current_session
-    
-    if current_session is None:
+    """Kết thúc phiên làm việc của một bàn"""
+    device_id = _device_id(request.get_json(silent=True))
+    session = sessions.stop(device_id)
+    if session is None:
         return jsonify({'success': False, 'error': 'No active work session'})
     
     # Dừng giám sát camera
-    camera.stop_monitoring()
-    print("🔚 Dừng giám sát camera")
-    
-    end_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-    # Tính toán duration
-    start_dt = datetime.strptime(current_session['start_time'], '%Y-%m-%d %H:%M:%S')
-    end_dt = datetime.strptime(end_time, '%Y-%m-%d %H:%M:%S')
-    duration_seconds = (end_dt - start_dt).total_seconds()
-    
-    hours = int(duration_seconds // 3600)
-    minutes = int((duration_seconds % 3600) // 60)
-    duration_str = f"{hours}h {minutes}m" if hours > 0 else f"{minutes}m"
+    if device_id == LOCAL_DEVICE:
+        camera.stop_monitoring()
+        print("🔚 Dừng giám sát camera")
     
-    # Tính toán average distance
-    avg_distance = 0
-    if current_session['distances']:
-        avg_distance = sum(current_session['distances']) / len(current_session['distances'])
-    
-    avg_distance_str = f"{avg_distance:.1f}cm"
-    
-    # Kiểm tra distance warning
-    distance_warning = any(d < SAFE_DISTANCE_CM for d in current_session['distances'])
-    
-    # Lưu vào database
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        INSERT INTO sessions (start_time, end_time, duration, avg_distance, break_warnings, distance_warning)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (current_session['start_time'], end_time, duration_str, avg_distance_str,
-          current_session['break_warnings'], distance_warning))
-    
-    conn.commit()
-    conn.close()
+    end_ts = int(time.time())
+    duration_seconds = end_ts - int(session.started_at)
+    stats, break_warnings, distance_warning = _save_session(session, end_ts)
     
     result = {
         'success': True,
-        'duration': duration_str,
-        'avg_distance': avg_distance_str,
-        'break_warnings': current_session['break_warnings'],
-        'distance_warning': distance_warning
+        'device_id': device_id,
+        'duration': format_duration(duration_seconds),
+        'avg_distance': format_distance(stats['mean']),
+        'break_warnings': break_warnings,
+        'distance_warning': distance_warning,
+        'stats': stats
     }
     
-    # Reset session
-    current_session = None
-    
+    broadcaster.publish('session', dict(result, active=False))
     return jsonify(result)
 
 @app.route('/add_distance', methods=['POST'])
 def add_distance():
-    """Thêm dữ liệu khoảng cách từ camera"""
-    global current_session
-    
-    if current_session is None:
+    """Thêm dữ liệu khoảng cách từ camera ở máy / process khác"""
+    data = request.get_json(silent=True) or {}
+    device_id = _device_id(data)
+    if sessions.get(device_id) is None:
         return jsonify({'success': False, 'error': 'No active session'})
     
-    data = request.get_json()
-    distance = data.get('distance')
-    
-    if distance is not None and distance > 0:
-        current_session['distances'].append(float(distance))
-        print(f"📊 Nhận dữ liệu khoảng cách: {distance:.1f}cm")
+    if _record_distance(data, device_id=device_id):
+        _broadcast_distance(data, device_id=device_id)
         return jsonify({'success': True})
     
     return jsonify({'success': False, 'error': 'Invalid distance data'})
 
 @app.route('/add_break_warning', methods=['POST'])
 def add_break_warning():
-    """Thêm cảnh báo nghỉ giải lao"""
-    global current_session
-    
-    if current_session is None:
+    """Thêm cảnh báo nghỉ giải lao từ camera ở máy / process khác"""
+    device_id = _device_id(request.get_json(silent=True))
+    warning_count = _record_break_warning(device_id=device_id)
+    if warning_count is None:
         return jsonify({'success': False, 'error': 'No active session'})
     
-    current_session['break_warnings'] += 1
-    print(f"⚠️ Cảnh báo nghỉ giải lao #{current_session['break_warnings']}")
-    
-    return jsonify({'success': True, 'warning_count': current_session['break_warnings']})
+    _broadcast_break_warning(device_id=device_id, warning_count=warning_count)
+    return jsonify({'success': True, 'warning_count': warning_count})
+
+@app.route('/add_distance_batch', methods=['POST'])
+def add_distance_batch():
+    """
+    Nhận một lô mẫu từ camera ở máy khác (TelemetryUploader)
+    
+    Body: {"device_id": "desk-12",
+           "samples": [{"type": "distance", "distance": 45.2, "ts": 1700000000.0},
+                       {"type": "break_warning", "ts": ...}, ...]}
+    Mẫu được cộng vào phiên đang chạy của device_id theo thứ tự trong lô;
+    mẫu không hợp lệ và mẫu đã nhận (lô gửi lại, ts không mới hơn) được
+    tính vào ignored.
+    """
+    data = request.get_json(silent=True) or {}
+    samples = data.get('samples')
+    if not isinstance(samples, list):
+        return jsonify({'success': False, 'error': 'Invalid batch'}), 400
+    
+    device_id = _device_id(data)
+    if sessions.get(device_id) is None:
+        return jsonify({'success': False, 'error': 'No active session',
+                        'accepted': 0, 'ignored': len(samples)})
+    
+    accepted = 0
+    latest = None
+    for sample in samples:
+        if not isinstance(sample, dict):
+            continue
+        if sample.get('type') == TOPIC_BREAK_WARNING:
+            warning_count = _record_break_warning(sample, device_id=device_id)
+            if warning_count is not None:
+                _broadcast_break_warning(device_id=device_id, warning_count=warning_count)
+                accepted += 1
+        elif _record_distance(sample, verbose=False, device_id=device_id):
+            latest = sample
+            accepted += 1
+    
+    # Dashboard chỉ cần giá trị mới nhất của lô
+    if latest is not None:
+        _broadcast_distance(latest, device_id=device_id)
+    
+    print(f"📊 [{device_id}] Nhận lô {len(samples)} mẫu ({accepted} hợp lệ)")
+    return jsonify({'success': True, 'accepted': accepted,
+                    'ignored': len(samples) - accepted})
 
 @app.route('/check_distance')
 def check_distance():
-    """Kiểm tra khoảng cách hiện tại"""
-    global current_session
+    """
+    Kiểm tra khoảng cách hiện tại
+    
+    Nhiều dashboard gọi cùng lúc thì dùng chung một lần đo, hoặc kết quả gần
+    nhất nếu chưa quá CHECK_MAX_AGE giây.
+    """
+    if not LOCAL_CAMERA:
+        return _local_camera_disabled()
     
     try:
-        too_close, distance = camera.is_too_close()
+        distance, success, measured_at = camera.measure(max_age=CHECK_MAX_AGE)
+        if not success:
+            distance = 0
         
-        # Nếu có session đang hoạt động, lưu dữ liệu
-        if current_session and distance > 0:
-            current_session['distances'].append(distance)
+        # Nếu có session đang hoạt động, lưu dữ liệu (mỗi lần đo một lần)
+        if distance > 0:
+            sample = {'distance': distance, 'ts': measured_at}
+            _record_distance(sample, verbose=False)
+            _broadcast_distance(sample)
         
         return jsonify({
             'distance': distance,
-            'warning': too_close,
+            'warning': 0 < distance < SAFE_DISTANCE_CM,
+            'cached': camera.last_cached,
+            'measured_at': measured_at,
             'safe_distance': SAFE_DISTANCE_CM
         })
     
@@ -277,23 +490,24 @@ def check_distance():
 
 @app.route('/api/current_session')
 def current_session_info():
-    """Lấy thông tin session hiện tại"""
-    global current_session
-    
-    if current_session is None:
+    """Lấy thông tin phiên đang chạy của một bàn (?device_id=, mặc định local)"""
+    session = sessions.get(_device_id())
+    if session is None:
         return jsonify({'active': False})
     
-    return jsonify({
-        'active': True,
-        'start_time': current_session['start_time'],
-        'distance_count': len(current_session['distances']),
-        'break_warnings': current_session['break_warnings'],
-        'avg_distance': sum(current_session['distances']) / len(current_session['distances']) if current_session['distances'] else 0
-    })
+    return jsonify(session.snapshot())
+
+@app.route('/api/sessions')
+def active_sessions():
+    """Các phiên đang chạy của mọi bàn"""
+    return jsonify([session.snapshot() for session in sessions.active()])
 
 @app.route('/api/save_distance_image')
 def save_distance_image():
     """Lưu ảnh với thông tin khoảng cách"""
+    if not LOCAL_CAMERA:
+        return _local_camera_disabled()
+    
     try:
         success, message = camera.save_image_with_distance("./static/images/")
         return jsonify({
@@ -306,24 +520,137 @@ def save_distance_image():
             'message': f"Lỗi: {str(e)}"
         })
 
+@app.route('/api/camera_stats')
+def camera_stats():
+    """Thống kê camera (frame đã đọc, frame bị bỏ qua...)"""
+    if not LOCAL_CAMERA:
+        return _local_camera_disabled()
+    
+    return jsonify(camera.get_stats())
+
+@app.route('/api/camera_metrics')
+def camera_metrics():
+    """Histogram thời gian theo stage, tỉ lệ thấy khuôn mặt, tốc độ lấy mẫu"""
+    if not LOCAL_CAMERA:
+        return _local_camera_disabled()
+    
+    return jsonify(camera.get_metrics())
+
+@app.route('/api/cache_stats')
+def cache_stats():
+    """Hit / miss của cache /api/history và /api/chart_data"""
+    return jsonify(response_cache.get_stats())
+
+@app.route('/api/checkpoint_stats')
+def checkpoint_stats():
+    """Số lượt / thời gian checkpoint phiên đang chạy"""
+    return jsonify(checkpointer.get_stats() if checkpointer else {'enabled': False})
+
+@app.route('/api/stream')
+def stream():
+    """
+    Server-Sent Events: distance, break_warning, session
+    
+    Trình duyệt tự kết nối lại và gửi Last-Event-ID để nhận bù sự kiện đã lỡ.
+    """
+    last_id = request.headers.get('Last-Event-ID', '')
+    last_id = int(last_id) if last_id.isdigit() else None
+    return Response(broadcaster.stream(last_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/preview')
+def preview_stream():
+    """
+    Preview MJPEG: frame đã phân tích gần nhất kèm vị trí mắt và khoảng cách
+    
+    Chỉ hiển thị kết quả các lần đo sẵn có (vòng giám sát, /check_distance),
+    không chạy thêm face mesh. CAMERA_MODE=process: frame lấy từ ring buffer
+    shared memory của process camera.
+    """
+    if not LOCAL_CAMERA:
+        return _local_camera_disabled()
+    
+    return Response(preview.stream(), mimetype=preview.mimetype,
+                    headers={'Cache-Control': 'no-cache'})
+
 # Cleanup khi tắt server
+_app_ready = False
+_app_lock = threading.Lock()
+_cleaned_up = False
+
+def create_app(db_path=None):
+    """
+    Chuẩn bị app để chạy (database, thư mục ảnh, process camera)
+    
+    Chỉ chạy một lần mỗi process; các lần gọi sau trả về app đã chuẩn bị.
+    Camera là thiết bị dùng chung nên chỉ process web duy nhất của máy mới
+    dùng camera; khi chạy nhiều worker process, mỗi worker đặt LOCAL_CAMERA=0.
+    
+    Phiên đang chạy lúc server tắt (kể cả tắt đột ngột) được khôi phục từ
+    checkpoint nếu server tắt không quá RECOVER_MAX_GAP giây; phiên của camera
+    local tiếp tục giám sát. Phiên tắt lâu hơn được lưu với thời điểm kết
+    thúc là checkpoint cuối.
+    
+    Args:
+        db_path: file database (mặc định DB_PATH); chỉ có tác dụng ở lần gọi đầu.
+            Checkpoint lưu ở <db_path>.checkpoints.
+    """
+    global session_db, checkpointer, _app_ready
+    with _app_lock:
+        if not _app_ready:
+            if db_path:
+                session_db = SessionDB(db_path)
+            init_db()
+            os.makedirs("./static/images/", exist_ok=True)
+            if CAMERA_MODE == 'process' and LOCAL_CAMERA:
+                camera.start()
+            if SESSION_STORE == 'memory':
+                _start_checkpointer()
+            _app_ready = True
+    return app
+
+def _start_checkpointer():
+    global checkpointer
+    checkpointer = SessionCheckpointer(sessions, session_db.db_path + '.checkpoints',
+                                       interval=CHECKPOINT_INTERVAL)
+    recovered = checkpointer.recover(
+        is_saved=lambda session: session_db.has_session(session.device_id, session.started_at),
+        max_gap=RECOVER_MAX_GAP, on_expired=_save_expired_session)
+    for session, gap in recovered:
+        print(f"♻️ [{session.device_id}] Khôi phục phiên bắt đầu lúc {session.start_time} "
+              f"({session.stats.count} mẫu, server tắt {gap:.0f}s)")
+        if session.device_id == LOCAL_DEVICE and LOCAL_CAMERA:
+            _start_camera_monitoring()
+    checkpointer.start()
+
+def _save_expired_session(session, ended_at):
+    """Phiên dở quá RECOVER_MAX_GAP: lưu với thời điểm kết thúc là checkpoint cuối"""
+    _save_session(session, int(ended_at))
+    print(f"💾 [{session.device_id}] Phiên bắt đầu lúc {session.start_time} đã kết thúc lúc "
+          f"{format_time(int(ended_at))} (checkpoint cuối)")
+
 def cleanup():
-    """Dọn dẹp khi tắt server"""
+    """Dọn dẹp khi tắt server (chỉ chạy một lần)"""
+    global _cleaned_up
+    if _cleaned_up:
+        return
+    _cleaned_up = True
     print("🔚 Đang dọn dẹp...")
+    if checkpointer is not None:
+        checkpointer.stop()
+    broadcaster.close()
+    preview.close()
     camera.stop_monitoring()
     camera.stop_camera()
+    if CAMERA_MODE == 'process':
+        camera.shutdown()
 
 atexit.register(cleanup)
 
 if __name__ == '__main__':
+    # Server phát triển (debug); chạy production: python serve.py
     print("🚀 Khởi động Work Session Monitor...")
-    
-    # Khởi tạo database
-    init_db()
-    
-    # Tạo thư mục lưu ảnh nếu chưa có
-    import os
-    os.makedirs("./static/images/", exist_ok=True)
+    create_app()
     
     print("✅ Hệ thống sẵn sàng!")
     print("📱 Truy cập: http://localhost:5000")